@@ -0,0 +1,369 @@
+"""
+Benchmark suite for the GemmaPower pipeline, fully offline.
+
+Times each stage (clustering, region extraction, serialization, power flow validation,
+bulk actions and the end-to-end orchestrator flows) on pandapower cases and synthetic
+grids, with the Gemini client replaced by FakeGenAIClient (configurable latency and
+canned structured outputs). Reports wall time, allocations and peak memory per stage,
+and can save / compare JSON baselines.
+
+Usage:
+    python benchmarks/run_benchmarks.py                              # case57, case118, synth-1000
+    python benchmarks/run_benchmarks.py --grids case118 synth-5000 --repeat 5
+    python benchmarks/run_benchmarks.py --save-baseline main         # -> benchmarks/baselines/main.json
+    python benchmarks/run_benchmarks.py --compare main --fail-on-regression
+    python benchmarks/run_benchmarks.py --grids case9241pegase --stages load_partition_query --check-budgets
+"""
+import os
+import sys
+import gc
+import json
+import time
+import pickle
+import tempfile
+import argparse
+import platform
+import statistics
+import tracemalloc
+
+# Offline by default: the real client needs an API key at import time
+os.environ.setdefault("LLM_BACKEND", "fake")
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pandas as pd
+import pandapower as pp
+
+import src.llm_client as llm_client
+from src.llm_fake import FakeGenAIClient
+from src.network_manager import load_network, cluster_spatially, cluster_by_topology, get_regions_data, build_bus_cluster_index
+from src.serializer import region_to_text, region_to_compact_text
+from src.agents.scenario_builder import ScenarioBuilder
+from src.agents.orchestrator import Orchestrator
+from src.transaction import NetworkTransaction
+from src.powerflow import INJECTION, TOPOLOGY
+from src.violations import ViolationIndex
+from src.scenarios import ScenarioStore
+from src.templates import TemplateCache
+from src.powerflow import PowerFlowSession
+from benchmarks.synthetic import synthetic_grid
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+DEFAULT_GRIDS = ["case57", "case118", "synth-1000"]
+N_CLUSTERS = 3
+
+# Canned structured answer for the LLM path of process_scenario_modification
+CANNED_SCENARIO = {"actions": [{"component": "line", "id": 3, "type": "modify", "parameters": {"in_service": False}}]}
+# ... and for the speculative path: the first two candidates fail, the third one converges
+CANNED_CANDIDATES = {"candidates": [
+    {"actions": [{"component": "line", "id": 100000, "type": "modify", "parameters": {"in_service": False}}]},
+    {"actions": [{"component": "load", "id": 0, "type": "modify", "parameters": {"vm_pu": 1.0}}]},
+    CANNED_SCENARIO,
+]}
+
+
+# End-to-end budgets (median seconds, peak traced MB) for loading, partitioning and answering
+# one query on the large cases, checked with --check-budgets
+BUDGETS = {
+    ("case2869pegase", "load_partition_query"): (10.0, 120.0),
+    ("case9241pegase", "load_partition_query"): (20.0, 250.0),
+}
+
+
+def build_grid(name):
+    """pandapower cases by name (see network_manager.BUILTIN_CASES), 'synth-<n>' from benchmarks.synthetic."""
+    if name.startswith("synth-"):
+        return synthetic_grid(int(name.split("-", 1)[1]))
+    return load_network(name)
+
+
+def _pickle_copy(net):
+    return pickle.loads(pickle.dumps(net))
+
+
+# --- Stages: name -> (setup(grid_name, base_net) -> args, run(*args)) ---
+
+def _clustered(base):
+    return cluster_spatially(_pickle_copy(base), n_clusters=N_CLUSTERS)
+
+
+def _solved(base):
+    net = _clustered(base)
+    pp.runpp(net)
+    return net
+
+
+def _regions(net):
+    index = build_bus_cluster_index(net)
+    return list(get_regions_data(net, list(range(N_CLUSTERS)), bus_cluster=index).values())
+
+
+def _bulk_actions(net):
+    return [{"component": "load", "id": int(i), "type": "modify", "parameters": {"p_mw": "+1%", "q_mvar": "-1%"}}
+            for i in net.load.index]
+
+
+def _apply_in_transaction(builder, actions):
+    transaction = NetworkTransaction(builder.net)
+    builder.apply_actions(actions, transaction=transaction)
+    transaction.rollback()
+
+
+def _validate(builder, level):
+    builder.session.invalidate(level)
+    builder.validate_network()
+
+
+STAGES = {
+    "load_network": (lambda name, base: (name,), build_grid),
+    "cluster_spatially": (lambda name, base: (_pickle_copy(base),), lambda net: cluster_spatially(net, n_clusters=N_CLUSTERS)),
+    "cluster_by_topology": (lambda name, base: (_pickle_copy(base),), lambda net: cluster_by_topology(net, n_clusters=N_CLUSTERS)),
+    "get_region_data": (lambda name, base: (_solved(base),), _regions),
+    "region_to_text": (lambda name, base: (_regions(_solved(base)),), lambda regions: [region_to_text(r) for r in regions]),
+    "region_to_compact_text": (lambda name, base: (_regions(_solved(base)),),
+                               lambda regions: [region_to_compact_text(r) for r in regions]),
+    "violation_index_build": (lambda name, base: (_solved(base),), ViolationIndex),
+    "violation_index_refresh": (lambda name, base: _violations_after_solve(base), lambda index: index.refresh()),
+    "template_checkout": (lambda name, base: (_warm_templates(name, shared=False), name),
+                          lambda cache, name: cache.checkout(name, N_CLUSTERS, "spatial")),
+    "template_checkout_shared": (lambda name, base: (_warm_templates(name, shared=True), name),
+                                 lambda cache, name: cache.checkout(name, N_CLUSTERS, "spatial")),
+    "scenario_checkout": (lambda name, base: (_scenario_tree(base),), lambda store: (store.checkout("s1"), store.checkout("s2"))),
+    "validate_network_cold": (lambda name, base: (_builder(base), TOPOLOGY), _validate),
+    "validate_network_warm": (lambda name, base: (_warm_builder(base), INJECTION), _validate),
+    "apply_actions_bulk": (lambda name, base: _bulk_setup(base), _apply_in_transaction),
+    "process_user_query": (lambda name, base: (_orchestrator(name), "Which buses have the lowest voltage?"),
+                           lambda orch, q: orch.process_user_query(q)),
+    "process_targeted_query": (lambda name, base: (_orchestrator(name), "What is the voltage at bus 14?"),
+                               lambda orch, q: orch.process_user_query(q)),
+    "load_partition_query": (lambda name, base: (name, "Which lines are the most loaded?"),
+                             lambda name, q: _load_partition_query(name, q)),
+    "scenario_local_parse": (lambda name, base: (_orchestrator(name), "outage line 3"),
+                             lambda orch, q: orch.process_scenario_modification(q)),
+    "scenario_llm_parse": (lambda name, base: (_orchestrator(name), "take the third line out for maintenance"),
+                           lambda orch, q: orch.process_scenario_modification(q)),
+    "scenario_speculative": (lambda name, base: (_orchestrator(name, speculative_candidates=3), "take the third line out for maintenance"),
+                             lambda orch, q: orch.process_scenario_modification(q)),
+}
+
+# The orchestrator stages need a network the Orchestrator can load by name
+ORCHESTRATOR_STAGES = {"template_checkout", "template_checkout_shared", "process_user_query", "process_targeted_query", "load_partition_query", "scenario_local_parse",
+                       "scenario_llm_parse", "scenario_speculative"}
+
+
+def _builder(base):
+    builder = ScenarioBuilder(_clustered(base))
+    # Captures the DC baseline and topology of the unmodified network, as a first scenario would;
+    # without it, grids with base-case overloads time a DC rejection instead of the AC solve
+    builder.apply_actions([])
+    return builder
+
+
+def _warm_builder(base):
+    builder = _builder(base)
+    builder.validate_network()
+    builder.net.load['p_mw'] *= 1.01
+    return builder
+
+
+def _violations_after_solve(base):
+    index = ViolationIndex(_solved(base))
+    index.net.load['p_mw'] *= 1.05
+    pp.runpp(index.net)
+    return (index,)
+
+
+def _warm_templates(name, shared):
+    cache = TemplateCache(cache_dir=tempfile.mkdtemp(prefix="gemmapower-bench-"), max_entries=1, shared=shared)
+    cache.warm(name, N_CLUSTERS, "spatial")
+    return cache
+
+
+def _scenario_tree(base):
+    """A store with two sibling scenarios (10% more / 10% less load), checked out at the base case."""
+    net = _solved(base)
+    session = PowerFlowSession(net)
+    store = ScenarioStore(net)
+    for factor in (1.1, 0.9):
+        store.checkout("base")
+        transaction = NetworkTransaction(net)
+        transaction.set_values("load", net.load.index, "p_mw", net.load['p_mw'].values * factor)
+        session.invalidate(INJECTION)
+        session.solve()
+        store.commit(transaction)
+    store.checkout("base")
+    session.invalidate(TOPOLOGY)
+    return store
+
+
+def _bulk_setup(base):
+    builder = ScenarioBuilder(_clustered(base))
+    return builder, _bulk_actions(builder.net)
+
+
+def _load_partition_query(name, query):
+    orch = _orchestrator(name)
+    orch.process_user_query(query)
+
+
+def _orchestrator(name, **kwargs):
+    orch = Orchestrator(network_name=name, n_clusters=N_CLUSTERS, **kwargs)
+    orch.solve_power_flow()
+    return orch
+
+
+# --- Measurement ---
+
+def measure(setup, run, repeat):
+    """Median/min wall time over `repeat` runs, then one traced run for allocations and peak memory."""
+    times = []
+    for _ in range(repeat):
+        args = setup()
+        gc.collect()
+        start = time.perf_counter()
+        run(*args)
+        times.append(time.perf_counter() - start)
+
+    args = setup()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    base_current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    run(*args)
+    current, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    new_blocks = sum(max(0, stat.count_diff) for stat in after.compare_to(before, "filename"))
+
+    return {
+        "median_s": statistics.median(times),
+        "min_s": min(times),
+        "alloc_mb": (current - base_current) / 1e6,
+        "alloc_blocks": new_blocks,
+        "peak_mb": (peak - base_current) / 1e6,
+    }
+
+
+def run_suite(grids, stages, repeat, latency):
+    llm_client.CACHE_ENABLED = False  # every call must pay the (fake) model latency
+    fake = FakeGenAIClient(latency=latency, structured_outputs={"ScenarioResponse": CANNED_SCENARIO,
+                                                                           "ScenarioCandidates": CANNED_CANDIDATES})
+    previous = llm_client.set_client(fake)
+    rows = []
+    try:
+        for grid in grids:
+            base = build_grid(grid)
+            print(f"\n=== {grid}: {len(base.bus)} buses, {len(base.line)} lines ===")
+            for stage in stages:
+                if stage in ORCHESTRATOR_STAGES and grid.startswith("synth-"):
+                    continue
+                setup, run = STAGES[stage]
+                calls_before = fake.calls
+                result = measure(lambda: setup(grid, base), run, repeat)
+                result.update(grid=grid, stage=stage, llm_calls=(fake.calls - calls_before) // (repeat + 1))
+                rows.append(result)
+                print(f"{stage:<26} {result['median_s'] * 1000:9.1f} ms  peak {result['peak_mb']:7.2f} MB")
+    finally:
+        llm_client.set_client(previous)
+    return rows
+
+
+# --- Baselines ---
+
+def _meta(args):
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandapower": pp.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "repeat": args.repeat,
+        "llm_latency_s": args.latency,
+    }
+
+
+def save_baseline(name, rows, meta):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = os.path.join(BASELINE_DIR, f"{name}.json")
+    with open(path, "w") as f:
+        json.dump({"meta": meta, "results": rows}, f, indent=2)
+    print(f"\nBaseline saved to {path}")
+
+
+def compare(name, rows, threshold, min_delta_s=0.005):
+    """Prints current vs baseline median times; returns the regressed (grid, stage) pairs."""
+    path = os.path.join(BASELINE_DIR, f"{name}.json")
+    with open(path) as f:
+        baseline = {(r["grid"], r["stage"]): r for r in json.load(f)["results"]}
+    table, regressions = [], []
+    for row in rows:
+        old = baseline.get((row["grid"], row["stage"]))
+        if old is None:
+            continue
+        ratio = row["median_s"] / old["median_s"] if old["median_s"] else float("inf")
+        regressed = ratio > threshold and row["median_s"] - old["median_s"] > min_delta_s
+        if regressed:
+            regressions.append((row["grid"], row["stage"]))
+        table.append({"grid": row["grid"], "stage": row["stage"], "baseline_ms": old["median_s"] * 1000,
+                      "current_ms": row["median_s"] * 1000, "ratio": ratio,
+                      "peak_mb_delta": row["peak_mb"] - old["peak_mb"], "regressed": regressed})
+    print(f"\n--- Comparison with baseline '{name}' (regression: > {threshold:.2f}x) ---")
+    print(pd.DataFrame(table).round(3).to_markdown(index=False) if table else "No overlapping results.")
+    return regressions
+
+
+def check_budgets(rows):
+    """Prints every budgeted result against its BUDGETS entry; returns the (grid, stage) pairs over budget."""
+    over = []
+    for row in rows:
+        budget = BUDGETS.get((row["grid"], row["stage"]))
+        if budget is None:
+            continue
+        max_s, max_mb = budget
+        ok = row["median_s"] <= max_s and row["peak_mb"] <= max_mb
+        print(f"{row['grid']}/{row['stage']}: {row['median_s']:.2f}s (budget {max_s:.0f}s), "
+              f"peak {row['peak_mb']:.0f} MB (budget {max_mb:.0f} MB) -> {'ok' if ok else 'OVER BUDGET'}")
+        if not ok:
+            over.append((row["grid"], row["stage"]))
+    return over
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GemmaPower pipeline benchmarks (offline).")
+    parser.add_argument("--grids", nargs="+", default=DEFAULT_GRIDS,
+                        help="pandapower cases (case57, case118, case9241pegase, ...), synth-<n_buses>")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake LLM latency per call (s)")
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--json", metavar="PATH", help="Also write the raw results to PATH")
+    parser.add_argument("--check-budgets", action="store_true", help="Fail if a stage exceeds its entry in BUDGETS")
+    args = parser.parse_args()
+
+    rows = run_suite(args.grids, args.stages, args.repeat, args.latency)
+    frame = pd.DataFrame(rows)[["grid", "stage", "median_s", "min_s", "alloc_mb", "alloc_blocks", "peak_mb", "llm_calls"]]
+    print("\n" + frame.round(4).to_markdown(index=False))
+
+    meta = _meta(args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"meta": meta, "results": rows}, f, indent=2)
+    if args.save_baseline:
+        save_baseline(args.save_baseline, rows, meta)
+    if args.compare:
+        regressions = compare(args.compare, rows, args.threshold)
+        if regressions and args.fail_on_regression:
+            print(f"\n{len(regressions)} regression(s): {regressions}")
+            sys.exit(1)
+    if args.check_budgets:
+        over = check_budgets(rows)
+        if over:
+            print(f"\n{len(over)} stage(s) over budget: {over}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
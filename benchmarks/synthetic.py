@@ -0,0 +1,46 @@
+import numpy as np
+import pandapower as pp
+
+
+def synthetic_grid(n_buses=1000, seed=0, mesh_ratio=0.1):
+    """
+    Builds a meshed 110 kV test grid of about `n_buses` buses on a square lattice, with
+    bus coordinates (so spatial clustering works), loads on most buses, voltage-controlled
+    generators spread over the lattice and one external grid. Deterministic for a given seed.
+
+    Args:
+        n_buses (int): Approximate number of buses (rounded to a full lattice).
+        seed (int): Random seed for line lengths, loads and generator placement.
+        mesh_ratio (float): Fraction of cells that get an extra diagonal line.
+    """
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(n_buses)))
+    net = pp.create_empty_network(name=f"synthetic-{side * side}")
+
+    # Coordinates in degrees around a fictitious area, ~10 km spacing
+    positions = [(r, c) for r in range(side) for c in range(side)]
+    buses = pp.create_buses(net, len(positions), vn_kv=110.0,
+                            geodata=[(8.0 + c * 0.1, 50.0 + r * 0.1) for r, c in positions])
+    bus_at = {pos: b for pos, b in zip(positions, buses)}
+
+    edges = []
+    for (r, c), b in bus_at.items():
+        if c + 1 < side:
+            edges.append((b, bus_at[(r, c + 1)]))
+        if r + 1 < side:
+            edges.append((b, bus_at[(r + 1, c)]))
+        if r + 1 < side and c + 1 < side and rng.random() < mesh_ratio:
+            edges.append((b, bus_at[(r + 1, c + 1)]))
+    from_bus, to_bus = np.array(edges).T
+    pp.create_lines(net, from_bus, to_bus, length_km=rng.uniform(5.0, 15.0, len(edges)),
+                    std_type="149-AL1/24-ST1A 110.0")
+
+    load_buses = buses[rng.random(len(buses)) < 0.7]
+    p_load = rng.uniform(1.0, 6.0, len(load_buses))
+    pp.create_loads(net, load_buses, p_mw=p_load, q_mvar=p_load * 0.2)
+
+    pp.create_ext_grid(net, buses[0], vm_pu=1.02)
+    gen_buses = rng.choice(buses[1:], size=max(1, len(buses) // 12), replace=False)
+    # Generators cover the demand locally; the external grid only balances losses
+    pp.create_gens(net, gen_buses, p_mw=np.full(len(gen_buses), p_load.sum() / len(gen_buses)), vm_pu=1.02)
+    return net
@@ -0,0 +1,42 @@
+# Gunicorn settings for the API server (used by the Dockerfile and render.yaml):
+#   gunicorn -c gunicorn.conf.py src.api.main:app
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+# One worker, one thread unless configured (WEB_CONCURRENCY / GUNICORN_THREADS)
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+threads = int(os.environ.get("GUNICORN_THREADS", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+
+# With SHARED_TEMPLATES=1 workers map the same template files copy-on-write (see src/shared_arrays.py),
+# so each base case is held in memory once however many workers run. Point TEMPLATE_CACHE_DIR at
+# /dev/shm to keep the files off disk (mind Docker's 64 MB /dev/shm default on large cases).
+SHARED_TEMPLATES = os.environ.get("SHARED_TEMPLATES", "0").lower() in ("1", "true", "yes")
+if SHARED_TEMPLATES:
+    os.environ.setdefault("TEMPLATE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "gemmapower-templates"))
+
+# Templates built before any worker starts: comma-separated case[:n_clusters[:partitioner]],
+# e.g. "case57,case118:4,case9241pegase:8:topology" (defaults as for POST /load: 3 clusters, spatial)
+PRELOAD_CASES = os.environ.get("PRELOAD_CASES", "")
+
+
+def on_starting(server):
+    """Runs once in the master process: publishes the PRELOAD_CASES templates, so workers only attach to them."""
+    if not PRELOAD_CASES.strip():
+        return
+    from src.templates import TemplateCache
+    cache_dir = os.environ.get("TEMPLATE_CACHE_DIR")
+    if not cache_dir:
+        server.log.warning("PRELOAD_CASES needs TEMPLATE_CACHE_DIR (or SHARED_TEMPLATES=1) to reach the workers.")
+        return
+    cache = TemplateCache(cache_dir=cache_dir, shared=SHARED_TEMPLATES)
+    for spec in PRELOAD_CASES.split(","):
+        if not spec.strip():
+            continue
+        name, n_clusters, partitioner = (spec.strip().split(":") + [None, None])[:3]
+        try:
+            cache.warm(name, int(n_clusters or 3), partitioner or "spatial")
+        except Exception as e:
+            server.log.warning(f"Could not preload template {spec}: {e}")
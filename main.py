@@ -43,8 +43,11 @@ def process_query(orch, query):
     # Simple intent detection (can be improved with LLM router later)
     # If the user asks to "outage", "modify", "increase", "create case", etc., we use the scenario modifier.
     modification_keywords = ["outage", "modify", "increase", "decrease", "set", "create case", "disconnect", "change"]
+    contingency_keywords = ["contingency", "contingencies", "n-1", "n-2"]
     
-    if any(k in query.lower() for k in modification_keywords):
+    if any(k in query.lower() for k in contingency_keywords):
+        response = orch.process_contingency_query(query)
+    elif any(k in query.lower() for k in modification_keywords):
         response = orch.process_scenario_modification(query)
     else:
         response = orch.process_user_query(query)
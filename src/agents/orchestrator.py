@@ -1,35 +1,131 @@
-from src.network_manager import load_network, cluster_spatially, get_region_data
+from src.network_manager import load_network, cluster_spatially, cluster_by_topology, get_regions_data
+from src.region_tracker import RegionTracker
 from src.agents.region_agent import RegionAgent
 from src.agents.scenario_builder import ScenarioBuilder
-from src.llm_client import query_gemini
-import copy
+from src.llm_client import query_gemini, stream_gemini
+from src.concurrency import iter_concurrently, run_concurrently
+from src.transaction import NetworkTransaction
+from src.powerflow import PowerFlowSession, classify_actions, CLEAN, TOPOLOGY
+from src.contingency import run_contingency_analysis, contingency_to_text
+from src.timeseries import run_timeseries, summary_to_text
+from src.telemetry import span, traced, SCENARIO_ATTEMPTS, SCENARIO_RETRIES, ROUTED_QUERIES, AGENTS_PER_QUERY
+from src.router import route_query
+from src.speculative import evaluate_candidates, select_candidate, baseline_metrics
+from src.violations import ViolationIndex
+from src.scenarios import ScenarioStore, BASE_SCENARIO
+from functools import partial
+from collections import deque
+
+def _cap(text, limit):
+    """Truncates text to about `limit` characters, marking the cut."""
+    if len(text) <= limit:
+        return text
+    return text[:max(0, limit)].rstrip() + "\n[... truncated]"
+
+def _section_title(cluster_ids):
+    if len(cluster_ids) == 1:
+        return f"REGION {cluster_ids[0]} REPORT"
+    return f"REGIONS {', '.join(map(str, cluster_ids))} SUMMARY"
 
 class Orchestrator:
-    def __init__(self, network_name="case57", n_clusters=4):
+    def __init__(self, network_name="case57", n_clusters=4, parallel=True, max_workers=None, agent_timeout=60.0,
+                 partitioner="spatial", context_mode="auto", token_budget=1500, template_cache=None, routing=True,
+                 reduce_fan_in=8, reduce_max_chars=24000, speculative_candidates=0, speculative_workers=None):
+        """
+        Args:
+            network_name (str): pandapower case to load.
+            n_clusters (int): Number of regions / Region Agents.
+            partitioner (str): "spatial" (k-means on bus coordinates) or "topology"
+                (spectral partitioning of the line graph, fewer tie-lines).
+            context_mode (str): Region context serialization, "markdown", "compact" (token-budgeted)
+                or "auto" (markdown for small regions, compact for large ones).
+            token_budget (int): Approximate token budget per region context in compact mode.
+            parallel (bool): Dispatch region agents concurrently (False = one after another).
+            max_workers (int): Concurrency limit for parallel dispatch (default: one worker per region).
+            agent_timeout (float): Seconds a single region agent may take before its report is dropped.
+            template_cache (TemplateCache): If given, start from a private copy of the prebuilt
+                (clustered, solved, serialized) template for this configuration instead of building it.
+            routing (bool): Send questions that name specific elements or regions only to the agents
+                owning them (False = always ask every region).
+            reduce_fan_in (int): With more regional reports than this, they are merged in groups of
+                reduce_fan_in (in parallel, level by level) before the final synthesis, so the number of
+                sequential LLM calls grows logarithmically with the region count (None = one flat synthesis).
+            reduce_max_chars (int): Cap on the reports part of every synthesis / merge prompt; longer
+                reports are truncated to an equal share of it.
+            speculative_candidates (int): If > 1, scenario modifications ask the LLM for this many
+                alternative action sets at once and validate them side by side instead of retrying
+                one at a time (0 = serial retry loop).
+            speculative_workers (int): Worker processes for validating candidates (default: CPU count;
+                0 or 1 validates them one after another on the live network).
+        """
         print("Orchestrator initializing...")
+        template = None
+        if template_cache is not None:
+            template = template_cache.checkout(network_name, n_clusters, partitioner, context_mode, token_budget)
+        
         # 1. Load & Cluster Grid
-        self.net = load_network(network_name)
-        self.net = cluster_spatially(self.net, n_clusters=n_clusters)
+        if template is not None:
+            self.net = template["net"]
+        else:
+            self.net = load_network(network_name)
+            if partitioner == "topology":
+                self.net = cluster_by_topology(self.net, n_clusters=n_clusters)
+            elif partitioner == "spatial":
+                self.net = cluster_spatially(self.net, n_clusters=n_clusters)
+            else:
+                raise ValueError(f"Unknown partitioner: {partitioner}")
         self.n_clusters = n_clusters
+        self.partitioner = partitioner
+        self.parallel = parallel
+        self.max_workers = max_workers
+        self.agent_timeout = agent_timeout
+        self.routing = routing
+        self.reduce_fan_in = reduce_fan_in
+        self.reduce_max_chars = reduce_max_chars
+        self.speculative_candidates = speculative_candidates
+        self.speculative_workers = speculative_workers
         
         # 2. Spawn Agents
+        self.tracker = RegionTracker(self.net)
         self.agents = {}
+        if template is None:
+            regions = get_regions_data(self.net, list(range(n_clusters)), bus_cluster=self.tracker.bus_cluster)
         for i in range(n_clusters):
             print(f"Spawning Region Agent {i}...")
-            r_data = get_region_data(self.net, i)
-            self.agents[i] = RegionAgent(r_data)
+            if template is not None:
+                self.agents[i] = RegionAgent(template["regions"][i], context_mode=context_mode, token_budget=token_budget,
+                                             context_text=template["contexts"][i])
+            else:
+                self.agents[i] = RegionAgent(regions[i], context_mode=context_mode, token_budget=token_budget)
+        
+        # Limit violations of the latest results, refreshed incrementally after solves and before queries
+        self.violations = ViolationIndex(self.net)
+        for agent in self.agents.values():
+            agent.attach_violations(self.violations)
         
-        # 3. Initialize Scenario Builder
-        self.scenario_builder = ScenarioBuilder(self.net)
+        # Results of the last time-series study (TimeSeriesStore), if any
+        self.timeseries = None
+        
+        # 3. Initialize Power Flow Session & Scenario Builder
+        self.pf_session = PowerFlowSession(self.net)
+        if template is not None and template["converged"]:
+            # The template carries the solved base case (results and internal model)
+            self.pf_session.pending = CLEAN
+        self.scenario_builder = ScenarioBuilder(self.net, session=self.pf_session)
+        
+        # 4. Committed modifications, as a tree of deltas on top of the base case
+        self.scenarios = ScenarioStore(self.net)
             
     def process_user_query(self, user_prompt):
         """
         Map-Reduce Flow:
         1. Parse user prompt to generate sub-prompts for regions.
-        2. Dispatch to agents.
+        2. Dispatch to the relevant agents (see route_query).
         3. Synthesize results.
         """
         print(f"\nProcessing User Query: '{user_prompt}'")
+        self.refresh_regions()
+        targets = self.route(user_prompt)
         
         # Step 1: Map (Simple approach: Ask everyone the same relevant question, 
         # or ask LLM how to split it. For Phase 1, we send the prompt to all specific to their region)
@@ -37,30 +133,268 @@ class Orchestrator:
         sub_prompt = f"Regarding your specific region: {user_prompt}"
         
         # Step 2: Dispatch
-        agent_responses = {}
-        for cluster_id, agent in self.agents.items():
-            resp = agent.analyze(sub_prompt)
-            agent_responses[cluster_id] = resp
+        agent_responses, failures = self._dispatch_agents(sub_prompt, targets)
+        
+        if not agent_responses:
+            details = "; ".join(f"Region {cid}: {err}" for cid, err in sorted(failures.items()))
+            return f"No regional reports were available. {details}"
             
-        # Step 3: Reduce (Synthesize)
+        # Step 3: Reduce (Synthesize), through intermediate merges when there are many regions
         print("Synthesizing results...")
-        combined_text = "--- REGIONAL REPORTS ---\n"
-        for cid, text in agent_responses.items():
-            combined_text += f"\nREGION {cid} REPORT:\n{text}\n"
+        sections = self._reduce(user_prompt, agent_responses)
+        prompt, final_system_prompt = self._synthesis_request(user_prompt, sections, failures, targets)
+        with span("orchestrator.synthesis", regions=len(agent_responses), prompt_chars=len(prompt)):
+            final_response = query_gemini(prompt, system_instruction=final_system_prompt)
+        
+        return final_response
+
+    def stream_user_query(self, user_prompt):
+        """
+        Streaming variant of process_user_query. Yields event dicts as work progresses:
+          {"event": "start", "regions": [...]}
+          {"event": "region", "cluster_id": .., "status": "ok" | "failed", "text" | "error": ..}  (per region, as it finishes)
+          {"event": "reduce", "level": .., "groups": ..}  (per intermediate merge level, many-region grids only)
+          {"event": "token", "text": ..}  (synthesized answer, chunk by chunk)
+          {"event": "done", "response": full answer}
+        """
+        print(f"\nStreaming User Query: '{user_prompt}'")
+        self.refresh_regions()
+        targets = self.route(user_prompt)
+        yield {"event": "start", "regions": sorted(targets if targets is not None else self.agents)}
+        
+        sub_prompt = f"Regarding your specific region: {user_prompt}"
+        agent_responses, failures = {}, {}
+        for cid, resp, err in self._iter_agents(sub_prompt, targets):
+            if err is None:
+                agent_responses[cid] = resp
+                yield {"event": "region", "cluster_id": cid, "status": "ok", "text": resp}
+            else:
+                failures[cid] = str(err) or type(err).__name__
+                yield {"event": "region", "cluster_id": cid, "status": "failed", "error": failures[cid]}
+        
+        if not agent_responses:
+            details = "; ".join(f"Region {cid}: {err}" for cid, err in sorted(failures.items()))
+            message = f"No regional reports were available. {details}"
+            yield {"event": "done", "response": message}
+            return
+        
+        for level, sections in self._iter_reduce(user_prompt, agent_responses):
+            if level > 0:
+                yield {"event": "reduce", "level": level, "groups": len(sections)}
+        prompt, final_system_prompt = self._synthesis_request(user_prompt, sections, failures, targets)
+        chunks = []
+        for chunk in stream_gemini(prompt, system_instruction=final_system_prompt):
+            chunks.append(chunk)
+            yield {"event": "token", "text": chunk}
+        yield {"event": "done", "response": "".join(chunks)}
+
+    def route(self, user_prompt):
+        """
+        Returns the cluster ids whose agents should answer user_prompt, or None to ask
+        every region (routing disabled, global question, or nothing specific named).
+        """
+        targets, reason = route_query(user_prompt, self.tracker) if self.routing else (None, "routing disabled")
+        if targets is not None:
+            targets = {cid for cid in targets if cid in self.agents} or None
+        n_agents = len(targets) if targets is not None else len(self.agents)
+        ROUTED_QUERIES.inc(mode="targeted" if targets is not None else "broadcast")
+        AGENTS_PER_QUERY.observe(n_agents)
+        print(f"Routing to {'regions ' + str(sorted(targets)) if targets is not None else 'all regions'} ({reason}).")
+        return targets
+
+    def _reduce(self, user_prompt, agent_responses):
+        """Runs _iter_reduce to the end and returns the final sections."""
+        _, sections = deque(self._iter_reduce(user_prompt, agent_responses), maxlen=1)[0]
+        return sections
+
+    def _iter_reduce(self, user_prompt, agent_responses):
+        """
+        Tree-reduces the regional reports: while there are more than reduce_fan_in sections,
+        merges them in groups of reduce_fan_in with one LLM call per group (all groups of a
+        level run concurrently). Yields (level, sections) for the initial reports (level 0)
+        and after every merge level; sections is a list of (cluster_ids, text).
+        """
+        sections = [([cid], agent_responses[cid]) for cid in sorted(agent_responses)]
+        level = 0
+        yield level, sections
+        fan_in = self.reduce_fan_in
+        while fan_in and fan_in > 1 and len(sections) > fan_in:
+            level += 1
+            groups = [sections[i:i + fan_in] for i in range(0, len(sections), fan_in)]
+            print(f"Reduce level {level}: merging {len(sections)} reports into {len(groups)} summaries...")
+            tasks = {i: partial(self._merge_reports, user_prompt, group) for i, group in enumerate(groups) if len(group) > 1}
+            with span("orchestrator.reduce_level", level=level, groups=len(groups)):
+                merged, errors = run_concurrently(tasks, max_workers=self.max_workers if self.parallel else 1,
+                                                  timeout=self.agent_timeout)
+            next_sections = []
+            for i, group in enumerate(groups):
+                cluster_ids = [cid for ids, _ in group for cid in ids]
+                if len(group) == 1:
+                    next_sections.append(group[0])
+                elif i in merged:
+                    next_sections.append((cluster_ids, merged[i]))
+                else:
+                    # Keep the (truncated) reports themselves rather than losing these regions
+                    print(f"Merging {_section_title(cluster_ids)} failed: {errors[i]}")
+                    next_sections.append((cluster_ids, self._reports_text(group)))
+            sections = next_sections
+            yield level, sections
+
+    def _reports_text(self, sections):
+        """Formats sections with each one capped to an equal share of reduce_max_chars."""
+        limit = self.reduce_max_chars // max(1, len(sections))
+        return "".join(f"\n{_section_title(ids)}:\n{_cap(text, limit)}\n" for ids, text in sections)
+
+    def _merge_reports(self, user_prompt, sections):
+        """One intermediate reduce step: merges a group of reports into one summary."""
+        system_instruction = (
+            "You are a Regional Coordinator of a power network. You have received reports covering part of the network.\n"
+            "Merge them into one concise summary that answers the user's query for these regions.\n"
+            "Keep element ids, values and any violations; leave out what does not matter for the query."
+        )
+        return query_gemini(f"User Query: {user_prompt}\n\n--- REGIONAL REPORTS ---\n{self._reports_text(sections)}",
+                            system_instruction=system_instruction)
+
+    def _synthesis_request(self, user_prompt, sections, failures, targets=None):
+        """Builds (prompt, system_instruction) for the final reduce step from the (merged) reports."""
+        combined_text = "--- REGIONAL REPORTS ---\n" + self._reports_text(sections)
+        for cid in sorted(failures):
+            combined_text += f"\nREGION {cid} REPORT: UNAVAILABLE ({failures[cid]})\n"
             
         # Final LLM call to summarize
         final_system_prompt = (
             "You are the Chief System Operator. You have received reports from regional agents.\n"
             "Synthesize these reports into a final answer for the user.\n"
-            "Highlight key findings from specific regions."
+            "Highlight key findings from specific regions.\n"
+            "If some regional reports are marked UNAVAILABLE, say that your answer does not cover those regions."
         )
+        if any(len(ids) > 1 for ids, _ in sections):
+            final_system_prompt += "\nSome reports are intermediate summaries already merged from several regions."
+        if targets is not None:
+            final_system_prompt += (
+                "\nOnly the regions containing the elements or areas named in the query were consulted; "
+                "the other regions were not asked."
+            )
+        if self.timeseries is not None:
+            combined_text += f"\n--- NETWORK TIME SERIES SUMMARY ---\n{summary_to_text(self.timeseries.summary())}\n"
+        return f"User Query: {user_prompt}\n\n{combined_text}", final_system_prompt
+
+    @traced("orchestrator.solve_power_flow")
+    def solve_power_flow(self):
+        """
+        Runs the (warm-started) power flow on the live network and marks the regions
+        whose results changed, so their agents see the new values on the next query.
+        Returns the PowerFlowSession report.
+        """
+        report = self.pf_session.solve()
+        self.tracker.mark_results_changed()
+        self.violations.refresh()
+        return report
+
+    @traced("orchestrator.refresh_regions")
+    def refresh_regions(self):
+        """
+        Re-extracts region data for dirty clusters only. Serialization happens lazily
+        in RegionAgent.context_text, so untouched regions cost nothing.
+        """
+        dirty = self.tracker.pop_dirty()
+        stale = sorted(cid for cid in dirty if cid in self.agents)
+        if stale:
+            print(f"Refreshing Region Agent context(s): {stale}")
+            regions = get_regions_data(self.net, stale, bus_cluster=self.tracker.bus_cluster)
+            for cid in stale:
+                self.agents[cid].update(regions[cid])
+        self.violations.refresh()
+        return dirty
+
+    def _iter_agents(self, sub_prompt, cluster_ids=None):
+        """
+        Sends the sub-prompt to the Region Agents in cluster_ids (default: every agent),
+        concurrently unless parallel=False, and yields (cluster_id, response, error) as each
+        agent finishes. A region that raises or exceeds agent_timeout yields an error
+        instead of aborting the query.
+        """
+        tasks = {cid: partial(agent.analyze, sub_prompt) for cid, agent in self.agents.items()
+                 if cluster_ids is None or cid in cluster_ids}
+        max_workers = self.max_workers if self.parallel else 1
         
-        final_response = query_gemini(
-            f"User Query: {user_prompt}\n\n{combined_text}", 
-            system_instruction=final_system_prompt
-        )
+        for cid, resp, err in iter_concurrently(tasks, max_workers=max_workers, timeout=self.agent_timeout):
+            if err is not None:
+                print(f"Region Agent {cid} failed: {err}")
+            yield cid, resp, err
+
+    @traced("orchestrator.dispatch")
+    def _dispatch_agents(self, sub_prompt, cluster_ids=None):
+        """
+        Collects _iter_agents into (responses, failures): dicts keyed by cluster id.
+        """
+        responses, failures = {}, {}
+        for cid, resp, err in self._iter_agents(sub_prompt, cluster_ids):
+            if err is None:
+                responses[cid] = resp
+            else:
+                failures[cid] = str(err) or type(err).__name__
+        return responses, failures
+
+    @traced("contingency.run")
+    def run_contingency_analysis(self, **kwargs):
+        """
+        Runs an N-1 (optionally N-2, n2=True) contingency sweep on the current network.
+        Keyword arguments are passed to src.contingency.run_contingency_analysis.
+        Returns the ranked violation table (DataFrame).
+        """
+        return run_contingency_analysis(self.net, **kwargs)
+
+    @traced("timeseries.run")
+    def run_timeseries(self, profiles, **kwargs):
+        """
+        Runs a time-series study (one power flow per profile step) on a copy of the current
+        network and attaches the per-region aggregates to the Region Agents, so later
+        queries can answer e.g. "when is the peak loading in region 2?".
+        Keyword arguments are passed to src.timeseries.run_timeseries.
+        Returns the TimeSeriesStore; the previous study's files are deleted first.
+        """
+        self.close_timeseries()
+        self.timeseries = run_timeseries(self.net, profiles, **kwargs)
+        for cid, agent in self.agents.items():
+            agent.attach_timeseries(self.timeseries.region_summary(self.tracker.bus_cluster, cid))
+        return self.timeseries
+
+    def close_timeseries(self):
+        """Deletes the result files of the last time-series study and forgets it."""
+        if self.timeseries is None:
+            return
+        self.timeseries.delete()
+        self.timeseries = None
+        for agent in self.agents.values():
+            agent.attach_timeseries(None)
+
+    def timeseries_summary(self):
+        """Network-wide and per-region aggregates of the last time-series study (None if none ran)."""
+        if self.timeseries is None:
+            return None
+        return self.timeseries.summary(self.tracker.bus_cluster)
+
+    def process_contingency_query(self, user_prompt):
+        """
+        Answers "what if any element trips" questions with a full contingency sweep
+        instead of one LLM-proposed outage at a time.
+        """
+        print(f"\nProcessing Contingency Query: '{user_prompt}'")
+        n2 = "n-2" in user_prompt.lower()
+        table = self.run_contingency_analysis(n2=n2)
+        summary = contingency_to_text(table)
         
-        return final_response
+        system_instruction = (
+            "You are the Chief System Operator. You have received the ranked results of an automated "
+            f"{'N-2' if n2 else 'N-1'} contingency analysis (DC screening followed by AC power flows for the critical outages).\n"
+            "Answer the user's question from these results. Name the most severe outages, the branches they overload, "
+            "any non-converged or islanding cases, and voltage violations."
+        )
+        return query_gemini(
+            f"User Query: {user_prompt}\n\n--- CONTINGENCY RESULTS ---\n{summary}",
+            system_instruction=system_instruction
+        )
 
     def process_scenario_modification(self, user_prompt):
         """
@@ -68,6 +402,8 @@ class Orchestrator:
         Uses ScenarioBuilder to parse and apply changes, with a feedback loop for errors.
         """
         print(f"\nProcessing Scenario Modification: '{user_prompt}'")
+        if self.speculative_candidates and self.speculative_candidates > 1:
+            return self._speculative_modification(user_prompt)
         
         max_retries = 5
         current_retry = 0
@@ -89,28 +425,151 @@ class Orchestrator:
             previous_actions = actions
             print(f"Proposed Actions: {actions}")
             
-            # 2. Apply Actions & Validate on COPY
+            # 2. Apply Actions & Validate on the live network inside a transaction.
+            # Only the touched cells are journaled, and everything (including power
+            # flow results) is rolled back afterwards, so no deep copy is needed.
+            transaction = NetworkTransaction(self.net)
+            change_level = classify_actions(actions)
             try:
-                print("Creating network copy...")
-                net_copy = copy.deepcopy(self.net)
-                temp_builder = ScenarioBuilder(net_copy)
-                
-                report = temp_builder.apply_actions(actions)
-                print("Actions Applied successfully to COPY.")
+                self.pf_session.invalidate(change_level)
+                report = self.scenario_builder.apply_actions(actions, transaction=transaction)
+                print("Actions applied (transaction open).")
                 
-                success, msg = temp_builder.validate_network()
+                success, msg = self.scenario_builder.validate_network()
                 
                 if success:
                     print(f"Validation Successful: {msg}")
-                    return f"Scenario modified successfully (on COPY).\nActions Taken:\n{report}\nSystem Status: {msg}"
+                    SCENARIO_ATTEMPTS.observe(current_retry + 1, outcome="ok")
+                    parent = self.scenarios.current
+                    scenario_id = self._commit_scenario(transaction, user_prompt, actions)
+                    return (f"Scenario {scenario_id} created from {parent} and is now active.\n"
+                            f"Actions Taken:\n{report}\nSystem Status: {msg}")
                 else:
                     print(f"Validation Failed: {msg}")
                     last_error = msg
                     current_retry += 1
+                    SCENARIO_RETRIES.inc(reason="validation")
                     
             except Exception as e:
                 print(f"Application/Validation Error: {e}")
                 last_error = str(e)
                 current_retry += 1
+                SCENARIO_RETRIES.inc(reason="error")
+            finally:
+                if transaction.active:
+                    transaction.rollback()
+                    # The cached power flow model and topology now reflect the rolled-back change
+                    self.pf_session.invalidate(change_level)
+                    self.scenario_builder.network_changed(transaction.touched_elements())
                 
+        SCENARIO_ATTEMPTS.observe(max_retries, outcome="failed")
         return f"Failed to modify scenario after {max_retries} attempts. Last error: {last_error}"
+
+    def _commit_scenario(self, transaction, user_prompt, actions):
+        """Keeps a validated transaction as a new scenario and marks what it changed. Returns the scenario id."""
+        scenario_id = self.scenarios.commit(transaction, description=user_prompt, actions=actions)
+        self._network_changed(transaction.touched_elements())
+        return scenario_id
+
+    def _network_changed(self, touched=None):
+        """Marks kept changes to {table: ids} (None = anything) for the regions, violations and validation."""
+        if touched is None:
+            self.tracker.rebuild_index()
+            self.tracker.mark_all()
+        else:
+            self.tracker.mark_touched(touched)
+        self.tracker.mark_results_changed()
+        self.violations.refresh()
+        self.scenario_builder.network_changed(touched)
+
+    @traced("scenarios.switch")
+    def checkout_scenario(self, scenario_id):
+        """
+        Makes a committed scenario (or "base") the active network state, inputs and power
+        flow results, by replaying deltas; later queries and modifications start from it.
+        """
+        touched = self.scenarios.checkout(scenario_id)
+        # The solver model no longer matches the network; the restored results still do
+        self.pf_session.invalidate(TOPOLOGY)
+        self._network_changed(touched)
+        return self.scenarios.scenarios[scenario_id]
+
+    def diff_scenarios(self, a, b, top_n=10):
+        """Input and result differences between two scenarios (see ScenarioStore.diff)."""
+        return self.scenarios.diff(a, b, top_n=top_n)
+
+    def save_scenarios(self, path):
+        """Writes the scenario tree to path. Returns the file size in bytes."""
+        return self.scenarios.save(path)
+
+    def load_scenarios(self, path):
+        """
+        Replaces the scenario tree with one saved for the same case. The network is first
+        switched back to its base state, then to the scenario that was active when saved.
+        """
+        self.checkout_scenario(BASE_SCENARIO)
+        self.scenarios = ScenarioStore.load(path, self.net)
+        self.pf_session.invalidate(TOPOLOGY)
+        self._network_changed()
+        return self.scenarios
+
+    def _speculative_modification(self, user_prompt):
+        """
+        Speculative variant of the retry loop: one LLM call proposes several alternative
+        action sets, which are validated concurrently (each on its own copy of the network).
+        The first candidate that converges within limits wins, otherwise the converged one
+        with the fewest / mildest violations. Only if none converges are the failures fed
+        back for another round.
+        """
+        max_rounds = 2
+        last_error = None
+        previous_candidates = None
+        baseline = baseline_metrics(self.net)
+        
+        for round_no in range(1, max_rounds + 1):
+            candidates = self.scenario_builder.propose_candidates(
+                user_prompt, self.speculative_candidates, last_error, previous_candidates)
+            if not candidates:
+                print("Could not parse actions from LLM.")
+                return "I couldn't understand the request to modify the network."
+            
+            print(f"Round {round_no}: validating {len(candidates)} candidate action set(s)...")
+            results = evaluate_candidates(self.net, candidates, n_workers=self.speculative_workers, session=self.pf_session)
+            best = select_candidate(results, baseline)
+            
+            if best is None:
+                last_error = " | ".join(f"Candidate {i + 1}: {r['message']}" for i, r in enumerate(results))
+                previous_candidates = candidates
+                print(f"No candidate converged: {last_error}")
+                SCENARIO_RETRIES.inc(reason="speculative")
+                continue
+            
+            result = results[best]
+            SCENARIO_ATTEMPTS.observe(round_no, outcome="ok")
+            status = result["message"]
+            added = result.get("n_violations", 0) - (baseline["n_violations"] if baseline is not None else 0)
+            if added > 0:
+                status += (f" It adds {added} limit violation(s) "
+                           f"(max loading {result['max_loading_percent']:.1f}%, "
+                           f"voltage {result['min_vm_pu']:.3f}-{result['max_vm_pu']:.3f} pu).")
+            print(f"Selected candidate {best + 1} of {len(candidates)}: {status}")
+            # Candidates were validated on copies / rolled back; apply the winner for good
+            parent = self.scenarios.current
+            transaction = NetworkTransaction(self.net)
+            self.pf_session.invalidate(classify_actions(candidates[best]))
+            try:
+                self.scenario_builder.apply_actions(candidates[best], transaction=transaction)
+                self.pf_session.solve()
+                scenario_id = self._commit_scenario(transaction, user_prompt, candidates[best])
+            except Exception as e:
+                if transaction.active:
+                    transaction.rollback()
+                self.pf_session.invalidate(classify_actions(candidates[best]))
+                self.scenario_builder.network_changed(transaction.touched_elements())
+                return f"Selected candidate {best + 1} could not be applied to the live network: {e}"
+            return (f"Scenario {scenario_id} created from {parent} and is now active.\n"
+                    f"Actions Taken:\n{result['report']}\nSystem Status: {status}\n"
+                    f"(Selected candidate {best + 1} of {len(candidates)}.)")
+        
+        SCENARIO_ATTEMPTS.observe(max_rounds, outcome="failed")
+        return f"Failed to modify scenario after {max_rounds} speculative rounds. Last errors: {last_error}"
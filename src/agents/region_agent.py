@@ -1,16 +1,59 @@
-from src.serializer import region_to_text
+from src.serializer import region_to_text, region_to_compact_text
 from src.llm_client import query_gemini
+from src.timeseries import summary_to_text
+from src.violations import violations_to_text
+from src.telemetry import span
+
+# In "auto" context mode, regions with more element rows than this get the compact context
+AUTO_MARKDOWN_MAX_ROWS = 400
 
 class RegionAgent:
-    def __init__(self, region_data):
+    def __init__(self, region_data, context_mode="auto", token_budget=1500, context_text=None):
         """
         Args:
             region_data (dict): Data for this region (from network_manager).
+            context_mode (str): "markdown" (full tables), "compact" (token-budgeted summary) or
+                "auto" (markdown unless the region has more than AUTO_MARKDOWN_MAX_ROWS elements).
+            token_budget (int): Approximate prompt budget for the region context in compact mode.
+            context_text (str): Already serialized context for region_data (e.g. from a template).
         """
         self.region_data = region_data
         self.cluster_id = region_data['cluster_id']
-        self.context_text = region_to_text(region_data)
+        self.context_mode = context_mode
+        self.token_budget = token_budget
+        self._context_text = context_text
+        self.timeseries_summary = None
+        self.violations = None
+
+    @property
+    def context_text(self):
+        """Serialized region data, built lazily and cached until update() is called."""
+        if self._context_text is None:
+            if self._use_compact():
+                self._context_text = region_to_compact_text(self.region_data, token_budget=self.token_budget)
+            else:
+                self._context_text = region_to_text(self.region_data)
+        return self._context_text
+
+    def _use_compact(self):
+        if self.context_mode == "auto":
+            rows = sum(len(self.region_data[key]) for key in ("buses", "lines", "loads", "gens", "sgens"))
+            return rows > AUTO_MARKDOWN_MAX_ROWS
+        return self.context_mode == "compact"
+
+    def update(self, region_data):
+        """Replaces the region data after a network change; the context is re-serialized on next use."""
+        self.region_data = region_data
+        self._context_text = None
         
+    def attach_timeseries(self, summary):
+        """Adds a region's time-series aggregates (TimeSeriesStore.region_summary) to future prompts."""
+        self.timeseries_summary = summary
+
+    def attach_violations(self, index):
+        """Adds the region's limit violations from a ViolationIndex (read at prompt time) to future prompts."""
+        self.violations = index
+
     def analyze(self, sub_prompt):
         """
         Analyzes the region based on the Orchestrator's sub-prompt.
@@ -25,11 +68,24 @@ class RegionAgent:
         full_prompt = (
             f"--- REGION {self.cluster_id} DATA ---\n"
             f"{self.context_text}\n\n"
+        )
+        if self.violations is not None:
+            full_prompt += (
+                f"--- REGION {self.cluster_id} LIMIT VIOLATIONS (latest power flow, most severe first) ---\n"
+                f"{violations_to_text(self.violations.query(cluster_id=self.cluster_id))}\n\n"
+            )
+        if self.timeseries_summary is not None:
+            full_prompt += (
+                f"--- REGION {self.cluster_id} TIME SERIES RESULTS (step 0 = start of the profile) ---\n"
+                f"{summary_to_text(self.timeseries_summary)}\n\n"
+            )
+        full_prompt += (
             f"--- QUERY ---\n"
             f"{sub_prompt}"
         )
         
         # Call LLM
         print(f"Agent {self.cluster_id} processing query...")
-        response = query_gemini(full_prompt, system_instruction=system_instruction)
+        with span("agent.analyze", cluster_id=self.cluster_id, prompt_chars=len(full_prompt)):
+            response = query_gemini(full_prompt, system_instruction=system_instruction)
         return response
@@ -1,17 +1,56 @@
-from src.schema import ScenarioResponse
+import json
+from src.schema import ScenarioResponse, ScenarioCandidates
+from src.command_parser import parse_command
 from src.llm_client import query_gemini
+from src.llm_scheduler import LLMError
+from src.powerflow import PowerFlowSession
+from src.region_tracker import ELEMENT_BUS_COLUMNS
+from src.telemetry import span, traced, VALIDATION_FAILURES
+from src.validation import GridTopology, GRAPH_COLUMNS, DEFAULT_DC_FAIL_LOADING, dc_baseline, dc_screen
+import numpy as np
+import pandas as pd
 import pandapower as pp
 
+def _widen_for(values, value):
+    """Returns `values`, upcast if needed so `value` can be stored without being truncated."""
+    if values.dtype.kind == 'O':
+        return values
+    try:
+        dtype = np.result_type(values.dtype, np.asarray(value).dtype)
+    except TypeError:
+        dtype = np.dtype(object)
+    if dtype.kind in 'USV':
+        dtype = np.dtype(object)
+    return values if dtype == values.dtype else values.astype(dtype)
+
+def _zone_mask(zones, zone):
+    """Matches zone labels as text, or numerically when both sides are numbers (zone 1 == 1.0)."""
+    mask = (zones.astype(str) == str(zone)).values
+    try:
+        mask |= (pd.to_numeric(zones, errors='coerce') == float(zone)).values
+    except (TypeError, ValueError):
+        pass
+    return mask
+
 class ScenarioBuilder:
-    def __init__(self, net):
+    def __init__(self, net, session=None, staged_validation=True, dc_fail_loading=DEFAULT_DC_FAIL_LOADING):
+        """
+        Args:
+            session (PowerFlowSession): Shared power flow session (keeps the last solution / Ybus between validations).
+            staged_validation (bool): Check connectivity and screen with a DC power flow before the AC solve.
+            dc_fail_loading (float): Estimated DC branch loading (%) above which a scenario is rejected.
+        """
         self.net = net
+        self.session = session if session is not None else PowerFlowSession(net)
+        self.staged_validation = staged_validation
+        self.dc_fail_loading = dc_fail_loading
+        self._topology = None  # GridTopology, built before the first scenario is applied
+        self._dc_baseline = None  # DC estimates of the network before the first scenario
+        self.last_validation = []  # stage results of the last validate_network call
         self.max_feedback_loops = 3
  
-    def parse_actions(self, user_instruction, previous_error=None, previous_actions=None):
-        """
-        Uses LLM to convert natural language instructions into structured JSON actions using Pydantic.
-        """
-        system_instruction = (
+    def _system_instruction(self):
+        return (
             "You are a Power System Operator Assistant. Convert natural language instructions into structured network actions.\n"
             "VALID PARAMETERS CHEAT SHEET:\n"
             "- Load: p_mw, q_mvar, scaling, in_service\n"
@@ -19,17 +58,36 @@ class ScenarioBuilder:
             "- Line: r_ohm_per_km, x_ohm_per_km, c_nf_per_km, max_i_ka, in_service (CANNOT directly set power/load)\n"
             "- Bus: vn_kv, in_service\n"
             "If user asks to modify a Line's power, you cannot do it directly. You must ignore or explain, strictly outputting valid actions.\n"
-            "You can use relative values like '+10%' or '-5%' in the parameters for numeric fields."
+            "You can use relative values like '+10%' or '-5%' in the parameters for numeric fields.\n"
+            "To change many elements at once (e.g. 'all loads in region 2'), leave id empty and set a selector "
+            "with buses, cluster or zone; an empty selector matches every element of that component."
         )
 
+    def _prompt(self, user_instruction, previous_error=None, previous_actions=None):
         prompt = (
             f"Context: You are controlling a power grid simulator (pandapower). "
             f"The user wants to modify the grid state.\n"
             f"Instruction: {user_instruction}\n"
         )
-        
         if previous_error:
             prompt += f"\nPREVIOUS ATTEMPT FAILED.\nError: {previous_error}\nPrevious Actions: {previous_actions}\nPlease correct the actions."
+        return prompt
+
+    def parse_actions(self, user_instruction, previous_error=None, previous_actions=None):
+        """
+        Uses LLM to convert natural language instructions into structured JSON actions using Pydantic.
+        Common commands ("outage line 7", "increase gen 2 by 10%") are parsed locally
+        first; the LLM is only called when the local parser can't handle the instruction
+        or when correcting a previous failed attempt.
+        """
+        if previous_error is None:
+            actions = parse_command(user_instruction)
+            if actions is not None:
+                print("Parsed instruction locally (no LLM call).")
+                return actions
+
+        system_instruction = self._system_instruction()
+        prompt = self._prompt(user_instruction, previous_error, previous_actions)
 
         try:
             # Get raw JSON string from Gemini (validated by schema)
@@ -45,73 +103,280 @@ class ScenarioBuilder:
             # Convert back to list of dicts for applying
             return [action.model_dump() for action in scenario.actions]
             
+        except LLMError:
+            # The model was unreachable: asking again with the same prompt would not help
+            raise
         except Exception as e:
             print(f"Failed to parse actions: {e}")
             return None
 
-    def apply_actions(self, actions):
+    def propose_candidates(self, user_instruction, n_candidates=3, previous_error=None, previous_actions=None):
+        """
+        Speculative variant of parse_actions: asks the LLM for up to n_candidates alternative
+        action sets in one structured response (most likely interpretation first), so they
+        can be validated side by side instead of one retry at a time.
+        A locally parsed command is unambiguous and yields a single candidate.
+        Returns a list of action lists (duplicates removed), or None.
+        """
+        if previous_error is None:
+            actions = parse_command(user_instruction)
+            if actions is not None:
+                print("Parsed instruction locally (no LLM call).")
+                return [actions]
+
+        system_instruction = self._system_instruction() + (
+            f"\nPropose up to {n_candidates} alternative action sets that each fulfill the instruction, "
+            "most likely interpretation first. Vary the interpretation where the instruction is ambiguous "
+            "(e.g. which elements are meant, absolute vs relative values); do not repeat identical sets."
+        )
+        prompt = self._prompt(user_instruction, previous_error, previous_actions)
+        try:
+            response_text = query_gemini(
+                prompt,
+                system_instruction=system_instruction,
+                response_schema=ScenarioCandidates.model_json_schema()
+            )
+            response = ScenarioCandidates.model_validate_json(response_text)
+        except LLMError:
+            raise
+        except Exception as e:
+            print(f"Failed to parse candidates: {e}")
+            return None
+
+        candidates, seen = [], set()
+        for scenario in response.candidates[:n_candidates]:
+            actions = [action.model_dump() for action in scenario.actions]
+            key = json.dumps(actions, sort_keys=True, default=str)
+            if actions and key not in seen:
+                seen.add(key)
+                candidates.append(actions)
+        return candidates or None
+
+    @traced("scenario.apply_actions")
+    def apply_actions(self, actions, transaction=None):
         """
         Applies the list of actions to the pandapower network.
         Returns a list of applied descriptions or raises an error.
+        If a NetworkTransaction is given, every write is journaled through it so the
+        changes can be rolled back afterwards (instead of working on a deep copy).
+
+        Consecutive 'modify' actions are applied in bulk: they are grouped by
+        component and parameter, relative values ("+10%") are resolved with NumPy,
+        and each column is written with a single indexed assignment. An action can
+        address one element by `id` or many through a `selector` (buses, cluster, zone).
         """
         report = []
+        pending = []  # resolved modify actions not written yet
+        if self.staged_validation:
+            if self._dc_baseline is None:
+                self._dc_baseline = self._capture_dc_baseline()
+            # Built from the untouched network, so every graph change below is seen through watch()
+            if self._topology is None:
+                self._topology = GridTopology(self.net)
         
         for action in actions:
-            comp = action['component']
-            idx = action['id']
-            act_type = action['type']
-            params = action['parameters']
-
             try:
-                if comp not in self.net:
-                    raise ValueError(f"Component type '{comp}' not found in network.")
-                
-                df = self.net[comp]
-                
-                if idx not in df.index:
-                     raise ValueError(f"{comp} with ID {idx} does not exist.")
-
-                if act_type == 'modify':
-                    for param, value in params.items():
-                        if param not in df.columns:
-                             raise ValueError(f"Parameter '{param}' not valid for {comp}. Valid columns: {list(df.columns)}")
-                        
-                        # Handle Relative Values (e.g., "+10%")
-                        current_val = df.at[idx, param]
-                        new_val = value
-                        
-                        if isinstance(value, str) and value.endswith('%'):
-                            try:
-                                percentage = float(value.rstrip('%'))
-                                # Expecting current_val to be numeric
-                                new_val = float(current_val) * (1 + percentage / 100.0)
-                            except ValueError:
-                                raise ValueError(f"Invalid percentage format: {value}")
-                        
-                        # Apply change
-                        self.net[comp].at[idx, param] = new_val
-                        report.append(f"Modified {comp} {idx}: Set {param} to {new_val} (was {current_val})")
-                        
-                elif act_type == 'create':
+                if action['type'] == 'create':
+                    # Creation may depend on earlier modifications, so flush those first
+                    report.extend(self._apply_modifications(pending, transaction))
+                    pending = []
+                    comp, params = action['component'], action['parameters']
                     # Not fully implemented for deep complexity, but basic support:
-                    pp.create_element(self.net, comp, **params) # distinct create functions in pp
+                    create_fn = getattr(pp, f"create_{comp}") # distinct create functions in pp
+                    new_idx = create_fn(self.net, **params)
+                    if transaction is not None:
+                        transaction.record_created(comp, new_idx)
                     report.append(f"Created new {comp} with params {params}")
-
+                else:
+                    targets = self._resolve_targets(action)
+                    if self._topology is not None and GRAPH_COLUMNS.intersection(action['parameters']):
+                        self._topology.watch(action['component'], targets)
+                    pending.append((action, targets))
             except Exception as e:
                 raise ValueError(f"Error applying action {action}: {str(e)}")
         
+        report.extend(self._apply_modifications(pending, transaction))
+        return report
+
+    def _resolve_targets(self, action):
+        """Returns the index labels an action addresses (its id, or every element matched by its selector)."""
+        comp = action['component']
+        if comp not in self.net:
+            raise ValueError(f"Component type '{comp}' not found in network.")
+        df = self.net[comp]
+        
+        selector = action.get('selector')
+        if selector is None:
+            idx = action.get('id')
+            if idx is None:
+                raise ValueError("Action needs either an id or a selector.")
+            if idx not in df.index:
+                raise ValueError(f"{comp} with ID {idx} does not exist.")
+            return np.array([idx])
+        
+        bus_mask = np.ones(len(self.net.bus), dtype=bool)
+        if selector.get('buses') is not None:
+            bus_mask &= self.net.bus.index.isin(selector['buses'])
+        if selector.get('cluster') is not None:
+            if 'cluster' not in self.net.bus.columns:
+                raise ValueError("Network has no clusters to select from.")
+            bus_mask &= (self.net.bus['cluster'] == selector['cluster']).values
+        if selector.get('zone') is not None:
+            if 'zone' not in self.net.bus.columns:
+                raise ValueError("Network has no zones to select from.")
+            bus_mask &= _zone_mask(self.net.bus['zone'], selector['zone'])
+        buses = self.net.bus.index[bus_mask]
+        
+        if comp == 'bus':
+            targets = buses
+        else:
+            # An element is selected if any of its terminals is
+            columns = ELEMENT_BUS_COLUMNS.get(comp)
+            if not columns:
+                raise ValueError(f"Selectors are not supported for {comp}.")
+            mask = np.zeros(len(df), dtype=bool)
+            for column in columns:
+                mask |= df[column].isin(buses).values
+            targets = df.index[mask]
+        if len(targets) == 0:
+            raise ValueError(f"Selector {selector} matches no {comp} elements.")
+        return targets.to_numpy()
+
+    def _apply_modifications(self, resolved, transaction=None):
+        """
+        Writes a batch of (action, target index) pairs: one read and one indexed write per
+        (component, parameter) column. Within a column, actions apply in order, so two
+        "+10%" on the same element still compound like sequential scalar writes would.
+        """
+        report = []
+        groups = {}  # (comp, param) -> [(action, targets, value)], in action order
+        for action, targets in resolved:
+            comp = action['component']
+            df = self.net[comp]
+            for param, value in action['parameters'].items():
+                if param not in df.columns:
+                    raise ValueError(
+                        f"Error applying action {action}: Parameter '{param}' not valid for {comp}. "
+                        f"Valid columns: {list(df.columns)}"
+                    )
+                groups.setdefault((comp, param), []).append((action, targets, value))
+        
+        for (comp, param), entries in groups.items():
+            df = self.net[comp]
+            touched = pd.Index(np.concatenate([targets for _, targets, _ in entries])).unique()
+            old = df.loc[touched, param].to_numpy()
+            values = old.copy()
+            pos = touched.get_indexer
+            
+            for action, targets, value in entries:
+                rows = pos(targets)
+                before = values[rows]
+                if isinstance(value, str) and value.endswith('%'):
+                    try:
+                        percentage = float(value.rstrip('%'))
+                        # Expecting the current values to be numeric
+                        if values.dtype.kind not in 'fc':
+                            values = values.astype(float)
+                        values[rows] = values[rows] * (1 + percentage / 100.0)
+                    except (ValueError, TypeError):
+                        raise ValueError(f"Error applying action {action}: Invalid percentage format: {value}")
+                else:
+                    values = _widen_for(values, value)
+                    values[rows] = value
+                report.append(self._describe(comp, param, action, targets, value, before, values[rows]))
+            
+            # One indexed assignment per column
+            if transaction is not None:
+                transaction.set_values(comp, touched, param, values)
+            else:
+                df.loc[touched, param] = values
         return report
 
+    @staticmethod
+    def _describe(comp, param, action, targets, value, before, after):
+        if action.get('selector') is None:
+            return f"Modified {comp} {targets[0]}: Set {param} to {after[0]} (was {before[0]})"
+        selector = {k: v for k, v in action['selector'].items() if v is not None} or "all"
+        line = f"Modified {len(targets)} {comp} elements matching {selector}: Set {param} to {value}"
+        if after.dtype.kind in 'fiu' and before.dtype.kind in 'fiub':
+            line += f" (total {float(np.sum(before)):.2f} -> {float(np.sum(after)):.2f})"
+        return line
+
     def validate_network(self):
         """
-        Runs power flow and checks for convergence and limits.
-        Returns (success: bool, message: str)
+        Validates the network in stages, cheapest first, stopping at the first failure:
+        1. topology: an in-service slack exists and no loaded bus is cut off from it
+           (cached sparse graph, only the elements touched by apply_actions are re-read);
+        2. dc: vectorized DC power flow screening for extreme overloads;
+        3. ac: the full (warm-started) AC power flow.
+        Returns (success: bool, message: str). The message names the failing stage and a
+        specific reason, so the LLM retry loop can correct the actions; the stage results
+        are kept in last_validation.
         """
+        self.last_validation = []
+        notes = []
+        if self.staged_validation:
+            for stage, check in (("topology", self._check_topology), ("dc", self._check_dc)):
+                with span(f"validate.{stage}"):
+                    result = check()
+                self.last_validation.append(result)
+                if not result["ok"]:
+                    VALIDATION_FAILURES.inc(stage=stage, code=result["code"])
+                    return False, f"{stage.upper()} check failed ({result['code']}): {result['message']}"
+                if result["details"].get("n_isolated") or result["details"].get("n_overloaded"):
+                    notes.append(result["message"])  # passed with warnings
+        
         try:
-            pp.runpp(self.net)
-            return True, "Power flow converged successfully."
+            with span("scenario.validate_network") as pf_span:
+                report = self.session.solve()
+                pf_span.set(mode=report['mode'], iterations=report['iterations'])
+            self.last_validation.append({"ok": True, "stage": "ac", "code": "ok", "message": "converged", "details": report})
+            message = (
+                f"Power flow converged successfully "
+                f"({report['iterations']} iterations, {report['time_s'] * 1000:.0f} ms, {report['mode']})."
+            )
+            return True, " ".join([message] + notes)
         except pp.LoadflowNotConverged:
-            return False, "Power flow did not converge."
+            result = {"ok": False, "stage": "ac", "code": "not_converged", "details": {},
+                      "message": "Power flow did not converge."}
+        except Exception as e:
+            result = {"ok": False, "stage": "ac", "code": "error", "details": {},
+                      "message": f"Simulation error: {str(e)}"}
+        self.last_validation.append(result)
+        VALIDATION_FAILURES.inc(stage="ac", code=result["code"])
+        return False, result["message"]
+
+    def _check_topology(self):
+        if self._topology is None:
+            self._topology = GridTopology(self.net)
+        return self._topology.check()
+
+    def _capture_dc_baseline(self):
+        try:
+            return dc_baseline(self.net)
+        except Exception as e:
+            print(f"DC baseline unavailable: {e}")
+            return None
+
+    def network_changed(self, touched=None):
+        """
+        Call when the network changed outside apply_actions (committed, rolled back or restored
+        scenarios): forgets the DC baseline and re-reads the touched elements ({table: ids},
+        None = everything) at the next topology check.
+        """
+        self._dc_baseline = None
+        if self._topology is not None:
+            if touched is None:
+                self._topology = None
+            else:
+                for table, ids in touched.items():
+                    self._topology.watch(table, ids)
+
+    def _check_dc(self):
+        try:
+            return dc_screen(self.net, baseline=self._dc_baseline, fail_loading=self.dc_fail_loading)
         except Exception as e:
-            return False, f"Simulation error: {str(e)}"
+            # The screen is an optimization: if the DC model can't be built, leave it to the AC solve
+            print(f"DC screening skipped: {e}")
+            return {"ok": True, "stage": "dc", "code": "skipped", "message": "DC screening skipped.", "details": {}}
 
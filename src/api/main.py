@@ -1,16 +1,26 @@
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Body, Header, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from typing import List, Optional
+import json
+import re
 import sys
 import os
+import time
 
 # Add project root to path to allow imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
 from src.agents.orchestrator import Orchestrator
-import pandapower as pp
+from src.api.sessions import SessionPool, DEFAULT_SESSION_ID
+from src.templates import TemplateCache
+from src.network_manager import BUILTIN_CASES, NETWORK_FILE_EXTENSIONS
+from src.telemetry import metrics, start_trace, HTTP_SECONDS
+from src.violations import SEVERITY_LEVELS
+from src.llm_client import get_scheduler_stats
+from src.llm_scheduler import LLMError, PRIORITIES, llm_priority, iter_with_priority
 
 app = FastAPI()
 
@@ -23,21 +33,101 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global State
-class SystemState:
-    orchestrator: Orchestrator = None
-    current_case: str = None
+# Global State: one orchestrator per client session.
+# Clients pass their session id in the X-Session-ID header (or a session_id field);
+# requests without one share the default session.
+session_pool = SessionPool(
+    max_sessions=int(os.environ.get("MAX_SESSIONS", "16")),
+    idle_timeout=float(os.environ.get("SESSION_IDLE_TIMEOUT", "1800")),
+    max_memory_mb=float(os.environ.get("SESSION_MEMORY_MB", "2048")),
+)
+
+# Prebuilt (clustered, solved, serialized) cases that new sessions are cloned from.
+# With SHARED_TEMPLATES=1 their arrays are memory-mapped copy-on-write from TEMPLATE_CACHE_DIR,
+# so all sessions of all worker processes share one physical copy of each base case.
+template_cache = TemplateCache(
+    cache_dir=os.environ.get("TEMPLATE_CACHE_DIR"),
+    max_entries=int(os.environ.get("TEMPLATE_CACHE_SIZE", "8")),
+    shared=os.environ.get("SHARED_TEMPLATES", "0").lower() in ("1", "true", "yes"),
+)
+
+def _pool_metrics():
+    stats = session_pool.stats()
+    yield "gemmapower_sessions", "Open sessions.", {}, stats["n_sessions"]
+    yield "gemmapower_session_memory_mb", "Estimated memory held by open sessions.", {}, stats["memory_mb"]
+    yield "gemmapower_session_evictions", "Sessions evicted since startup.", {}, stats["evictions"]
+    templates = template_cache.stats()
+    for kind in ("hits", "disk_hits", "builds"):
+        yield "gemmapower_template_cache", "Template cache lookups by kind.", {"kind": kind}, templates[kind]
+    yield "gemmapower_template_cache_memory_mb", "Template blobs held in memory.", {}, templates["memory_mb"]
+
+metrics.register_collector(_pool_metrics)
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Route template rather than raw path, so /sessions/<id> does not create a series per id
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    HTTP_SECONDS.observe(time.perf_counter() - start, path=path, method=request.method, status=response.status_code)
+    return response
+
+# Alternative action sets validated side by side per scenario modification (0 = serial retries)
+SPECULATIVE_CANDIDATES = int(os.environ.get("SPECULATIVE_CANDIDATES", "0"))
 
-state_store = SystemState()
+# Grid files (pandapower JSON / pickle, MATPOWER) that clients may load by file name
+NETWORK_DIR = os.environ.get("NETWORK_DIR")
+
+# Where saved scenario trees go (POST /scenarios/save, /scenarios/load)
+SCENARIO_DIR = os.environ.get("SCENARIO_DIR")
+
+# Time-series profile files (CSV / Parquet) that clients may run by file name
+PROFILE_DIR = os.environ.get("PROFILE_DIR")
+PROFILE_FILE_EXTENSIONS = (".csv", ".parquet")
+
+# Session ids key the pool and name per-session result directories
+SESSION_ID_PATTERN = r"[A-Za-z0-9_-]{1,64}"
 
 class LoadCaseRequest(BaseModel):
     case_name: str
+    session_id: Optional[str] = None
+    n_clusters: int = 3
+    # "spatial" or "topology" (spatial falls back to topology for grids without coordinates)
+    partitioner: str = "spatial"
 
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = None
+    # Return the per-step timing spans of this request along with the answer
+    trace: bool = False
+    # "interactive" (default) or "batch": batch clients yield to interactive chat in the LLM queue
+    priority: str = "interactive"
+
+class ContingencyRequest(BaseModel):
+    session_id: Optional[str] = None
+    n2: bool = False
+    element_types: List[str] = ["line", "trafo", "gen"]
+    top_n: int = 20
+    trace: bool = False
 
-def get_network_stats(net):
-    """Extracts high-level stats from the pandapower network."""
+class ScenarioFileRequest(BaseModel):
+    name: str
+    session_id: Optional[str] = None
+
+class TimeSeriesRequest(BaseModel):
+    session_id: Optional[str] = None
+    # The name of a CSV/Parquet file in PROFILE_DIR with "table.column.element" columns, or
+    profile_file: Optional[str] = None
+    # a per-step multiplier applied to every load (e.g. 24 or 8760 values)
+    load_scaling: Optional[List[float]] = None
+    n_workers: Optional[int] = None
+
+def get_network_stats(net, violations=None):
+    """
+    Extracts high-level stats from the pandapower network.
+    With a ViolationIndex, also the violation counts by severity, element type and region.
+    """
     try:
         load_mw = net.load.p_mw.sum()
         gen_mw = net.gen.p_mw.sum() + net.sgen.p_mw.sum() if 'sgen' in net else net.gen.p_mw.sum()
@@ -48,7 +138,7 @@ def get_network_stats(net):
         
         line_loading_max = net.res_line.loading_percent.max() if 'res_line' in net and not net.res_line.empty else 0.0
         
-        return {
+        stats = {
             "n_buses": len(net.bus),
             "n_lines": len(net.line),
             "total_load_mw": round(load_mw, 2),
@@ -57,61 +147,347 @@ def get_network_stats(net):
             "max_voltage_pu": round(max_vm, 3),
             "max_line_loading_pct": round(line_loading_max, 2)
         }
+        if violations is not None:
+            violations.refresh()
+            stats["violations"] = violations.summary()
+        return stats
     except Exception as e:
         print(f"Error calculating stats: {e}")
         return {}
 
+def classify_intent(query):
+    """Returns the query's intent from keywords: "contingency", "modification" or "query"."""
+    modification_keywords = ["outage", "modify", "increase", "decrease", "set", "create case", "disconnect", "change", "simulate"]
+    contingency_keywords = ["contingency", "contingencies", "n-1", "n-2"]
+    
+    if any(k in query.lower() for k in contingency_keywords):
+        return "contingency"
+    if any(k in query.lower() for k in modification_keywords):
+        return "modification"
+    return "query"
+
+def _session_id(body_id, header_id):
+    """The request's session id; only short plain ids, as they key the pool and name result directories."""
+    session_id = body_id or header_id or DEFAULT_SESSION_ID
+    if not re.fullmatch(SESSION_ID_PATTERN, session_id):
+        raise HTTPException(status_code=400, detail="Invalid session id: use 1-64 letters, digits, '_' or '-'.")
+    return session_id
+
+def _get_session(session_id):
+    session = session_pool.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=400, detail="No case loaded for this session. Please load a case first.")
+    return session
+
+def _sse(event, data):
+    """Formats one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
+def _network_files():
+    if not NETWORK_DIR or not os.path.isdir(NETWORK_DIR):
+        return []
+    return sorted(f for f in os.listdir(NETWORK_DIR) if f.lower().endswith(NETWORK_FILE_EXTENSIONS))
+
+def _resolve_case(case_name):
+    """Maps a requested case to what load_network accepts: a sample case name or a file in NETWORK_DIR."""
+    if case_name in BUILTIN_CASES:
+        return case_name
+    # Only bare file names from the configured directory; never arbitrary paths
+    if case_name in _network_files():
+        return os.path.join(NETWORK_DIR, case_name)
+    raise HTTPException(status_code=400, detail=f"Unknown case: {case_name}")
+
 @app.get("/cases")
 def list_cases():
-    return {"cases": ["case57", "case118", "case14"]}
+    return {"cases": list(BUILTIN_CASES) + _network_files()}
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/llm/scheduler")
+def llm_scheduler_stats():
+    return get_scheduler_stats()
+
+def _llm_http_error(error):
+    """Maps an LLMError to 429 (quota / queue full), 503 (retryable outage) or 502 (rejected by the API)."""
+    status = 429 if error.code in ("rate_limited", "queue_timeout") else 503 if error.retryable else 502
+    headers = {"Retry-After": str(int(error.retry_after) + 1)} if error.retry_after else None
+    return HTTPException(status_code=status, detail=str(error), headers=headers)
+
+def _check_priority(priority):
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(PRIORITIES)}.")
+
+@app.get("/sessions")
+def list_sessions():
+    return {**session_pool.stats(), "templates": template_cache.stats()}
+
+@app.delete("/sessions/{session_id}")
+def close_session(session_id: str):
+    if not session_pool.remove(_session_id(session_id, None)):
+        raise HTTPException(status_code=404, detail="Unknown session.")
+    return {"status": "closed", "session_id": session_id}
 
 @app.post("/load")
-def load_case(req: LoadCaseRequest):
+def load_case(req: LoadCaseRequest, x_session_id: Optional[str] = Header(default=None)):
+    session_id = _session_id(req.session_id, x_session_id)
+    network_name = _resolve_case(req.case_name)
+    if req.partitioner not in ("spatial", "topology"):
+        raise HTTPException(status_code=400, detail="partitioner must be 'spatial' or 'topology'.")
+    if not 1 <= req.n_clusters <= 64:
+        raise HTTPException(status_code=400, detail="n_clusters must be between 1 and 64.")
     try:
-        state_store.orchestrator = Orchestrator(network_name=req.case_name, n_clusters=3)
-        state_store.current_case = req.case_name
+        orch = Orchestrator(network_name=network_name, n_clusters=req.n_clusters, partitioner=req.partitioner,
+                            template_cache=template_cache, speculative_candidates=SPECULATIVE_CANDIDATES)
+        
+        # Templates carry the solved base case, so this is normally a cache hit; otherwise
+        # it primes the warm-start cache and marks region contexts for refresh
+        orch.solve_power_flow()
         
-        # Run initial power flow to get stats
-        pp.runpp(state_store.orchestrator.net)
+        # Built outside the pool lock; replaces any earlier case of this session
+        session_pool.put(session_id, orch, req.case_name)
         
-        stats = get_network_stats(state_store.orchestrator.net)
-        return {"status": "success", "message": f"Loaded {req.case_name}", "stats": stats}
+        stats = get_network_stats(orch.net, orch.violations)
+        return {"status": "success", "message": f"Loaded {req.case_name}", "stats": stats, "session_id": session_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/chat")
-def chat(req: ChatRequest):
-    if not state_store.orchestrator:
-        raise HTTPException(status_code=400, detail="No case loaded. Please load a case first.")
+def chat(req: ChatRequest, x_session_id: Optional[str] = Header(default=None)):
+    session = _get_session(_session_id(req.session_id, x_session_id))
     
     query = req.message
-    orch = state_store.orchestrator
+    orch = session.orchestrator
+    _check_priority(req.priority)
     
+    # One request at a time per session: the orchestrator edits its network in place
+    with session.lock, start_trace("chat") as trace, llm_priority(req.priority):
+        result = _chat(orch, query)
+    if req.trace:
+        result["trace"] = trace.to_dict()
+    return result
+
+def _chat(orch, query):
     try:
-        # Determine intent (Reuse logic from main.py or just try modification first?)
-        # Let's use the simple keyword heuristic from main.py
-        modification_keywords = ["outage", "modify", "increase", "decrease", "set", "create case", "disconnect", "change", "simulate"]
+        intent = classify_intent(query)
         
         response_text = ""
-        if any(k in query.lower() for k in modification_keywords):
+        if intent == "contingency":
+            response_text = orch.process_contingency_query(query)
+        elif intent == "modification":
             response_text = orch.process_scenario_modification(query)
         else:
             response_text = orch.process_user_query(query)
             
         # Get updated stats (in case modification happened)
-        stats = get_network_stats(orch.net)
+        stats = get_network_stats(orch.net, orch.violations)
         
         return {
             "response": response_text,
             "stats": stats
         }
+    except LLMError as e:
+        raise _llm_http_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/chat/stream")
+def chat_stream(req: ChatRequest, x_session_id: Optional[str] = Header(default=None)):
+    """
+    Server-sent events version of /chat: emits 'start', one 'region' event per
+    regional report as it arrives, 'token' events for the synthesized answer and
+    a final 'done' event carrying the full response and updated stats.
+    """
+    session = _get_session(_session_id(req.session_id, x_session_id))
+    
+    query = req.message
+    orch = session.orchestrator
+    _check_priority(req.priority)
+    
+    def event_stream():
+        # Held for the whole stream, released when the client disconnects
+        with session.lock:
+            yield from iter_with_priority(_event_stream(), req.priority)
+    
+    def _event_stream():
+        try:
+            intent = classify_intent(query)
+            if intent == "query":
+                for event in orch.stream_user_query(query):
+                    name = event.pop("event")
+                    if name == "done":
+                        event["stats"] = get_network_stats(orch.net, orch.violations)
+                    yield _sse(name, event)
+            else:
+                # Modifications / contingency sweeps have no token stream; report progress, then the result
+                yield _sse("status", {"message": f"Running {intent}..."})
+                if intent == "contingency":
+                    response_text = orch.process_contingency_query(query)
+                else:
+                    response_text = orch.process_scenario_modification(query)
+                yield _sse("done", {"response": response_text, "stats": get_network_stats(orch.net, orch.violations)})
+        except LLMError as e:
+            yield _sse("error", {"detail": str(e), "code": e.code, "retryable": e.retryable, "retry_after": e.retry_after})
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/contingency")
+def contingency(req: ContingencyRequest, x_session_id: Optional[str] = Header(default=None)):
+    session = _get_session(_session_id(req.session_id, x_session_id))
+    
+    try:
+        with session.lock, start_trace("contingency") as trace:
+            table = session.orchestrator.run_contingency_analysis(n2=req.n2, element_types=tuple(req.element_types))
+        checked = table[table['ac_checked']] if not table.empty else table
+        result = {
+            "n_screened": len(table),
+            "n_ac_checked": len(checked),
+            # to_json turns NaN (outages that were only DC-screened) into null
+            "results": json.loads(table.head(req.top_n).to_json(orient="records")),
+        }
+        if req.trace:
+            result["trace"] = trace.to_dict()
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/violations")
+def violations(region: Optional[int] = None, severity: Optional[str] = None, element_type: Optional[str] = None,
+               limit: int = 100, x_session_id: Optional[str] = Header(default=None)):
+    """Current limit violations, most severe first, filtered by region, minimum severity and element type."""
+    session = _get_session(_session_id(None, x_session_id))
+    if severity is not None and severity not in SEVERITY_LEVELS:
+        raise HTTPException(status_code=400, detail=f"severity must be one of {', '.join(SEVERITY_LEVELS)}.")
+    with session.lock:
+        index = session.orchestrator.violations
+        index.refresh()
+        table = index.query(cluster_id=region, min_severity=severity, element_type=element_type)
+        counts = index.counts(region)
+    return {
+        "n_violations": len(table),
+        "counts": counts,
+        "violations": json.loads(table.head(limit).to_json(orient="records")),
+    }
+
+@app.get("/scenarios")
+def list_scenarios(x_session_id: Optional[str] = Header(default=None)):
+    session = _get_session(_session_id(None, x_session_id))
+    with session.lock:
+        store = session.orchestrator.scenarios
+        return {"current": store.current, "scenarios": store.list()}
+
+@app.get("/scenarios/diff")
+def diff_scenarios(a: str, b: str, top_n: int = 10, x_session_id: Optional[str] = Header(default=None)):
+    session = _get_session(_session_id(None, x_session_id))
+    with session.lock:
+        orch = session.orchestrator
+        if a not in orch.scenarios.scenarios or b not in orch.scenarios.scenarios:
+            raise HTTPException(status_code=404, detail="Unknown scenario.")
+        return json.loads(json.dumps(orch.diff_scenarios(a, b, top_n=top_n), default=str))
+
+@app.post("/scenarios/{scenario_id}/checkout")
+def checkout_scenario(scenario_id: str, x_session_id: Optional[str] = Header(default=None)):
+    session = _get_session(_session_id(None, x_session_id))
+    with session.lock:
+        orch = session.orchestrator
+        if scenario_id not in orch.scenarios.scenarios:
+            raise HTTPException(status_code=404, detail="Unknown scenario.")
+        scenario = orch.checkout_scenario(scenario_id)
+        return {"scenario": scenario, "stats": get_network_stats(orch.net, orch.violations)}
+
+def _scenario_file(name):
+    """A saved scenario tree in SCENARIO_DIR; only plain names, never paths."""
+    if not SCENARIO_DIR:
+        raise HTTPException(status_code=400, detail="Saving scenarios is not enabled (set SCENARIO_DIR).")
+    if not re.fullmatch(r"[A-Za-z0-9_.-]{1,64}", name) or name.startswith("."):
+        raise HTTPException(status_code=400, detail="Invalid scenario file name.")
+    os.makedirs(SCENARIO_DIR, exist_ok=True)
+    return os.path.join(SCENARIO_DIR, f"{name}.scn")
+
+@app.post("/scenarios/save")
+def save_scenarios(req: ScenarioFileRequest, x_session_id: Optional[str] = Header(default=None)):
+    session = _get_session(_session_id(req.session_id, x_session_id))
+    path = _scenario_file(req.name)
+    with session.lock:
+        size = session.orchestrator.save_scenarios(path)
+    return {"status": "saved", "name": req.name, "bytes": size}
+
+@app.post("/scenarios/load")
+def load_scenarios(req: ScenarioFileRequest, x_session_id: Optional[str] = Header(default=None)):
+    session = _get_session(_session_id(req.session_id, x_session_id))
+    path = _scenario_file(req.name)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"No saved scenarios named {req.name}.")
+    with session.lock:
+        orch = session.orchestrator
+        try:
+            store = orch.load_scenarios(path)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"current": store.current, "scenarios": store.list(), "stats": get_network_stats(orch.net, orch.violations)}
+
+@app.post("/timeseries")
+def timeseries(req: TimeSeriesRequest, x_session_id: Optional[str] = Header(default=None)):
+    session = _get_session(_session_id(req.session_id, x_session_id))
+    if req.profile_file:
+        profiles = _profile_file(req.profile_file)
+    elif req.load_scaling:
+        profiles = {("load", "scaling"): req.load_scaling}
+    else:
+        raise HTTPException(status_code=400, detail="Provide profile_file or load_scaling.")
+    
+    try:
+        with session.lock:
+            session.orchestrator.run_timeseries(profiles, n_workers=req.n_workers,
+                                                output_dir=_timeseries_dir(session.session_id))
+            return session.orchestrator.timeseries_summary()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Time series failed for session {session.session_id}: {e}")
+        raise HTTPException(status_code=500, detail="Time-series study failed.")
+
+def _profile_files():
+    if not PROFILE_DIR or not os.path.isdir(PROFILE_DIR):
+        return []
+    return sorted(f for f in os.listdir(PROFILE_DIR) if f.lower().endswith(PROFILE_FILE_EXTENSIONS))
+
+def _profile_file(name):
+    """A profile file in PROFILE_DIR; only bare file names listed there, never paths."""
+    if not PROFILE_DIR:
+        raise HTTPException(status_code=400, detail="Profile files are not enabled (set PROFILE_DIR).")
+    if name not in _profile_files():
+        raise HTTPException(status_code=404, detail=f"Unknown profile file: {name}")
+    return os.path.join(PROFILE_DIR, name)
+
+@app.get("/profiles")
+def list_profiles():
+    return {"profiles": _profile_files()}
+
+def _timeseries_dir(session_id):
+    """
+    Result directory of a session's time-series study (TIMESERIES_DIR/<session id>, default: a
+    temp dir). Each run replaces the previous one's files.
+    """
+    base = os.environ.get("TIMESERIES_DIR")
+    if not base:
+        return None
+    # Ids come through _session_id already; never let one escape TIMESERIES_DIR regardless
+    if not re.fullmatch(SESSION_ID_PATTERN, session_id):
+        raise HTTPException(status_code=400, detail="Invalid session id.")
+    return os.path.join(base, session_id)
+
 # Serve static files (React build)
 # Assumes build is in ../../web/dist relative to this file
 # AND that the Dockerfile copies it to /app/web/dist or similar
@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import OrderedDict
+
+from src.shared_arrays import is_shared
+
+# Requests that don't carry a session id all share this one (single-user behaviour)
+DEFAULT_SESSION_ID = "default"
+
+
+def estimate_net_memory(net):
+    """
+    Rough size in bytes of a pandapower network's tables (measured once, when a session is created).
+    Columns mapped from a shared template (see shared_arrays) are not counted: they are not private.
+    """
+    total = 0
+    for key, value in net.items():
+        if hasattr(value, 'memory_usage') and hasattr(value, 'columns'):
+            try:
+                usage = value.memory_usage(index=True, deep=True)
+                shared = [i for i, column in enumerate(value.columns) if is_shared(value.iloc[:, i].to_numpy())]
+                total += int(usage.sum()) - int(usage.iloc[[i + 1 for i in shared]].sum())
+            except Exception:
+                pass
+    return total
+
+
+class Session:
+    """
+    One loaded case and its orchestrator. `lock` serializes requests against the
+    session, since orchestrators mutate their network while handling a request.
+    A plain Lock (not RLock): a streamed response may release it from another
+    worker thread than the one that acquired it.
+    """
+
+    def __init__(self, session_id, orchestrator, case_name):
+        self.session_id = session_id
+        self.orchestrator = orchestrator
+        self.case_name = case_name
+        self.lock = threading.Lock()
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.memory_bytes = estimate_net_memory(orchestrator.net)
+
+    def close(self):
+        """Releases files the session owns on disk (time-series results); waits for a running request."""
+        with self.lock:
+            self.orchestrator.close_timeseries()
+
+    def touch(self):
+        self.last_used = time.time()
+
+    def in_use(self):
+        if self.lock.acquire(blocking=False):
+            self.lock.release()
+            return False
+        return True
+
+    def info(self):
+        return {
+            "session_id": self.session_id,
+            "case": self.case_name,
+            "idle_s": round(time.time() - self.last_used, 1),
+            "memory_mb": round(self.memory_bytes / 1e6, 2),
+        }
+
+
+class SessionPool:
+    """
+    Bounded pool of per-client sessions, most recently used last.
+
+    Sessions idle for longer than `idle_timeout` are dropped, and the least recently
+    used ones are evicted once the pool exceeds `max_sessions` or its estimated
+    memory exceeds `max_memory_mb`. Sessions currently handling a request are never
+    evicted.
+
+    Args:
+        max_sessions (int): Maximum number of live sessions.
+        idle_timeout (float): Seconds of inactivity before a session expires.
+        max_memory_mb (float): Cap on the summed network size of all sessions.
+    """
+
+    def __init__(self, max_sessions=16, idle_timeout=1800.0, max_memory_mb=2048.0):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_memory_bytes = max_memory_mb * 1e6
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def put(self, session_id, orchestrator, case_name):
+        """Registers (or replaces) a session and returns it."""
+        session = Session(session_id, orchestrator, case_name)
+        with self._lock:
+            replaced = self._sessions.pop(session_id, None)
+        # Closed before the new session is visible: both use the same result directory
+        if replaced is not None:
+            replaced.close()
+        with self._lock:
+            self._sessions[session_id] = session
+            dropped = self._evict(keep=session_id)
+        for old in dropped:
+            old.close()
+        return session
+
+    def get(self, session_id):
+        """Returns the session and marks it as recently used, or None if unknown/expired."""
+        with self._lock:
+            dropped = self._evict()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                session.touch()
+        for old in dropped:
+            old.close()
+        return session
+
+    def remove(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def _memory(self):
+        return sum(s.memory_bytes for s in self._sessions.values())
+
+    def _evict(self, keep=None):
+        """
+        Drops expired sessions, then LRU sessions while over a limit. Caller holds the pool lock
+        and closes the returned sessions after releasing it.
+        """
+        now = time.time()
+        dropped = []
+        for sid, session in list(self._sessions.items()):
+            if sid != keep and now - session.last_used > self.idle_timeout and not session.in_use():
+                dropped.append(self._sessions.pop(sid))
+                self.evictions += 1
+                print(f"Session {sid} expired after {now - session.last_used:.0f}s idle.")
+
+        for sid, session in list(self._sessions.items()):
+            if len(self._sessions) <= self.max_sessions and self._memory() <= self.max_memory_bytes:
+                break
+            if sid == keep or session.in_use():
+                continue
+            dropped.append(self._sessions.pop(sid))
+            self.evictions += 1
+            print(f"Session {sid} evicted (pool limits reached).")
+        return dropped
+
+    def stats(self):
+        with self._lock:
+            return {
+                "n_sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "memory_mb": round(self._memory() / 1e6, 2),
+                "max_memory_mb": round(self.max_memory_bytes / 1e6, 2),
+                "evictions": self.evictions,
+                "sessions": [s.info() for s in self._sessions.values()],
+            }
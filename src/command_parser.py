@@ -0,0 +1,193 @@
+import re
+from src.schema import NetworkAction, ElementSelector
+
+# Local, deterministic parser for the common one-line scenario commands, e.g.
+#   "outage line 7", "trip lines 3, 5 and 8", "reconnect gen 2"
+#   "set load 3 p_mw 40", "set the vm_pu of gen 1 to 1.02", "set load 4 q_mvar -10%"
+#   "increase gen 2 by 10%", "reduce load 5 q_mvar by 20%"
+#   "scale all loads in region 2 by 5%", "outage all lines at buses 4, 5"
+# Anything it does not fully understand returns None so the caller can fall back to the LLM.
+
+COMPONENT_ALIASES = {
+    'bus': 'bus', 'buses': 'bus', 'busbar': 'bus',
+    'line': 'line', 'lines': 'line', 'branch': 'line', 'branches': 'line',
+    'load': 'load', 'loads': 'load',
+    'gen': 'gen', 'gens': 'gen', 'generator': 'gen', 'generators': 'gen',
+    'sgen': 'sgen', 'sgens': 'sgen', 'static gen': 'sgen', 'static generator': 'sgen', 'static generators': 'sgen',
+}
+
+# Same table as the cheat sheet given to the LLM in ScenarioBuilder.parse_actions
+VALID_PARAMETERS = {
+    'load': {'p_mw', 'q_mvar', 'scaling', 'in_service'},
+    'gen': {'p_mw', 'q_mvar', 'vm_pu', 'scaling', 'in_service'},
+    'sgen': {'p_mw', 'q_mvar', 'vm_pu', 'scaling', 'in_service'},
+    'line': {'r_ohm_per_km', 'x_ohm_per_km', 'c_nf_per_km', 'max_i_ka', 'in_service'},
+    'bus': {'vn_kv', 'in_service'},
+}
+
+PARAMETER_ALIASES = {
+    'p': 'p_mw', 'mw': 'p_mw', 'active power': 'p_mw', 'power': 'p_mw', 'output': 'p_mw', 'demand': 'p_mw',
+    'q': 'q_mvar', 'mvar': 'q_mvar', 'reactive power': 'q_mvar',
+    'voltage': 'vm_pu', 'voltage setpoint': 'vm_pu', 'vm': 'vm_pu',
+    'scale': 'scaling',
+}
+
+# Parameter used by "increase load 3 by 10%" when none is named
+DEFAULT_PARAMETER = {'load': 'p_mw', 'gen': 'p_mw', 'sgen': 'p_mw'}
+
+_OFF_VERBS = r"outage|trip|disconnect|disable|deactivate|remove|take\s+out|switch\s+off|turn\s+off|open"
+_ON_VERBS = r"restore|reconnect|enable|activate|return|bring\s+back|switch\s+on|turn\s+on|close"
+_UP_VERBS = r"increase|raise|boost|scale\s+up"
+_SCALE_VERBS = r"scale|change|adjust"
+_DOWN_VERBS = r"decrease|reduce|lower|cut|scale\s+down"
+
+_COMP = r"(?P<comp>static\s+generators?|static\s+gen|" + "|".join(
+    sorted((k for k in COMPONENT_ALIASES if ' ' not in k), key=len, reverse=True)) + r")"
+_IDS = r"(?:no\.?\s*|number\s+|#\s*)?(?P<ids>\d+(?:\s*(?:,|&|\band\b)\s*\d+)*)"
+_PARAM = r"(?P<param>[a-z_][a-z_ ]*?)"
+_NUMBER = r"(?P<value>[-+]?\d+(?:\.\d+)?)\s*(?P<unit>%|percent|mw|mvar|kv|ka|pu|p\.u\.)?"
+_THE = r"(?:the\s+)?"
+_ALL = r"all\s+(?:of\s+)?(?:the\s+)?"
+_SCOPE = (r"(?:\s+(?:in|of)\s+(?:the\s+)?(?P<scope>region|cluster|area|zone)\s+(?P<scope_id>[\w.-]+)"
+          r"|\s+(?:at|on|connected\s+to)\s+bus(?:es)?\s+(?P<buses>\d+(?:\s*(?:,|&|\band\b)\s*\d+)*))?")
+_OF = r"(?:of\s+)?"
+
+_PATTERNS = [
+    # "outage line 7", "trip the lines 3 and 5"
+    ('off', re.compile(rf"^(?:{_OFF_VERBS})\s+{_OF}{_THE}{_COMP}\s+{_IDS}$")),
+    # "line 7 outage", "line 7 out of service", "line 7 off"
+    ('off', re.compile(rf"^{_THE}{_COMP}\s+{_IDS}\s+(?:outage|out\s+of\s+service|out|off|trips?|disconnected)$")),
+    ('on', re.compile(rf"^(?:{_ON_VERBS})\s+{_THE}{_COMP}\s+{_IDS}(?:\s+to\s+service)?$")),
+    ('on', re.compile(rf"^{_THE}{_COMP}\s+{_IDS}\s+(?:back\s+)?(?:in\s+service|on)$")),
+    # "set load 3 p_mw 40", "set load 3 p_mw to 40 mw", "change gen 1 vm_pu = 1.02"
+    ('set', re.compile(rf"^(?:set|change|modify|adjust)\s+{_THE}{_COMP}\s+{_IDS}\s+{_PARAM}\s*(?:to|=|:)?\s*{_NUMBER}$")),
+    # "set the p_mw of load 3 to 40"
+    ('set', re.compile(rf"^(?:set|change|modify|adjust)\s+{_THE}{_PARAM}\s+of\s+{_THE}{_COMP}\s+{_IDS}\s*(?:to|=)\s*{_NUMBER}$")),
+    # "set line 3 in_service false"
+    ('flag', re.compile(rf"^(?:set|change)\s+{_THE}{_COMP}\s+{_IDS}\s+in_service\s*(?:to|=)?\s*(?P<flag>true|false|on|off|yes|no)$")),
+    # "increase gen 2 by 10%", "reduce load 5 q_mvar by 20%", "increase the p_mw of load 2 by 5%"
+    ('up', re.compile(rf"^(?:{_UP_VERBS})\s+{_THE}{_COMP}\s+{_IDS}(?:\s+{_PARAM})?\s+by\s+{_NUMBER}$")),
+    ('up', re.compile(rf"^(?:{_UP_VERBS})\s+{_THE}{_PARAM}\s+of\s+{_THE}{_COMP}\s+{_IDS}\s+by\s+{_NUMBER}$")),
+    ('down', re.compile(rf"^(?:{_DOWN_VERBS})\s+{_THE}{_COMP}\s+{_IDS}(?:\s+{_PARAM})?\s+by\s+{_NUMBER}$")),
+    ('down', re.compile(rf"^(?:{_DOWN_VERBS})\s+{_THE}{_PARAM}\s+of\s+{_THE}{_COMP}\s+{_IDS}\s+by\s+{_NUMBER}$")),
+    # Selector forms: many elements at once
+    ('off', re.compile(rf"^(?:{_OFF_VERBS})\s+{_OF}{_ALL}{_COMP}{_SCOPE}$")),
+    ('on', re.compile(rf"^(?:{_ON_VERBS})\s+{_ALL}{_COMP}{_SCOPE}$")),
+    ('up', re.compile(rf"^(?:{_UP_VERBS})\s+{_ALL}{_COMP}{_SCOPE}(?:\s+{_PARAM})?\s+by\s+{_NUMBER}$")),
+    ('down', re.compile(rf"^(?:{_DOWN_VERBS})\s+{_ALL}{_COMP}{_SCOPE}(?:\s+{_PARAM})?\s+by\s+{_NUMBER}$")),
+    ('scale', re.compile(rf"^(?:{_SCALE_VERBS})\s+{_ALL}{_COMP}{_SCOPE}(?:\s+{_PARAM})?\s+by\s+{_NUMBER}$")),
+    ('set', re.compile(rf"^(?:set|change|modify|adjust)\s+{_ALL}{_COMP}{_SCOPE}\s+{_PARAM}\s*(?:to|=|:)?\s*{_NUMBER}$")),
+]
+
+_CLAUSE_SPLIT = re.compile(r"\s*(?:;|,|\band\s+then\b|\bthen\b|\balso\b|\band\b)\s*")
+_FLAGS = {'true': True, 'on': True, 'yes': True, 'false': False, 'off': False, 'no': False}
+
+
+def _normalize(text):
+    text = text.strip().lower().rstrip('.!')
+    text = re.sub(r"^(?:please|can you|could you|simulate(?: an?)?|apply)\s+", "", text)
+    text = re.sub(r"^(?:please|an?)\s+", "", text)
+    return re.sub(r"\s+", " ", text)
+
+
+def _resolve_param(comp, name):
+    if name is None:
+        return DEFAULT_PARAMETER.get(comp)
+    name = name.strip()
+    name = PARAMETER_ALIASES.get(name, name.replace(' ', '_'))
+    return name if name in VALID_PARAMETERS[comp] else None
+
+
+def _actions(comp, ids, parameters, selector=None):
+    if selector is not None:
+        return [NetworkAction(component=comp, selector=selector, type='modify', parameters=dict(parameters)).model_dump()]
+    return [NetworkAction(component=comp, id=i, type='modify', parameters=dict(parameters)).model_dump() for i in ids]
+
+
+def _selector(groups):
+    """Builds the ElementSelector of an "all <component> [in region X | at buses ...]" match."""
+    if groups.get('buses'):
+        return ElementSelector(buses=[int(b) for b in re.findall(r"\d+", groups['buses'])])
+    scope = groups.get('scope')
+    if scope == 'zone':
+        return ElementSelector(zone=groups['scope_id'])
+    if scope is not None:
+        if not groups['scope_id'].isdigit():
+            return None
+        return ElementSelector(cluster=int(groups['scope_id']))
+    return ElementSelector()
+
+
+def _parse_clause(clause):
+    """Parses one command into a list of action dicts, or returns None."""
+    for kind, pattern in _PATTERNS:
+        match = pattern.match(clause)
+        if not match:
+            continue
+        groups = match.groupdict()
+        comp = COMPONENT_ALIASES.get(re.sub(r"\s+", " ", groups['comp']))
+        if comp is None:
+            return None
+        if 'ids' in groups:
+            ids, selector = [int(i) for i in re.findall(r"\d+", groups['ids'])], None
+        else:
+            ids, selector = [], _selector(groups)
+            if selector is None:
+                return None
+
+        if kind in ('off', 'on'):
+            return _actions(comp, ids, {'in_service': kind == 'on'}, selector)
+        if kind == 'flag':
+            return _actions(comp, ids, {'in_service': _FLAGS[groups['flag']]}, selector)
+
+        param = _resolve_param(comp, groups.get('param'))
+        if param is None or param == 'in_service':
+            return None
+        value, unit = float(groups['value']), groups.get('unit')
+        relative = unit in ('%', 'percent')
+        if kind == 'set':
+            if relative:
+                # "set ... +10%" is relative; an unsigned "set ... 40%" is ambiguous
+                if groups['value'][0] not in '+-':
+                    return None
+                return _actions(comp, ids, {param: f"{value:+g}%"}, selector)
+            return _actions(comp, ids, {param: value}, selector)
+        # increase / decrease / scale: only relative changes are unambiguous without reading the network
+        if not relative:
+            return None
+        if kind == 'scale':
+            if value <= -100:
+                return None
+            return _actions(comp, ids, {param: f"{value:+g}%"}, selector)
+        # A reduction of 100% or more would flip the sign (a load becoming a generator); leave it to the LLM
+        if value < 0 or (kind == 'down' and value >= 100):
+            return None
+        sign = '+' if kind == 'up' else '-'
+        return _actions(comp, ids, {param: f"{sign}{value:g}%"}, selector)
+    return None
+
+
+def parse_command(text):
+    """
+    Parses common scenario commands without an LLM.
+
+    Returns a list of action dicts (the same shape ScenarioBuilder.parse_actions
+    produces from NetworkAction) or None if any part of the text is not understood.
+    Several commands can be joined with ',', ';', 'and' or 'then'.
+    """
+    text = _normalize(text)
+    if not text:
+        return None
+    actions = _parse_clause(text)
+    if actions is not None:
+        return actions
+
+    actions = []
+    for clause in _CLAUSE_SPLIT.split(text):
+        if not clause:
+            continue
+        parsed = _parse_clause(_normalize(clause))
+        if parsed is None:
+            return None
+        actions.extend(parsed)
+    return actions or None
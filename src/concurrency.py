@@ -0,0 +1,93 @@
+import math
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+def iter_concurrently(tasks, max_workers=None, timeout=None):
+    """
+    Runs a dict of zero-argument callables in a bounded thread pool and yields
+    (key, result, error) tuples in completion order.
+
+    Args:
+        tasks (dict): Mapping of key -> callable.
+        max_workers (int): Maximum number of tasks running at once (default: all).
+        timeout (float): Per-task timeout in seconds, measured from the moment the
+            task actually starts running (queued time does not count). The whole run
+            is also bounded by timeout * ceil(len(tasks) / max_workers) from submission,
+            so tasks queued behind hung ones cannot wait forever.
+
+    A task that raises yields (key, None, exception). A task that exceeds its
+    timeout yields (key, None, TimeoutError) and is abandoned; its thread is
+    left to finish in the background since Python threads cannot be killed.
+    Past the overall deadline every remaining task yields TimeoutError, and
+    those that have not started are cancelled.
+
+    Each task runs in a copy of the caller's contextvars context, so request-scoped
+    state such as the active trace (src.telemetry) carries over into the workers.
+    """
+    if not tasks:
+        return
+
+    n_workers = min(max_workers or len(tasks), len(tasks))
+    started = {}
+
+    def _run(key, fn):
+        started[key] = time.monotonic()
+        return fn()
+
+    executor = ThreadPoolExecutor(max_workers=n_workers)
+    futures = {executor.submit(contextvars.copy_context().run, _run, key, fn): key for key, fn in tasks.items()}
+    pending = set(futures)
+    if timeout is not None:
+        overall_deadline = time.monotonic() + timeout * math.ceil(len(tasks) / n_workers)
+
+    try:
+        while pending:
+            wait_for = None
+            if timeout is not None:
+                now = time.monotonic()
+                if now >= overall_deadline:
+                    for future in pending:
+                        future.cancel()
+                        key = futures[future]
+                        state = "timed out" if key in started else "never started"
+                        yield key, None, TimeoutError(f"Task {key} {state} before the overall deadline")
+                    break
+                # Expire tasks that have been running for longer than the timeout
+                for future in list(pending):
+                    key = futures[future]
+                    if not future.done() and key in started and now - started[key] >= timeout:
+                        pending.discard(future)
+                        yield key, None, TimeoutError(f"Task {key} timed out after {timeout:.1f}s")
+                if not pending:
+                    break
+                deadlines = [started[futures[f]] + timeout for f in pending if futures[f] in started]
+                wait_for = max(0.0, min(deadlines + [overall_deadline]) - now)
+
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                key = futures[future]
+                try:
+                    yield key, future.result(), None
+                except Exception as e:
+                    yield key, None, e
+    finally:
+        # Don't block on abandoned (timed out) tasks, and drop anything still queued
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_concurrently(tasks, max_workers=None, timeout=None):
+    """
+    Runs tasks via iter_concurrently and collects the outcome.
+    Returns (results, errors): two dicts keyed like `tasks`.
+    """
+    results = {}
+    errors = {}
+    for key, result, error in iter_concurrently(tasks, max_workers=max_workers, timeout=timeout):
+        if error is None:
+            results[key] = result
+        else:
+            errors[key] = error
+    return results, errors
@@ -0,0 +1,509 @@
+import os
+import pickle
+import itertools
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pandapower as pp
+from scipy.sparse import csr_matrix, csc_matrix
+from scipy.sparse.linalg import splu
+
+# Defaults used when a limit column is missing or NaN
+DEFAULT_MIN_VM_PU = 0.95
+DEFAULT_MAX_VM_PU = 1.05
+DEFAULT_MAX_LOADING = 100.0
+
+# Outages per batch of sparse solves when building LODF columns (bounds memory on large grids)
+_LODF_CHUNK = 256
+_BRIDGE_TOL = 1e-6
+
+
+def _column(df, name, default):
+    return df[name].values if name in df.columns else np.full(len(df), default)
+
+
+def _trafo_dc_parameters(trafo, vn_hv_bus, vn_lv_bus, base_mva):
+    """
+    Series reactance (p.u. on the lv bus base), off-nominal ratio and phase shift (degrees)
+    of two-winding transformers at their current tap position, following pandapower's
+    branch model: "Ideal" tap changers only shift the phase, the others scale the voltage
+    of their side (with a phase angle if tap_step_degree is set).
+    """
+    vn_hv = trafo['vn_hv_kv'].values.astype(float).copy()
+    vn_lv = trafo['vn_lv_kv'].values.astype(float).copy()
+    shift = np.nan_to_num(_column(trafo, 'shift_degree', 0.0).astype(float))
+
+    steps = np.nan_to_num(_column(trafo, 'tap_pos', np.nan).astype(float)
+                          - _column(trafo, 'tap_neutral', np.nan).astype(float))
+    step_percent = np.nan_to_num(_column(trafo, 'tap_step_percent', np.nan).astype(float))
+    step_degree = np.nan_to_num(_column(trafo, 'tap_step_degree', np.nan).astype(float))
+    side = pd.Series(_column(trafo, 'tap_side', None)).fillna("").values
+    ideal = pd.Series(_column(trafo, 'tap_changer_type', None)).fillna("").values == "Ideal"
+    for side_name, vn, direction in (("hv", vn_hv, 1.0), ("lv", vn_lv, -1.0)):
+        on_side = (side == side_name) & (steps != 0)
+        phase = on_side & ideal
+        shift[phase] += direction * np.where(step_degree[phase] != 0, steps[phase] * step_degree[phase],
+                                             2 * np.degrees(np.arcsin(steps[phase] * step_percent[phase] / 200.0)))
+        ratio = on_side & ~ideal
+        du = vn[ratio] * steps[ratio] * step_percent[ratio] / 100.0
+        angle = np.radians(step_degree[ratio])
+        shift[ratio] += direction * np.degrees(np.arctan(du * np.sin(angle) / (vn[ratio] + du * np.cos(angle))))
+        vn[ratio] = np.hypot(vn[ratio] + du * np.cos(angle), du * np.sin(angle))
+
+    z_pu = trafo['vk_percent'].values / 100.0 * (vn_lv / vn_lv_bus) ** 2 * base_mva / trafo['sn_mva'].values
+    r_pu = trafo['vkr_percent'].values / 100.0 * (vn_lv / vn_lv_bus) ** 2 * base_mva / trafo['sn_mva'].values
+    x_pu = np.sign(z_pu) * np.sqrt(np.maximum(z_pu ** 2 - r_pu ** 2, 0.0)) / trafo['parallel'].values
+    tap = (vn_hv / vn_lv) / (vn_hv_bus / vn_lv_bus)
+    return x_pu, tap, shift
+
+
+class DCModel:
+    """
+    Vectorized DC (B-theta) model of a pandapower network built straight from the
+    element tables, used for PTDF/LODF contingency screening. Transformer tap ratios
+    scale the branch susceptance and phase shifts enter as fixed injections, as in
+    MATPOWER's makeBdc.
+
+    Attributes:
+        branches (DataFrame): element_type, element, f, t (bus positions), b (p.u. susceptance),
+            shift (radians), rating_mw.
+        flows (ndarray): Base-case DC branch flows in MW.
+    """
+
+    def __init__(self, net):
+        self.net = net
+        buses = net.bus.index[net.bus['in_service'].values.astype(bool)]
+        self.bus_index = pd.Index(buses)
+        self.n_bus = len(buses)
+        self.base_mva = float(net.sn_mva)
+
+        self.branches = self._build_branches(net)
+        n_br = len(self.branches)
+        f = self.branches['f'].values
+        t = self.branches['t'].values
+        b = self.branches['b'].values
+
+        # Branch-bus incidence (Cf - Ct) and B = A^T diag(b) A
+        rows = np.concatenate([np.arange(n_br), np.arange(n_br)])
+        cols = np.concatenate([f, t])
+        vals = np.concatenate([np.ones(n_br), -np.ones(n_br)])
+        A = csr_matrix((vals, (rows, cols)), shape=(n_br, self.n_bus))
+        self.Bf = csr_matrix(A.multiply(b[:, None]))
+        B = csc_matrix(A.T @ self.Bf)
+        # Phase shifters: flow offsets per branch and the bus injections that cause them (p.u.)
+        self.p_shift = -b * self.branches['shift'].values
+        self.bus_shift = A.T @ self.p_shift
+
+        self.slack = self._slack_position(net)
+        self._keep = np.setdiff1d(np.arange(self.n_bus), [self.slack])
+        B_red = B[self._keep][:, self._keep]
+        # Tiny diagonal regularization keeps islanded sub-graphs from making B singular
+        B_red = B_red + csc_matrix((np.full(len(self._keep), 1e-9), (np.arange(len(self._keep)), np.arange(len(self._keep)))),
+                                   shape=B_red.shape)
+        self._lu = splu(csc_matrix(B_red))
+
+        self.injections = self._bus_injections(net)
+        self.flows = self.branch_flows(self.injections)
+
+    def _positions(self, buses):
+        return self.bus_index.get_indexer(np.asarray(buses))
+
+    def _build_branches(self, net):
+        frames = []
+        vn = net.bus['vn_kv']
+
+        line = net.line[net.line['in_service'].values.astype(bool)]
+        if len(line):
+            f = self._positions(line['from_bus'])
+            t = self._positions(line['to_bus'])
+            vn_kv = vn.reindex(line['from_bus']).values
+            z_base = vn_kv ** 2 / self.base_mva
+            x_pu = line['x_ohm_per_km'].values * line['length_km'].values / line['parallel'].values / z_base
+            rating = np.sqrt(3) * vn_kv * line['max_i_ka'].values * line['df'].values * line['parallel'].values
+            frames.append(pd.DataFrame({
+                'element_type': 'line', 'element': line.index.values, 'f': f, 't': t,
+                'x': x_pu, 'tap': 1.0, 'shift': 0.0, 'rating_mw': rating,
+                'max_loading_percent': _limit(line, 'max_loading_percent', DEFAULT_MAX_LOADING),
+            }))
+
+        trafo = net.trafo[net.trafo['in_service'].values.astype(bool)]
+        if len(trafo):
+            f = self._positions(trafo['hv_bus'])
+            t = self._positions(trafo['lv_bus'])
+            x_pu, tap, shift = _trafo_dc_parameters(trafo, vn.reindex(trafo['hv_bus']).values,
+                                                    vn.reindex(trafo['lv_bus']).values, self.base_mva)
+            rating = trafo['sn_mva'].values * trafo['parallel'].values
+            frames.append(pd.DataFrame({
+                'element_type': 'trafo', 'element': trafo.index.values, 'f': f, 't': t,
+                'x': x_pu, 'tap': tap, 'shift': np.radians(shift), 'rating_mw': rating,
+                'max_loading_percent': _limit(trafo, 'max_loading_percent', DEFAULT_MAX_LOADING),
+            }))
+
+        branches = pd.concat(frames, ignore_index=True)
+        # Drop branches touching out-of-service buses (get_indexer returns -1)
+        branches = branches[(branches['f'] >= 0) & (branches['t'] >= 0)].reset_index(drop=True)
+        branches['x'] = branches['x'].where(branches['x'].abs() > 1e-9, 1e-9)
+        branches['b'] = 1.0 / (branches['x'] * branches['tap'])
+        return branches
+
+    def _slack_position(self, net):
+        eg = net.ext_grid[net.ext_grid['in_service'].values.astype(bool)]
+        if len(eg):
+            return int(self._positions([eg['bus'].iloc[0]])[0])
+        if 'slack' in net.gen.columns and net.gen['slack'].any():
+            return int(self._positions([net.gen.loc[net.gen['slack'], 'bus'].iloc[0]])[0])
+        return 0
+
+    def _bus_injections(self, net):
+        """Net active power injection per bus (MW), slack balancing the rest."""
+        p = np.zeros(self.n_bus)
+        for table, sign in (('gen', 1.0), ('sgen', 1.0), ('load', -1.0)):
+            df = net[table]
+            if df.empty:
+                continue
+            df = df[df['in_service'].values.astype(bool)]
+            pos = self._positions(df['bus'])
+            valid = pos >= 0
+            scaling = df['scaling'].values if 'scaling' in df.columns else 1.0
+            np.add.at(p, pos[valid], sign * (df['p_mw'].values * scaling)[valid])
+        # Branch losses of the last AC solution, half at each end: otherwise the lossless DC
+        # flows near the slack are off by the whole network loss
+        for table, res, a, b in (('line', 'res_line', 'from_bus', 'to_bus'), ('trafo', 'res_trafo', 'hv_bus', 'lv_bus')):
+            if res not in net or net[res].empty or 'pl_mw' not in net[res].columns:
+                continue
+            df = net[table][net[table]['in_service'].values.astype(bool)]
+            losses = np.nan_to_num(net[res]['pl_mw'].reindex(df.index).values.astype(float))
+            for column in (a, b):
+                pos = self._positions(df[column])
+                valid = pos >= 0
+                np.add.at(p, pos[valid], -0.5 * losses[valid])
+        p[self.slack] -= p.sum()
+        return p
+
+    def _solve(self, rhs):
+        """Solves B_red * theta = rhs[keep] for one or many right-hand sides (bus x k)."""
+        rhs = np.atleast_2d(rhs.T).T
+        theta = np.zeros((self.n_bus, rhs.shape[1]))
+        theta[self._keep] = self._lu.solve(np.ascontiguousarray(rhs[self._keep]))
+        return theta
+
+    def branch_flows(self, injections_mw):
+        theta = self._solve(injections_mw / self.base_mva - self.bus_shift)
+        return ((self.Bf @ theta).ravel() + self.p_shift) * self.base_mva
+
+    def ptdf_columns(self, bus_positions):
+        """PTDF columns (branch x len(bus_positions)) for injections at the given buses, withdrawn at the slack."""
+        rhs = np.zeros((self.n_bus, len(bus_positions)))
+        rhs[np.asarray(bus_positions), np.arange(len(bus_positions))] = 1.0
+        return np.asarray(self.Bf @ self._solve(rhs))
+
+    def lodf_columns(self, branch_positions):
+        """
+        LODF columns (branch x len(branch_positions)). Column j gives the fraction of the
+        pre-outage flow of branch_positions[j] that shifts onto every branch. Bridge branches
+        (whose outage islands the grid) get a NaN column.
+        """
+        branch_positions = np.asarray(branch_positions)
+        f = self.branches['f'].values[branch_positions]
+        t = self.branches['t'].values[branch_positions]
+        rhs = np.zeros((self.n_bus, len(branch_positions)))
+        cols = np.arange(len(branch_positions))
+        rhs[f, cols] += 1.0
+        rhs[t, cols] -= 1.0
+        ptdf = np.asarray(self.Bf @ self._solve(rhs))
+        self_ptdf = ptdf[branch_positions, cols]
+        denom = 1.0 - self_ptdf
+        bridge = np.abs(denom) < _BRIDGE_TOL
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lodf = ptdf / denom
+        lodf[:, bridge] = np.nan
+        lodf[branch_positions, cols] = -1.0
+        return lodf
+
+    def loading_percent(self, flows_mw):
+        rating = self.branches['rating_mw'].values
+        if flows_mw.ndim == 2:
+            rating = rating[:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.abs(flows_mw) / rating * 100.0
+
+
+def _limit(df, column, default):
+    if column in df.columns:
+        return df[column].fillna(default).values
+    return np.full(len(df), default)
+
+
+def screen_contingencies(net, element_types=("line", "trafo", "gen"), n2=False, n2_candidates=20, model=None):
+    """
+    DC screening of single (and optionally double) outages using PTDF/LODF.
+    Returns a DataFrame with one row per outage: outage, element_type, element,
+    est_max_loading_percent, est_overloads, worst_branch, islanding.
+    """
+    model = model if model is not None else DCModel(net)
+    br = model.branches
+    limits = br['max_loading_percent'].values[:, None]
+    rows = []
+
+    # Branch outages: P' = P + LODF[:, k] * P_k, evaluated in chunks of outages
+    branch_mask = br['element_type'].isin([e for e in element_types if e in ("line", "trafo")]).values
+    outage_pos = np.flatnonzero(branch_mask)
+    for start in range(0, len(outage_pos), _LODF_CHUNK):
+        chunk = outage_pos[start:start + _LODF_CHUNK]
+        lodf = model.lodf_columns(chunk)
+        post = model.flows[:, None] + lodf * model.flows[chunk][None, :]
+        post[chunk, np.arange(len(chunk))] = 0.0
+        loading = model.loading_percent(post)
+        islanding = np.isnan(lodf).any(axis=0)
+        loading = np.nan_to_num(loading, nan=0.0)
+        worst = loading.argmax(axis=0)
+        overloads = (loading > limits).sum(axis=0)
+        for j, k in enumerate(chunk):
+            rows.append({
+                'outage': f"{br.at[k, 'element_type']} {br.at[k, 'element']}",
+                'element_type': br.at[k, 'element_type'],
+                'element': int(br.at[k, 'element']),
+                'est_max_loading_percent': float(loading[worst[j], j]),
+                'est_overloads': int(overloads[j]),
+                'worst_branch': f"{br.at[worst[j], 'element_type']} {br.at[worst[j], 'element']}",
+                'islanding': bool(islanding[j]),
+            })
+
+    # Generator outages: lost output is picked up by the slack, dP = -PTDF[:, bus] * Pg
+    if "gen" in element_types and not net.gen.empty:
+        gens = net.gen[net.gen['in_service'].values.astype(bool)]
+        if 'slack' in gens.columns:
+            gens = gens[~gens['slack'].values.astype(bool)]
+        pos = model._positions(gens['bus'])
+        gens = gens[pos >= 0]
+        pos = pos[pos >= 0]
+        if len(gens):
+            ptdf = model.ptdf_columns(pos)
+            pg = (gens['p_mw'].values * (gens['scaling'].values if 'scaling' in gens.columns else 1.0))
+            post = model.flows[:, None] - ptdf * pg[None, :]
+            loading = model.loading_percent(post)
+            worst = loading.argmax(axis=0)
+            overloads = (loading > limits).sum(axis=0)
+            for j, gid in enumerate(gens.index):
+                rows.append({
+                    'outage': f"gen {gid}",
+                    'element_type': 'gen',
+                    'element': int(gid),
+                    'est_max_loading_percent': float(loading[worst[j], j]),
+                    'est_overloads': int(overloads[j]),
+                    'worst_branch': f"{br.at[worst[j], 'element_type']} {br.at[worst[j], 'element']}",
+                    'islanding': False,
+                })
+
+    screened = pd.DataFrame(rows)
+    if screened.empty:
+        return screened
+
+    if n2:
+        screened = pd.concat([screened, _screen_n2(model, screened, n2_candidates)], ignore_index=True)
+
+    return screened.sort_values(['islanding', 'est_max_loading_percent'], ascending=False).reset_index(drop=True)
+
+
+def _screen_n2(model, screened, n_candidates):
+    """
+    Double branch outages among the n_candidates worst single outages, using the
+    compound LODF formula: [Pk*, Pm*] = inv([[1, -Lkm], [-Lmk, 1]]) [Pk, Pm].
+    """
+    br = model.branches
+    singles = screened[(screened['element_type'] != 'gen') & ~screened['islanding']]
+    singles = singles.nlargest(n_candidates, 'est_max_loading_percent')
+    key = pd.MultiIndex.from_frame(br[['element_type', 'element']])
+    pos = key.get_indexer(pd.MultiIndex.from_frame(singles[['element_type', 'element']]))
+    if len(pos) < 2:
+        return pd.DataFrame(columns=screened.columns)
+
+    lodf = model.lodf_columns(pos)
+    limits = br['max_loading_percent'].values
+    rows = []
+    for a, b in itertools.combinations(range(len(pos)), 2):
+        k, m = pos[a], pos[b]
+        M = np.array([[1.0, -lodf[k, b]], [-lodf[m, a], 1.0]])
+        if not np.all(np.isfinite(M)) or abs(np.linalg.det(M)) < _BRIDGE_TOL:
+            loading, islanding = np.zeros(len(br)), True
+        else:
+            pk, pm = np.linalg.solve(M, [model.flows[k], model.flows[m]])
+            post = model.flows + lodf[:, a] * pk + lodf[:, b] * pm
+            post[[k, m]] = 0.0
+            loading, islanding = model.loading_percent(post), False
+        worst = int(loading.argmax())
+        rows.append({
+            'outage': f"{br.at[k, 'element_type']} {br.at[k, 'element']} + {br.at[m, 'element_type']} {br.at[m, 'element']}",
+            'element_type': 'n-2',
+            'element': -1,
+            'est_max_loading_percent': float(loading[worst]),
+            'est_overloads': int((loading > limits).sum()),
+            'worst_branch': f"{br.at[worst, 'element_type']} {br.at[worst, 'element']}",
+            'islanding': islanding,
+        })
+    return pd.DataFrame(rows)
+
+
+# --- AC verification (runs in worker processes) ---
+
+_WORKER_NET = None
+
+
+def _init_worker(net_blob):
+    global _WORKER_NET
+    _WORKER_NET = pickle.loads(net_blob)
+    try:
+        pp.runpp(_WORKER_NET)
+    except pp.LoadflowNotConverged:
+        pass
+
+
+def _parse_outage(outage):
+    """'line 7 + trafo 2' -> [('line', 7), ('trafo', 2)]"""
+    parts = []
+    for token in outage.split('+'):
+        comp, idx = token.split()
+        parts.append((comp, int(idx)))
+    return parts
+
+
+def evaluate_outage(net, outage):
+    """
+    Takes the elements of `outage` out of service, runs an AC power flow and restores them.
+    Returns a dict with convergence, worst loading, voltage extremes and violation count.
+    """
+    parts = _parse_outage(outage)
+    previous = [(comp, idx, net[comp].at[idx, 'in_service']) for comp, idx in parts]
+    warm = bool(net.get('converged', False))
+    try:
+        for comp, idx in parts:
+            net[comp].at[idx, 'in_service'] = False
+        with warnings.catch_warnings():
+            # Islanding outages make NR emit singular-matrix warnings before failing
+            warnings.simplefilter("ignore")
+            return _solve_outage(net, outage, warm)
+    finally:
+        for comp, idx, value in previous:
+            net[comp].at[idx, 'in_service'] = value
+
+
+def _solve_outage(net, outage, warm):
+    try:
+        pp.runpp(net, init="results" if warm else "auto")
+    except pp.LoadflowNotConverged:
+        try:
+            if not warm:
+                raise
+            pp.runpp(net, init="auto")
+        except pp.LoadflowNotConverged:
+            return {'outage': outage, 'converged': False}
+    return {'outage': outage, 'converged': True, **_ac_metrics(net)}
+
+
+def _ac_metrics(net):
+    loading = []
+    over = 0
+    for table, res in (('line', 'res_line'), ('trafo', 'res_trafo')):
+        if net[table].empty or net[res].empty:
+            continue
+        lp = net[res]['loading_percent'].reindex(net[table].index)
+        limit = pd.Series(_limit(net[table], 'max_loading_percent', DEFAULT_MAX_LOADING), index=net[table].index)
+        over += int((lp > limit).sum())
+        loading.append(lp.rename(lambda i, t=table: f"{t} {i}"))
+    loading = pd.concat(loading) if loading else pd.Series(dtype=float)
+
+    vm = net.res_bus['vm_pu']
+    vmin = pd.Series(_limit(net.bus, 'min_vm_pu', DEFAULT_MIN_VM_PU), index=net.bus.index)
+    vmax = pd.Series(_limit(net.bus, 'max_vm_pu', DEFAULT_MAX_VM_PU), index=net.bus.index)
+    under = np.clip(vmin - vm, 0, None).fillna(0)
+    overv = np.clip(vm - vmax, 0, None).fillna(0)
+    overload_excess = np.clip(loading - 100.0, 0, None).sum() if len(loading) else 0.0
+
+    return {
+        'max_loading_percent': float(loading.max()) if len(loading) else 0.0,
+        'critical_branch': loading.idxmax() if len(loading) and loading.notna().any() else None,
+        'min_vm_pu': float(vm.min()),
+        'max_vm_pu': float(vm.max()),
+        'n_violations': over + int((under > 0).sum() + (overv > 0).sum()),
+        'severity': float(overload_excess + 100.0 * (under.sum() + overv.sum())),
+    }
+
+
+def _evaluate_in_worker(outage):
+    return evaluate_outage(_WORKER_NET, outage)
+
+
+def run_contingency_analysis(net, element_types=("line", "trafo", "gen"), n2=False, n2_candidates=20,
+                             screen_threshold=90.0, min_ac=10, max_ac=200, n_workers=None):
+    """
+    N-1 (optionally N-2) contingency sweep.
+
+    1. Screens every outage with vectorized DC sensitivity factors (see screen_contingencies).
+    2. Runs full AC power flows for the critical subset only: outages whose estimated
+       loading exceeds screen_threshold, that island the grid, plus at least the
+       min_ac worst ones (capped at max_ac), spread over a process pool.
+
+    Args:
+        n_workers (int): Process pool size (default: CPU count). 0 or 1 evaluates in-process.
+
+    Returns:
+        DataFrame ranked by severity (non-converged outages first) with the DC estimate,
+        a status (not_converged, islanding, converged or dc_only) and, for AC-checked
+        outages, converged / max_loading_percent / critical_branch / min_vm_pu /
+        max_vm_pu / n_violations / severity.
+    """
+    screened = screen_contingencies(net, element_types=element_types, n2=n2, n2_candidates=n2_candidates)
+    if screened.empty:
+        return screened
+
+    critical = screened[(screened['est_max_loading_percent'] > screen_threshold) | screened['islanding']]
+    critical = pd.concat([critical, screened.head(min_ac)]).drop_duplicates('outage').head(max_ac)
+    outages = critical['outage'].tolist()
+    print(f"Contingency screening: {len(screened)} outages screened, {len(outages)} selected for AC verification.")
+
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    if n_workers <= 1 or len(outages) <= 1:
+        work_net = pickle.loads(pickle.dumps(net))
+        results = [evaluate_outage(work_net, o) for o in outages]
+    else:
+        blob = pickle.dumps(net)
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(outages)),
+                                 initializer=_init_worker, initargs=(blob,)) as pool:
+            results = list(pool.map(_evaluate_in_worker, outages, chunksize=max(1, len(outages) // (4 * n_workers))))
+
+    ac = pd.DataFrame(results)
+    table = screened.merge(ac, on='outage', how='left')
+    table['ac_checked'] = table['outage'].isin(outages)
+    diverged = table['ac_checked'] & (table['converged'] == False)  # noqa: E712
+    table['status'] = np.select([~table['ac_checked'], diverged, table['islanding']],
+                                ['dc_only', 'not_converged', 'islanding'], default='converged')
+    # Rank: AC non-convergence first, then AC severity, then DC estimate for unchecked outages
+    table['_rank_nc'] = table['ac_checked'] & (table['converged'] == False)  # noqa: E712
+    table['_rank_sev'] = table['severity'].fillna(-1.0)
+    table = table.sort_values(['_rank_nc', 'ac_checked', '_rank_sev', 'est_max_loading_percent'],
+                              ascending=False).drop(columns=['_rank_nc', '_rank_sev'])
+    return table.reset_index(drop=True)
+
+
+def contingency_to_text(table, top_n=10):
+    """Markdown summary of the worst contingencies for LLM prompts / chat responses."""
+    if table is None or table.empty:
+        return "No contingencies evaluated."
+    checked = table[table['ac_checked']]
+    diverged = checked.loc[checked['converged'] == False, 'outage'].tolist()  # noqa: E712
+    n_viol = int((checked['n_violations'].fillna(0) > 0).sum())
+    cols = ['outage', 'status', 'est_max_loading_percent', 'max_loading_percent',
+            'critical_branch', 'min_vm_pu', 'max_vm_pu', 'n_violations']
+    cols = [c for c in cols if c in table.columns]
+    shown = table[cols].head(top_n).round(3)
+    lines = [
+        f"Screened outages: {len(table)}, AC-verified: {len(checked)}, "
+        f"non-converged: {len(diverged)}, with violations: {n_viol}",
+    ]
+    if diverged:
+        lines.append(f"NON-CONVERGED (the AC power flow found no operating point after these outages, "
+                     f"e.g. voltage collapse; treat as most severe): {', '.join(diverged)}")
+    lines += ["", shown.astype(object).where(shown.notna(), "-").to_markdown(index=False)]
+    return "\n".join(lines)
@@ -1,47 +1,200 @@
 import os
 from google import genai
+from google.genai import types
 from dotenv import load_dotenv
+from src.llm_cache import ResponseCache, make_cache_key
+from src.llm_fake import FakeGenAIClient
+from src.llm_scheduler import LLMScheduler, classify_error
+from src.telemetry import metrics, span, LLM_REQUESTS, LLM_TOKENS, LLM_CHARS
+from src.serializer import CHARS_PER_TOKEN
 
 # Load env variables
 load_dotenv()
 
 API_KEY = os.getenv("GOOGLE_API_KEY")
+# LLM_BACKEND=fake swaps in the offline stand-in (no API key / network needed)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
 
-if not API_KEY:
-    print("WARNING: GOOGLE_API_KEY not found in environment variables.")
+def _optional_float(name):
+    value = os.getenv(name)
+    return float(value) if value else None
 
-# Configure the library
-client = genai.Client(api_key=API_KEY)
+if LLM_BACKEND == "fake":
+    # LLM_FAKE_RPM / LLM_FAKE_ERROR_RATE simulate quota errors and outages offline
+    client = FakeGenAIClient(requests_per_minute=_optional_float("LLM_FAKE_RPM"),
+                             error_rate=float(os.getenv("LLM_FAKE_ERROR_RATE", "0")))
+else:
+    if not API_KEY:
+        print("WARNING: GOOGLE_API_KEY not found in environment variables.")
 
-def query_gemini(prompt, system_instruction=None, model_name="gemini-3-flash-preview", response_schema=None):
+    # Configure the library. One client for the whole process, so its HTTP connections are
+    # reused; retries are left to the scheduler (the SDK default does not retry).
+    client = genai.Client(api_key=API_KEY,
+                          http_options=types.HttpOptions(timeout=int(float(os.getenv("LLM_TIMEOUT", "120")) * 1000)))
+
+# Every model request goes through one scheduler: per-model quotas, a cap on requests in
+# flight, interactive before batch, backoff on retryable errors (see src.llm_scheduler)
+scheduler = LLMScheduler(
+    max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "8")),
+    requests_per_minute=_optional_float("LLM_RPM"),
+    tokens_per_minute=_optional_float("LLM_TPM"),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+    base_delay=float(os.getenv("LLM_BACKOFF", "1.0")),
+    max_queue_wait=_optional_float("LLM_MAX_QUEUE_WAIT") or 300.0,
+)
+# Per-model overrides: LLM_MODEL_LIMITS="gemini-3-flash-preview=1000:1000000,other-model=10"
+for _entry in filter(None, os.getenv("LLM_MODEL_LIMITS", "").split(",")):
+    _model, _, _quota = _entry.strip().partition("=")
+    _rpm, _, _tpm = _quota.partition(":")
+    scheduler.set_limits(_model, float(_rpm) if _rpm else None, float(_tpm) if _tpm else None)
+
+def set_client(new_client):
+    """
+    Replaces the shared model client, e.g. with a FakeGenAIClient in tests.
+    Returns the previous client.
+    """
+    global client
+    previous, client = client, new_client
+    return previous
+
+# Response cache (disable with LLM_CACHE_ENABLED=0; set LLM_CACHE_PATH to persist to SQLite)
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", "256")),
+    ttl_seconds=float(os.getenv("LLM_CACHE_TTL", "3600")),
+    disk_path=os.getenv("LLM_CACHE_PATH") or None,
+    max_disk_entries=int(os.getenv("LLM_CACHE_DISK_SIZE", "10000")),
+)
+
+def get_cache_stats():
+    """Returns hit/miss counters of the shared response cache."""
+    return response_cache.stats()
+
+def get_scheduler_stats():
+    """Returns the queue state and quotas of the shared request scheduler."""
+    return scheduler.stats()
+
+def _cache_metrics():
+    stats = response_cache.stats()
+    yield "gemmapower_llm_cache_hit_rate", "Share of LLM requests answered from the response cache.", {}, stats["hit_rate"]
+    yield "gemmapower_llm_cache_entries", "Entries in the LLM response cache.", {"tier": "memory"}, stats["memory_entries"]
+    yield "gemmapower_llm_cache_entries", "Entries in the LLM response cache.", {"tier": "disk"}, stats["disk_entries"]
+    queue = scheduler.stats()
+    yield "gemmapower_llm_in_flight", "LLM requests currently sent to the API.", {}, queue["in_flight"]
+    for priority, n in queue["queued"].items():
+        yield "gemmapower_llm_queued", "LLM requests waiting for admission, by priority.", {"priority": priority}, n
+
+metrics.register_collector(_cache_metrics)
+
+def _record_usage(model_name, prompt, text, response=None, llm_span=None):
+    """Counts characters and tokens of one model call (token counts from the API when it reports them)."""
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None) or len(prompt) // CHARS_PER_TOKEN
+    completion_tokens = getattr(usage, "candidates_token_count", None) or len(text or "") // CHARS_PER_TOKEN
+    LLM_CHARS.inc(len(prompt), model=model_name, direction="prompt")
+    LLM_CHARS.inc(len(text or ""), model=model_name, direction="completion")
+    LLM_TOKENS.inc(prompt_tokens, model=model_name, direction="prompt")
+    LLM_TOKENS.inc(completion_tokens, model=model_name, direction="completion")
+    if llm_span is not None:
+        llm_span.set(prompt_chars=len(prompt), response_chars=len(text or ""),
+                     prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+def query_gemini(prompt, system_instruction=None, model_name="gemini-3-flash-preview", response_schema=None, use_cache=True,
+                 priority=None):
     """
     Sends a prompt to Gemini and returns the text response.
     Supports structured output if response_schema is provided.
+    Identical requests (prompt, system instruction, model, schema) are answered from
+    the response cache unless use_cache=False. Error responses are never cached.
+
+    The request is queued in the shared scheduler at `priority` ("interactive" or
+    "batch"; default: the llm_priority() in effect). Raises LLMError when it fails
+    after the scheduler's retries.
     """
-    try:
-        if system_instruction:
-            # Native system instruction support if available in this client version, 
-            # but sticking to prompt prepend for safety unless we see config options.
-            # actually, let's stick to prompt prepending for now as it worked, 
-            # BUT if we use response_schema, ensure it's compatible.
-            final_prompt = f"System Instruction: {system_instruction}\n\nUser Prompt: {prompt}"
-        else:
-            final_prompt = prompt
-
-        config = {}
-        if response_schema:
-            config = {
-                "response_mime_type": "application/json",
-                "response_json_schema": response_schema
-            }
-
-        response = client.models.generate_content(
-            model=model_name,
-            contents=final_prompt,
-            config=config if config else None
-        )
-        
+    with span("llm.query", model=model_name, structured=response_schema is not None) as llm_span:
+        cache_key = None
+        if use_cache and CACHE_ENABLED:
+            cache_key = make_cache_key(prompt, system_instruction, model_name, response_schema)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                LLM_REQUESTS.inc(model=model_name, outcome="cache_hit")
+                llm_span.set(cache_hit=True)
+                return cached
+
+        final_prompt, config = _build_request(prompt, system_instruction, response_schema)
+        try:
+            response = scheduler.run(
+                lambda: client.models.generate_content(model=model_name, contents=final_prompt, config=config),
+                model_name, prompt_tokens=len(final_prompt) // CHARS_PER_TOKEN, priority=priority
+            )
+        except Exception as e:
+            error = classify_error(e, model_name)
+            LLM_REQUESTS.inc(model=model_name, outcome="error")
+            llm_span.set(error=error.code, attempts=error.attempts)
+            if error is e:
+                raise
+            raise error from e
+
+        LLM_REQUESTS.inc(model=model_name, outcome="ok")
+        _record_usage(model_name, final_prompt, response.text, response, llm_span)
+        if cache_key is not None and response.text is not None:
+            response_cache.set(cache_key, response.text)
         return response.text
 
+def _build_request(prompt, system_instruction=None, response_schema=None):
+    """Returns (contents, config) for a generate_content call."""
+    if system_instruction:
+        # Native system instruction support if available in this client version, 
+        # but sticking to prompt prepend for safety unless we see config options.
+        # actually, let's stick to prompt prepending for now as it worked, 
+        # BUT if we use response_schema, ensure it's compatible.
+        final_prompt = f"System Instruction: {system_instruction}\n\nUser Prompt: {prompt}"
+    else:
+        final_prompt = prompt
+
+    config = {}
+    if response_schema:
+        config = {
+            "response_mime_type": "application/json",
+            "response_json_schema": response_schema
+        }
+    return final_prompt, (config if config else None)
+
+def stream_gemini(prompt, system_instruction=None, model_name="gemini-3-flash-preview", use_cache=True, priority=None):
+    """
+    Streaming variant of query_gemini: yields the response text in chunks as the
+    model produces them. A cached response is yielded as a single chunk; a fully
+    streamed response is added to the cache. Failures raise LLMError, matching
+    query_gemini (retried only until the first chunk has arrived).
+    """
+    cache_key = None
+    if use_cache and CACHE_ENABLED:
+        cache_key = make_cache_key(prompt, system_instruction, model_name, None)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            LLM_REQUESTS.inc(model=model_name, outcome="cache_hit")
+            yield cached
+            return
+
+    # No span() here: a generator may be resumed in another context, so usage is only counted
+    chunks = []
+    final_prompt, config = _build_request(prompt, system_instruction)
+    try:
+        for chunk in scheduler.stream(
+            lambda: client.models.generate_content_stream(model=model_name, contents=final_prompt, config=config),
+            model_name, prompt_tokens=len(final_prompt) // CHARS_PER_TOKEN, priority=priority
+        ):
+            if chunk.text:
+                chunks.append(chunk.text)
+                yield chunk.text
     except Exception as e:
-        return f"Error querying Gemini: {str(e)}"
+        error = classify_error(e, model_name)
+        LLM_REQUESTS.inc(model=model_name, outcome="error")
+        if error is e:
+            raise
+        raise error from e
+
+    LLM_REQUESTS.inc(model=model_name, outcome="ok")
+    _record_usage(model_name, final_prompt, "".join(chunks))
+    if cache_key is not None and chunks:
+        response_cache.set(cache_key, "".join(chunks))
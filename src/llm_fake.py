@@ -0,0 +1,154 @@
+import json
+import random
+import threading
+import time
+from collections import deque
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeAPIError(Exception):
+    """Error of the offline client, shaped like google.genai.errors.APIError (code, status, message, details)."""
+
+    _STATUS = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE", 504: "DEADLINE_EXCEEDED"}
+
+    def __init__(self, code, message="", retry_delay=None):
+        self.code = code
+        self.status = self._STATUS.get(code, "FAILED_PRECONDITION")
+        self.message = message or f"Simulated {self.status} error."
+        self.details = {"error": {"code": code, "status": self.status, "message": self.message, "details": []}}
+        if retry_delay is not None:
+            self.details["error"]["details"].append({"@type": "type.googleapis.com/google.rpc.RetryInfo",
+                                                     "retryDelay": f"{retry_delay:g}s"})
+        super().__init__(f"{code} {self.status}. {self.details}")
+
+
+def example_from_schema(schema, defs=None):
+    """Builds a minimal instance that validates against a JSON schema (used for structured output)."""
+    defs = defs if defs is not None else schema.get('$defs', {})
+    if '$ref' in schema:
+        return example_from_schema(defs[schema['$ref'].split('/')[-1]], defs)
+    if 'enum' in schema:
+        return schema['enum'][0]
+    if 'const' in schema:
+        return schema['const']
+    for key in ('anyOf', 'oneOf', 'allOf'):
+        if key in schema:
+            return example_from_schema(schema[key][0], defs)
+    kind = schema.get('type')
+    if kind == 'object':
+        props = schema.get('properties', {})
+        return {name: example_from_schema(props[name], defs) for name in schema.get('required', []) if name in props}
+    if kind == 'array':
+        return []
+    if kind == 'integer':
+        return 0
+    if kind == 'number':
+        return 0.0
+    if kind == 'boolean':
+        return False
+    if kind == 'null':
+        return None
+    return ""
+
+
+class _FakeModels:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def generate_content(self, model, contents, config=None):
+        return FakeResponse(self._owner.respond(model, contents, config))
+
+    def generate_content_stream(self, model, contents, config=None):
+        text = self._owner.respond(model, contents, config)
+        words = text.split(' ')
+        for i, word in enumerate(words):
+            if self._owner.chunk_delay:
+                time.sleep(self._owner.chunk_delay)
+            yield FakeResponse(word if i == len(words) - 1 else word + ' ')
+
+
+class FakeGenAIClient:
+    """
+    Offline stand-in for google.genai.Client (client.models.generate_content /
+    generate_content_stream), for tests and local runs without an API key.
+
+    Plain-text requests get a short deterministic echo; structured requests get
+    a minimal instance of the requested JSON schema. Pass `responder` to return
+    canned outputs: responder(model, contents, config) -> str or None (None falls
+    back to the default behaviour).
+
+    It can also stand in for an API under pressure, raising FakeAPIError like the real
+    client raises google.genai.errors.APIError: a simulated per-minute quota answers
+    excess requests with 429 (with a RetryInfo delay), and failures can be injected.
+
+    Args:
+        latency (float): Seconds to sleep per request.
+        chunk_delay (float): Seconds between streamed chunks.
+        structured_outputs (dict): Canned structured responses keyed by schema title
+            (e.g. "ScenarioResponse"); values are JSON-serializable objects or
+            callables taking the prompt contents.
+        requests_per_minute (int): Simulated quota over a sliding one-minute window.
+        failures (list): HTTP status codes raised by the next requests, in order, before
+            they are answered normally (e.g. [503, 429]).
+        error_rate (float): Share of the remaining requests failing with a random 500/503.
+        seed (int): Seed for error_rate.
+    """
+
+    def __init__(self, latency=0.0, chunk_delay=0.0, responder=None, structured_outputs=None,
+                 requests_per_minute=None, failures=None, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.responder = responder
+        self.structured_outputs = structured_outputs or {}
+        self.requests_per_minute = requests_per_minute
+        self.failures = deque(failures or [])
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self.models = _FakeModels(self)
+        self._random = random.Random(seed)
+        self._window = deque()  # monotonic times of the requests accepted in the last minute
+        self._lock = threading.Lock()
+
+    def _admit(self):
+        """Raises the simulated error for this request, if any."""
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            error = None
+            if self.failures:
+                error = FakeAPIError(self.failures.popleft())
+            elif self.requests_per_minute:
+                while self._window and now - self._window[0] >= 60.0:
+                    self._window.popleft()
+                if len(self._window) >= self.requests_per_minute:
+                    error = FakeAPIError(429, "Quota exceeded for requests per minute.",
+                                         retry_delay=round(60.0 - (now - self._window[0]), 1))
+            if error is None and self.error_rate and self._random.random() < self.error_rate:
+                error = FakeAPIError(self._random.choice((500, 503)))
+            if error is not None:
+                self.errors += 1
+                raise error
+            if self.requests_per_minute:
+                self._window.append(now)
+
+    def respond(self, model, contents, config=None):
+        self._admit()
+        if self.latency:
+            time.sleep(self.latency)
+        if self.responder is not None:
+            text = self.responder(model, contents, config)
+            if text is not None:
+                return text
+        schema = (config or {}).get('response_json_schema')
+        if schema:
+            canned = self.structured_outputs.get(schema.get('title'))
+            if canned is not None:
+                return json.dumps(canned(contents) if callable(canned) else canned)
+            return json.dumps(example_from_schema(schema))
+        first_line = str(contents).strip().splitlines()[0] if str(contents).strip() else ""
+        return f"[offline {model}] Received {len(str(contents))} characters. {first_line[:120]}"
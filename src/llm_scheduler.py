@@ -0,0 +1,334 @@
+import bisect
+import contextvars
+import itertools
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from src.telemetry import LLM_QUEUE_SECONDS, LLM_RETRIES
+
+# Priority classes, most urgent first: interactive requests are admitted before queued batch work
+PRIORITIES = ("interactive", "batch")
+
+_priority = contextvars.ContextVar("gemmapower_llm_priority", default="interactive")
+
+# HTTP status -> (error code, retryable)
+_STATUS_CODES = {
+    400: ("invalid_request", False),
+    401: ("auth", False),
+    403: ("auth", False),
+    404: ("invalid_request", False),
+    408: ("timeout", True),
+    429: ("rate_limited", True),
+    500: ("unavailable", True),
+    502: ("unavailable", True),
+    503: ("unavailable", True),
+    504: ("timeout", True),
+}
+
+
+class LLMError(Exception):
+    """
+    A failed model request, raised instead of returning an error string.
+
+    Attributes:
+        code (str): rate_limited, unavailable, timeout, connection, auth, invalid_request,
+            queue_timeout or unknown.
+        retryable (bool): Whether trying again later may succeed.
+        model (str): Model the request was sent to.
+        status (int): HTTP status of the API error, if any.
+        attempts (int): Attempts made before giving up.
+        retry_after (float): Seconds the API asked to wait (rate limits), if reported.
+    """
+
+    def __init__(self, message, code="unknown", retryable=False, model=None, status=None, attempts=1, retry_after=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.retryable = retryable
+        self.model = model
+        self.status = status
+        self.attempts = attempts
+        self.retry_after = retry_after
+
+    def __str__(self):
+        tries = f" after {self.attempts} attempts" if self.attempts > 1 else ""
+        return f"LLM request to {self.model} failed ({self.code}){tries}: {self.message}"
+
+
+def _retry_after(error):
+    """Server-suggested delay in seconds (RetryInfo retryDelay of a Google API error), or None."""
+    match = re.search(r"retry_?delay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", str(getattr(error, "details", None) or error),
+                      re.IGNORECASE)
+    return float(match.group(1)) if match else None
+
+
+def classify_error(error, model=None, attempts=1):
+    """Wraps an exception of the model client into an LLMError with a code and retryability."""
+    if isinstance(error, LLMError):
+        return error
+    message = getattr(error, "message", None) or str(error) or type(error).__name__
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(status, int):
+        code, retryable = _STATUS_CODES.get(status, ("unavailable", True) if status >= 500 else ("invalid_request", False))
+        return LLMError(message, code, retryable, model, status, attempts,
+                        _retry_after(error) if code == "rate_limited" else None)
+    name = type(error).__name__
+    if isinstance(error, TimeoutError) or "Timeout" in name:
+        return LLMError(message, "timeout", True, model, attempts=attempts)
+    if isinstance(error, ConnectionError) or "Connect" in name or "RemoteProtocol" in name:
+        return LLMError(message, "connection", True, model, attempts=attempts)
+    return LLMError(message, "unknown", False, model, attempts=attempts)
+
+
+@contextmanager
+def llm_priority(priority):
+    """Runs the enclosed model requests (including those of worker threads started inside) at this priority."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def iter_with_priority(iterator, priority):
+    """
+    Steps through a generator with llm_priority(priority) in effect, also when its steps
+    run in different threads or copied contexts (as the chunks of a streaming response do).
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+    context = contextvars.copy_context()
+    context.run(_priority.set, priority)
+    try:
+        while True:
+            try:
+                item = context.run(next, iterator)
+            except StopIteration:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            context.run(close)
+
+
+class TokenBucket:
+    """
+    Refills at `per_minute` units per minute up to `capacity` (default: one minute's worth).
+    Requests larger than the capacity wait for a full bucket instead of forever.
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(capacity or per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate) if missing > 0 else 0.0
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+
+class LLMScheduler:
+    """
+    Admission control for model requests sent through the shared client.
+
+    Every request waits in one queue ordered by priority class, then arrival, until
+    a concurrency slot is free and the per-model token buckets (requests and prompt
+    tokens per minute) allow it. A request that is ready never waits behind one
+    that is only blocked by another model's quota. Retryable failures (rate limits,
+    5xx, timeouts, dropped connections) are retried with exponential backoff and
+    full jitter, honouring the delay a rate-limit response asks for, which also
+    holds back the other requests for that model. Whatever cannot be recovered is
+    raised as an LLMError.
+
+    Args:
+        max_in_flight (int): Requests sent to the API at once.
+        requests_per_minute (float): Default request quota per model (None = unlimited).
+        tokens_per_minute (float): Default prompt token quota per model (None = unlimited).
+        max_retries (int): Retries after the first attempt.
+        base_delay (float): Backoff before the first retry (seconds, doubled per attempt).
+        max_delay (float): Upper bound of a single backoff.
+        max_queue_wait (float): Seconds a request may wait for admission before failing
+            with code "queue_timeout" (None = no limit).
+    """
+
+    def __init__(self, max_in_flight=8, requests_per_minute=None, tokens_per_minute=None, max_retries=4,
+                 base_delay=1.0, max_delay=30.0, max_queue_wait=None):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_queue_wait = max_queue_wait
+        self._cond = threading.Condition()
+        self._waiting = []  # sorted [priority rank, sequence, model, tokens]
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._limits = {}  # model -> (requests_per_minute, tokens_per_minute)
+        self._buckets = {}  # model -> (request bucket or None, token bucket or None)
+        self._paused = {}  # model -> monotonic time until which a reported rate limit holds requests back
+        self._retries = 0
+
+    def set_limits(self, model, requests_per_minute=None, tokens_per_minute=None):
+        """Overrides the default quotas for one model (None = unlimited)."""
+        with self._cond:
+            self._limits[model] = (requests_per_minute, tokens_per_minute)
+            self._buckets.pop(model, None)
+            self._cond.notify_all()
+
+    def _model_buckets(self, model):
+        buckets = self._buckets.get(model)
+        if buckets is None:
+            rpm, tpm = self._limits.get(model, (self.requests_per_minute, self.tokens_per_minute))
+            buckets = (TokenBucket(rpm) if rpm else None, TokenBucket(tpm) if tpm else None)
+            self._buckets[model] = buckets
+        return buckets
+
+    def _ready_in(self, entry, now):
+        requests, tokens = self._model_buckets(entry[2])
+        return max(self._paused.get(entry[2], now) - now,
+                   requests.wait_time(1, now) if requests else 0.0,
+                   tokens.wait_time(entry[3], now) if tokens and entry[3] else 0.0)
+
+    def _acquire(self, model, tokens, priority):
+        entry = [PRIORITIES.index(priority), next(self._sequence), model, tokens]
+        enqueued = time.monotonic()
+        with self._cond:
+            bisect.insort(self._waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delays = [self._ready_in(e, now) for e in self._waiting[:self._waiting.index(entry) + 1]]
+                    # Admit when a slot is free, our quota allows it and nobody ahead could go instead
+                    if self._in_flight < self.max_in_flight and delays[-1] == 0 and 0 not in delays[:-1]:
+                        break
+                    timeout = min((d for d in delays if d > 0), default=None)
+                    if self.max_queue_wait is not None:
+                        left = enqueued + self.max_queue_wait - now
+                        if left <= 0:
+                            raise LLMError(f"No capacity within {self.max_queue_wait:.0f}s "
+                                           f"({self._in_flight} in flight, {len(self._waiting)} queued).",
+                                           "queue_timeout", True, model)
+                        timeout = left if timeout is None else min(timeout, left)
+                    self._cond.wait(timeout)
+                requests, token_bucket = self._model_buckets(model)
+                if requests:
+                    requests.take(1, now)
+                if token_bucket and tokens:
+                    token_bucket.take(tokens, now)
+                self._in_flight += 1
+            finally:
+                self._waiting.remove(entry)
+                self._cond.notify_all()
+        LLM_QUEUE_SECONDS.observe(time.monotonic() - enqueued, priority=priority)
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _failed(self, error, model, attempt):
+        """Classifies a failure; returns the backoff before the next attempt or raises the LLMError."""
+        failure = classify_error(error, model, attempt)
+        failure.attempts = attempt
+        if failure.code == "rate_limited":
+            # Hold back every request for this model, not just the one that hit the limit
+            with self._cond:
+                pause = min(self.max_delay, failure.retry_after or self.base_delay * 2 ** (attempt - 1))
+                self._paused[model] = max(self._paused.get(model, 0.0), time.monotonic() + pause)
+        if not failure.retryable or attempt > self.max_retries:
+            if failure is error:
+                raise failure
+            raise failure from error
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if failure.retry_after:
+            delay = min(self.max_delay, failure.retry_after) + random.uniform(0, self.base_delay)
+        LLM_RETRIES.inc(model=model, code=failure.code)
+        with self._cond:
+            self._retries += 1
+        print(f"LLM request to {model} failed ({failure.code}); retry {attempt}/{self.max_retries} in {delay:.1f}s.")
+        return delay
+
+    def run(self, fn, model, prompt_tokens=0, priority=None):
+        """
+        Calls fn() (one model request) once admitted and returns its result, retrying
+        retryable failures.
+
+        Args:
+            model (str): Model name, selects the quota.
+            prompt_tokens (int): Estimated prompt tokens, charged to the token quota.
+            priority (str): "interactive" or "batch" (default: the llm_priority() in effect).
+        """
+        priority = priority or _priority.get()
+        attempt = 0
+        while True:
+            attempt += 1
+            self._acquire(model, prompt_tokens, priority)
+            try:
+                return fn()
+            except Exception as e:
+                error = e
+            finally:
+                self._release()
+            time.sleep(self._failed(error, model, attempt))
+
+    def stream(self, fn, model, prompt_tokens=0, priority=None):
+        """
+        Streaming variant of run(): fn() returns an iterator of chunks, which are yielded
+        while the request holds its slot. Only failures before the first chunk are
+        retried; a stream that breaks off midway raises a non-retryable LLMError.
+        """
+        priority = priority or _priority.get()
+        attempt = 0
+        while True:
+            attempt += 1
+            self._acquire(model, prompt_tokens, priority)
+            started = False
+            try:
+                for chunk in fn():
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                error = e
+                if started:
+                    failure = classify_error(e, model, attempt)
+                    failure.retryable = False
+                    raise failure from e
+            finally:
+                self._release()
+            time.sleep(self._failed(error, model, attempt))
+
+    def stats(self):
+        """Current queue state and configuration (JSON-serializable)."""
+        with self._cond:
+            queued = {p: 0 for p in PRIORITIES}
+            for entry in self._waiting:
+                queued[PRIORITIES[entry[0]]] += 1
+            return {
+                "in_flight": self._in_flight,
+                "max_in_flight": self.max_in_flight,
+                "queued": queued,
+                "retries": self._retries,
+                "limits": {model: {"requests_per_minute": rpm, "tokens_per_minute": tpm}
+                           for model, (rpm, tpm) in self._limits.items()},
+                "default_limits": {"requests_per_minute": self.requests_per_minute,
+                                   "tokens_per_minute": self.tokens_per_minute},
+            }
@@ -0,0 +1,156 @@
+import time
+import pandapower as pp
+from src.telemetry import traced
+
+# Invalidation levels, ordered from cheapest to most expensive re-solve
+CLEAN = 0
+INJECTION = 1   # load/sgen P/Q changed: only the bus injections (Sbus) need updating
+GENERATION = 2  # gen setpoints changed: the ppc gen table needs rebuilding as well
+TOPOLOGY = 3    # branches, buses, switching or element creation: rebuild ppc/Ybus from scratch
+
+LEVEL_NAMES = {CLEAN: "clean", INJECTION: "injection", GENERATION: "generation", TOPOLOGY: "topology"}
+
+# Parameters whose modification leaves the admittance structure untouched. Switching
+# elements in or out of service is not among them: a recycled solve keeps pandapower's
+# in-service element masks, so it is treated as a topology change.
+_INJECTION_PARAMS = {
+    'load': {'p_mw', 'q_mvar', 'scaling'},
+    'sgen': {'p_mw', 'q_mvar', 'scaling'},
+}
+_GENERATION_PARAMS = {
+    'gen': {'p_mw', 'vm_pu', 'scaling'},
+}
+
+_RECYCLE = {
+    INJECTION: dict(bus_pq=True, gen=False, trafo=False),
+    GENERATION: dict(bus_pq=True, gen=True, trafo=False),
+}
+
+
+def classify_actions(actions):
+    """
+    Returns the invalidation level implied by a list of ScenarioBuilder actions:
+    the most expensive level required by any single action/parameter.
+    """
+    level = CLEAN
+    for action in actions:
+        comp = action['component']
+        if action['type'] != 'modify':
+            return TOPOLOGY
+        for param in action['parameters']:
+            if param in _INJECTION_PARAMS.get(comp, ()):
+                level = max(level, INJECTION)
+            elif param in _GENERATION_PARAMS.get(comp, ()):
+                level = max(level, GENERATION)
+            else:
+                return TOPOLOGY
+    return level
+
+
+class PowerFlowSession:
+    """
+    Keeps a pandapower network's last converged solution and its internal
+    ppc/Ybus structures between solves.
+
+    - Injection-only changes reuse the stored Ybus and only refresh Sbus
+      (pandapower's `recycle` mechanism), warm-started from the last voltages.
+    - Topology changes rebuild the internal model, still warm-started from
+      the previous results when the bus set is unchanged.
+    - A warm start that fails to converge is retried once from a cold start.
+
+    Callers report what they changed with invalidate(level); every solve()
+    returns (and stores in last_report) iteration count and timing.
+    """
+
+    def __init__(self, net, detach_results=True, **pf_options):
+        """
+        Args:
+            detach_results (bool): Copy the res_* tables before warm/recycled solves (see
+                _detach_results). Only callers that never snapshot results may turn this off.
+        """
+        self.net = net
+        self.detach_results = detach_results
+        self.pf_options = pf_options
+        self.pending = TOPOLOGY  # nothing is cached yet
+        self.last_report = None
+        self.n_solves = 0
+
+    def invalidate(self, level=TOPOLOGY):
+        """Marks the cached model as stale up to the given level."""
+        self.pending = max(self.pending, level)
+
+    def _has_warm_start(self):
+        res = self.net.get('res_bus')
+        return (
+            bool(self.net.get('converged', False))
+            and res is not None
+            and len(res) == len(self.net.bus)
+            and not res['vm_pu'].isna().all()
+        )
+
+    def solve(self):
+        """
+        Runs the power flow with the cheapest strategy the pending changes allow.
+        Returns a report dict: converged, mode, iterations, time_s.
+        Raises pandapower's LoadflowNotConverged like pp.runpp.
+        """
+        level = self.pending
+        warm = self._has_warm_start()
+        start = time.perf_counter()
+
+        if level == CLEAN and warm:
+            mode = "cached"
+        elif level in _RECYCLE and warm and self.net.get('_ppc') is not None:
+            mode = f"recycled-{LEVEL_NAMES[level]}"
+        else:
+            mode = "rebuild-warm" if warm else "rebuild-cold"
+
+        if mode != "cached" and self.detach_results:
+            self._detach_results()
+        try:
+            if mode.startswith("recycled"):
+                pp.runpp(self.net, recycle=_RECYCLE[level], **self.pf_options)
+            elif mode == "rebuild-warm":
+                pp.runpp(self.net, init="results", **self.pf_options)
+            elif mode == "rebuild-cold":
+                pp.runpp(self.net, **self.pf_options)
+        except pp.LoadflowNotConverged:
+            if mode == "rebuild-cold":
+                self._record(mode, start, converged=False)
+                raise
+            # Warm start from a far-away solution can fail where a flat start succeeds
+            mode = "rebuild-cold"
+            try:
+                pp.runpp(self.net, init="auto", **self.pf_options)
+            except pp.LoadflowNotConverged:
+                self._record(mode, start, converged=False)
+                raise
+
+        self.pending = CLEAN
+        return self._record(mode, start, converged=True)
+
+    @traced("powerflow.detach_results")
+    def _detach_results(self):
+        """
+        Recycled and init="results" solves write into the existing res_* tables in
+        place (only a cold solve replaces them). Swap in copies first so anyone holding
+        the previous tables, e.g. a NetworkTransaction snapshot, keeps the old values.
+        Result tables are a few numeric columns, so this is cheap next to the solve itself.
+        """
+        for key in list(self.net.keys()):
+            if key.startswith('res_') and len(self.net[key]):
+                self.net[key] = self.net[key].copy()
+
+    def _record(self, mode, start, converged):
+        ppc = self.net.get('_ppc') or {}
+        self.n_solves += 1
+        self.last_report = {
+            "converged": converged,
+            "mode": mode,
+            "iterations": int(ppc.get('iterations', 0) or 0) if mode != "cached" else 0,
+            "time_s": round(time.perf_counter() - start, 4),
+        }
+        if not converged:
+            # The internal model now reflects a failed state; rebuild on the next solve
+            self.pending = TOPOLOGY
+        return self.last_report
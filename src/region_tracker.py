@@ -0,0 +1,104 @@
+import numpy as np
+from src.network_manager import build_bus_cluster_index
+
+# Which bus column(s) tie each element table to a region
+ELEMENT_BUS_COLUMNS = {
+    'bus': None,  # the index itself
+    'line': ('from_bus', 'to_bus'),
+    'trafo': ('hv_bus', 'lv_bus'),
+    'trafo3w': ('hv_bus', 'mv_bus', 'lv_bus'),
+    'load': ('bus',),
+    'gen': ('bus',),
+    'sgen': ('bus',),
+    'shunt': ('bus',),
+    'ext_grid': ('bus',),
+    'storage': ('bus',),
+}
+
+# Result changes below this are not worth re-serializing a region for
+_RESULT_TOL = 1e-4
+
+
+class RegionTracker:
+    """
+    Dirty-tracking of regions (clusters) for a clustered network.
+
+    Keeps a precomputed bus -> cluster index, maps changed elements to the clusters
+    that own them, and diffs power flow results against the last seen values so
+    only the regions whose data actually changed get re-extracted and re-serialized.
+    """
+
+    def __init__(self, net):
+        self.net = net
+        self.dirty = set()
+        self.rebuild_index()
+        self._results = self._result_signature()
+
+    def rebuild_index(self):
+        self.bus_cluster = build_bus_cluster_index(self.net)
+        self.clusters = set(np.unique(self.bus_cluster.values).tolist())
+
+    def clusters_of(self, component, ids):
+        """Returns the set of clusters owning the given elements of a component table."""
+        ids = list(ids)
+        if not ids:
+            return set()
+        if component not in ELEMENT_BUS_COLUMNS or component not in self.net:
+            # Unknown element type: be conservative
+            return set(self.clusters)
+        if component == 'bus':
+            buses = np.asarray(ids)
+        else:
+            df = self.net[component]
+            rows = df.loc[df.index.intersection(ids)]
+            buses = np.concatenate([rows[c].values for c in ELEMENT_BUS_COLUMNS[component]])
+        found = self.bus_cluster.reindex(buses)
+        if found.isna().any():
+            # New buses without a cluster yet
+            return set(self.clusters)
+        return set(found.astype(int).tolist())
+
+    def mark_elements(self, component, ids):
+        self.dirty |= self.clusters_of(component, ids)
+
+    def mark_touched(self, touched):
+        """Marks the owners of {component: ids}, e.g. NetworkTransaction.touched_elements()."""
+        if 'bus' in touched and set(touched['bus']) - set(self.bus_cluster.index):
+            self.rebuild_index()
+        for component, ids in touched.items():
+            self.mark_elements(component, ids)
+
+    def mark_all(self):
+        self.dirty |= set(self.clusters)
+
+    def _result_signature(self):
+        signature = {}
+        for table, res, column in (('bus', 'res_bus', 'vm_pu'), ('line', 'res_line', 'loading_percent'),
+                                   ('trafo', 'res_trafo', 'loading_percent')):
+            df = self.net.get(res)
+            if df is not None and not df.empty and column in df.columns:
+                signature[table] = df[column]
+        return signature
+
+    def mark_results_changed(self):
+        """
+        Call after a power flow: compares bus voltages and branch loadings with the
+        values seen last time and marks only the clusters whose results moved.
+        """
+        current = self._result_signature()
+        for table, values in current.items():
+            previous = self._results.get(table)
+            if previous is None or not previous.index.equals(values.index):
+                self.mark_all()
+                break
+            old = previous.values
+            new = values.values
+            changed = ~((np.abs(new - old) <= _RESULT_TOL) | (np.isnan(new) & np.isnan(old)))
+            if changed.any():
+                self.mark_elements(table, values.index[changed])
+        self._results = current
+
+    def pop_dirty(self):
+        """Returns and clears the set of dirty clusters."""
+        dirty, self.dirty = self.dirty, set()
+        return dirty
@@ -0,0 +1,103 @@
+import re
+from src.agents.scenario_builder import _zone_mask
+
+# Routes a user question to the Region Agents that own what it talks about.
+#   "What is the voltage at bus 14?"         -> the region owning bus 14
+#   "Is line 7 overloaded?"                  -> the region(s) at either end of line 7
+#   "Summarize region 2", "loads in zone 3"  -> that region / the regions covering the zone
+#   "Which line is the most loaded?"         -> every region (global question)
+
+# Element words as they appear in questions -> pandapower table
+ELEMENT_WORDS = {
+    'bus': 'bus', 'buses': 'bus', 'busbar': 'bus', 'node': 'bus', 'nodes': 'bus', 'substation': 'bus',
+    'line': 'line', 'lines': 'line', 'branch': 'line', 'branches': 'line',
+    'trafo': 'trafo', 'trafos': 'trafo', 'transformer': 'trafo', 'transformers': 'trafo',
+    'gen': 'gen', 'gens': 'gen', 'generator': 'gen', 'generators': 'gen',
+    'sgen': 'sgen', 'sgens': 'sgen',
+    'load': 'load', 'loads': 'load',
+    'shunt': 'shunt', 'shunts': 'shunt',
+}
+
+_ID_LIST = r"(?:no\.?\s*|number\s+|#\s*)?(?P<ids>\d+(?:\s*(?:,|&|/|\bor\b|\band\b|\bto\b|-)\s*\d+)*)"
+_ELEMENT_REF = re.compile(
+    r"\b(?P<word>" + "|".join(sorted(ELEMENT_WORDS, key=len, reverse=True)) + r")\s+" + _ID_LIST + r"\b")
+_REGION_REF = re.compile(r"\b(?:region|cluster|area)s?\s+(?P<ids>\d+(?:\s*(?:,|&|\bor\b|\band\b)\s*\d+)*)\b")
+_ZONE_REF = re.compile(r"\bzones?\s+(?P<zones>[\w.-]+(?:\s*(?:,|&|\bor\b|\band\b)\s*[\w.-]+)*)")
+
+# Cheap classifier for questions about the whole network. These are broadcast even
+# when they name an element ("compare bus 5 with the rest of the grid").
+_GLOBAL_HINTS = re.compile(
+    r"\b(?:all|every|each|entire|whole|overall|system[- ]wide|network[- ]wide|grid[- ]wide|"
+    r"across|compare|comparison|rest\s+of|elsewhere|other\s+regions?|which\s+regions?|any\s+regions?|"
+    r"summar(?:y|ize|ise)\s+(?:the\s+)?(?:network|grid|system))\b"
+)
+
+
+def _ids(text):
+    """'3, 5 and 8' -> [3, 5, 8]; '3-6' / '3 to 6' -> [3, 4, 5, 6] (short ranges only)."""
+    ids = []
+    for part in re.split(r"\s*(?:,|&|/|\bor\b|\band\b)\s*", text):
+        bounds = re.split(r"\s*(?:-|\bto\b)\s*", part)
+        if len(bounds) == 2 and bounds[0].isdigit() and bounds[1].isdigit() and 0 <= int(bounds[1]) - int(bounds[0]) <= 50:
+            ids.extend(range(int(bounds[0]), int(bounds[1]) + 1))
+        else:
+            ids.extend(int(b) for b in bounds if b.isdigit())
+    return ids
+
+
+def extract_references(query):
+    """
+    Finds the elements, regions and zones a question names.
+
+    Returns a dict: {"elements": {table: [ids]}, "regions": [cluster ids], "zones": [labels]}.
+    """
+    text = query.lower()
+    elements = {}
+    for match in _ELEMENT_REF.finditer(text):
+        table = ELEMENT_WORDS[match.group('word')]
+        elements.setdefault(table, []).extend(_ids(match.group('ids')))
+    regions = [int(i) for i in re.findall(r"\d+", " ".join(m.group('ids') for m in _REGION_REF.finditer(text)))]
+    zones = []
+    for match in _ZONE_REF.finditer(text):
+        zones.extend(z for z in re.split(r"\s*(?:,|&|\bor\b|\band\b)\s*", match.group('zones')) if z)
+    return {"elements": elements, "regions": regions, "zones": zones}
+
+
+def route_query(query, tracker):
+    """
+    Decides which Region Agents should answer a question.
+
+    Args:
+        query (str): The user question.
+        tracker (RegionTracker): Element -> cluster index of the network.
+
+    Returns (clusters, reason): the set of cluster ids to dispatch to, or None to
+    broadcast to every region, and a short human-readable reason.
+    """
+    if _GLOBAL_HINTS.search(query.lower()):
+        return None, "global question"
+
+    refs = extract_references(query)
+    clusters = set()
+    named = []
+    for table, ids in refs["elements"].items():
+        existing = [i for i in ids if i in tracker.net[table].index] if table in tracker.net else []
+        if existing:
+            clusters |= tracker.clusters_of(table, existing)
+            named.append(f"{table} {', '.join(map(str, existing))}")
+    regions = [cid for cid in refs["regions"] if cid in tracker.clusters]
+    if regions:
+        clusters |= set(regions)
+        named.append(f"region {', '.join(map(str, regions))}")
+    if refs["zones"] and 'zone' in tracker.net.bus.columns:
+        for zone in refs["zones"]:
+            buses = tracker.net.bus.index[_zone_mask(tracker.net.bus['zone'], zone)]
+            if len(buses):
+                clusters |= tracker.clusters_of('bus', buses)
+                named.append(f"zone {zone}")
+
+    if not clusters:
+        return None, "no specific element or region referenced"
+    if clusters >= tracker.clusters:
+        return None, f"references span every region ({'; '.join(named)})"
+    return clusters, f"references {'; '.join(named)}"
@@ -0,0 +1,350 @@
+import os
+import pickle
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from src.contingency import _ac_metrics
+from src.telemetry import span
+
+# Bump when the layout of a saved store changes so old files are rejected
+SCENARIO_STORE_VERSION = 1
+BASE_SCENARIO = "base"
+
+# Element tables whose row counts identify the base network a store belongs to
+_FINGERPRINT_TABLES = ('bus', 'line', 'trafo', 'trafo3w', 'load', 'gen', 'sgen', 'shunt', 'ext_grid', 'storage')
+
+
+def _fingerprint(net):
+    return {table: len(net[table]) for table in _FINGERPRINT_TABLES if table in net}
+
+
+def _changed_positions(old, new):
+    if old.dtype.kind in 'fc' and new.dtype.kind in 'fc':
+        same = (old == new) | (np.isnan(old) & np.isnan(new))
+    else:
+        same = (old == new) | (pd.isna(old) & pd.isna(new))
+    return np.flatnonzero(~same)
+
+
+def _native(values):
+    """Object array of journaled values -> array of their natural dtype."""
+    return pd.Series(values).infer_objects().to_numpy()
+
+
+def _plain(value):
+    """numpy scalar -> Python value (JSON-friendly)."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _write_column(df, column, positions, values, dtype=None):
+    data = df[column].to_numpy(copy=True)
+    if data.dtype.kind != 'O' and np.asarray(values).dtype.kind == 'O':
+        data = data.astype(object)
+    data[positions] = values
+    df[column] = data
+    if dtype is not None and df[column].dtype != dtype:
+        try:
+            df[column] = df[column].astype(dtype)
+        except (TypeError, ValueError):
+            pass
+
+
+class ScenarioDelta:
+    """
+    Column-level difference between a scenario and its parent. Holds old and new values
+    of every changed cell, so it can be replayed in both directions:
+
+      inputs:   {(table, column): (index, old, new, old_dtype, new_dtype)} edited element cells
+      created:  {table: DataFrame} rows added by the scenario, with their final values
+      results:  {(res_table, column): (positions, old, new)} changed result cells
+      replaced: {res_table: (old, new)} whole result tables whose rows changed (after creations)
+      converged: (old, new) power flow convergence flag
+    """
+
+    def __init__(self, inputs, created, results, replaced, converged):
+        self.inputs = inputs
+        self.created = created
+        self.results = results
+        self.replaced = replaced
+        self.converged = converged
+
+    @classmethod
+    def from_transaction(cls, net, transaction):
+        """Builds the delta of an open NetworkTransaction whose changes are about to be kept."""
+        inputs = {}
+        for (table, column), (index, old, old_dtype) in transaction.column_changes().items():
+            df = net[table]
+            positions = df.index.get_indexer(index)
+            new = df[column].to_numpy()[positions]
+            old = _native(old)
+            changed = _changed_positions(old, new) if old.dtype == new.dtype else np.arange(len(index))
+            if len(changed):
+                inputs[(table, column)] = (index.to_numpy()[changed], old[changed], new[changed],
+                                           old_dtype, df[column].dtype)
+        created = {table: net[table].loc[ids].copy() for table, ids in transaction.created_rows().items()}
+
+        previous = transaction.previous_results()
+        results, replaced = {}, {}
+        keys = {k for k in previous if k.startswith('res_')} | {k for k in net.keys() if k.startswith('res_')}
+        for key in sorted(keys):
+            old, new = previous.get(key), net.get(key)
+            if old is new or not isinstance(new, pd.DataFrame):
+                continue
+            if not isinstance(old, pd.DataFrame) or not old.index.equals(new.index) or list(old.columns) != list(new.columns):
+                replaced[key] = (old.copy() if isinstance(old, pd.DataFrame) else None, new.copy())
+                continue
+            for column in new.columns:
+                old_values, new_values = old[column].to_numpy(), new[column].to_numpy()
+                positions = _changed_positions(old_values, new_values)
+                if len(positions):
+                    results[(key, column)] = (positions.astype(np.int32), old_values[positions], new_values[positions])
+        converged = (bool(previous.get('converged', False)), bool(net.get('converged', False)))
+        return cls(inputs, created, results, replaced, converged)
+
+    def apply(self, net, forward=True):
+        """Replays the delta on net (forward: parent -> scenario, otherwise scenario -> parent)."""
+        if forward:
+            for table, rows in self.created.items():
+                dtypes = net[table].dtypes
+                net[table] = pd.concat([net[table], rows])
+                for column, dtype in dtypes.items():
+                    if net[table][column].dtype != dtype:
+                        try:
+                            net[table][column] = net[table][column].astype(dtype)
+                        except (TypeError, ValueError):
+                            pass
+        for (table, column), (index, old, new, old_dtype, new_dtype) in self.inputs.items():
+            df = net[table]
+            _write_column(df, column, df.index.get_indexer(index), new if forward else old,
+                          new_dtype if forward else old_dtype)
+        if not forward:
+            for table, rows in self.created.items():
+                net[table].drop(rows.index, inplace=True, errors='ignore')
+
+        for (key, column), (positions, old, new) in self.results.items():
+            _write_column(net[key], column, positions, new if forward else old)
+        for key, (old, new) in self.replaced.items():
+            frame = new if forward else old
+            if frame is not None:
+                net[key] = frame.copy()
+        net['converged'] = self.converged[1 if forward else 0]
+
+    def touched(self):
+        """{table: set(ids)} of the elements the delta edits or creates."""
+        touched = {}
+        for (table, _), (index, *_rest) in self.inputs.items():
+            touched.setdefault(table, set()).update(index.tolist())
+        for table, rows in self.created.items():
+            touched.setdefault(table, set()).update(rows.index.tolist())
+        return touched
+
+    def n_cells(self):
+        return (sum(len(v[0]) for v in self.inputs.values()) + sum(r.size for r in self.created.values()),
+                sum(len(v[0]) for v in self.results.values()) + sum(n.size for _, n in self.replaced.values()))
+
+
+class ScenarioStore:
+    """
+    Tree of committed what-if scenarios on one live network.
+
+    The base case is the root. Every committed modification becomes a child of the
+    current scenario and stores only a ScenarioDelta against it (changed input cells
+    and changed power flow results), so branches like base -> A -> A1 and base -> B
+    cost what they change. checkout() switches the live network to any scenario by
+    undoing deltas up to the common ancestor and replaying them down to the target,
+    results included, so no power flow is needed.
+
+    Args:
+        net (pandapowerNet): The live network, in its base state.
+    """
+
+    def __init__(self, net):
+        self.net = net
+        self.fingerprint = _fingerprint(net)
+        self.scenarios = {BASE_SCENARIO: self._record(BASE_SCENARIO, None, "Base case", [])}
+        self._deltas = {}
+        self._counter = 0
+        self.current = BASE_SCENARIO
+
+    def _record(self, scenario_id, parent, description, actions, delta=None):
+        converged = bool(self.net.get('converged', False)) and not self.net.res_bus.empty
+        record = {
+            "id": scenario_id,
+            "parent": parent,
+            "description": description,
+            "actions": actions,
+            "created": time.time(),
+            "metrics": _ac_metrics(self.net) if converged else None,
+        }
+        if delta is not None:
+            record["input_cells"], record["result_cells"] = delta.n_cells()
+        return record
+
+    def commit(self, transaction, description="", actions=None):
+        """
+        Records the changes of an open NetworkTransaction (applied and solved on the live
+        network) as a new child of the current scenario, commits the transaction and makes
+        the new scenario current. Returns its id.
+        """
+        with span("scenarios.commit"):
+            delta = ScenarioDelta.from_transaction(self.net, transaction)
+            transaction.commit()
+            self._counter += 1
+            scenario_id = f"s{self._counter}"
+            self._deltas[scenario_id] = delta
+            self.scenarios[scenario_id] = self._record(scenario_id, self.current, description, actions or [], delta)
+            self.current = scenario_id
+        return scenario_id
+
+    def path(self, scenario_id):
+        """Scenario ids from the base case down to scenario_id."""
+        if scenario_id not in self.scenarios:
+            raise KeyError(f"Unknown scenario: {scenario_id}")
+        path = []
+        while scenario_id is not None:
+            path.append(scenario_id)
+            scenario_id = self.scenarios[scenario_id]["parent"]
+        return path[::-1]
+
+    def _route(self, source, target):
+        """(scenarios to undo, scenarios to replay) to get from source to target."""
+        up, down = self.path(source), self.path(target)
+        common = 0
+        while common < min(len(up), len(down)) and up[common] == down[common]:
+            common += 1
+        return up[common:][::-1], down[common:]
+
+    def checkout(self, scenario_id):
+        """
+        Switches the live network (inputs and results) to scenario_id. Returns {table: set(ids)}
+        of the elements that may have changed, for dirty-tracking.
+        """
+        undo, replay = self._route(self.current, scenario_id)
+        touched = {}
+        with span("scenarios.checkout", target=scenario_id, steps=len(undo) + len(replay)):
+            for sid in undo:
+                self._deltas[sid].apply(self.net, forward=False)
+            for sid in replay:
+                self._deltas[sid].apply(self.net, forward=True)
+            for sid in undo + replay:
+                for table, ids in self._deltas[sid].touched().items():
+                    touched.setdefault(table, set()).update(ids)
+        self.current = scenario_id
+        return touched
+
+    def list(self):
+        """The scenarios, parents before children, with a flag for the current one."""
+        return [{**record, "current": sid == self.current} for sid, record in self.scenarios.items()]
+
+    def diff(self, a, b, top_n=10):
+        """
+        Compares two scenarios: the input cells either of them changed (relative to their
+        common ancestor), the top_n largest differences in bus voltages and line / trafo
+        loadings, and their limit metrics. The live network is switched to each and back, which only
+        replays deltas.
+        """
+        undo, replay = self._route(a, b)
+        keys, created = {}, set()
+        for sid in undo + replay:
+            delta = self._deltas[sid]
+            for (table, column), (index, *_rest) in delta.inputs.items():
+                keys.setdefault((table, column), set()).update(index.tolist())
+            for table, rows in delta.created.items():
+                created.update((table, idx) for idx in rows.index)
+
+        original = self.current
+        states = {}
+        try:
+            for sid in (a, b):
+                self.checkout(sid)
+                inputs = {}
+                for (table, column), ids in keys.items():
+                    df = self.net[table]
+                    present = df.index.intersection(sorted(ids))
+                    inputs[(table, column)] = df.loc[present, column].copy()
+                results = {}
+                for key, column in (('res_bus', 'vm_pu'), ('res_line', 'loading_percent'), ('res_trafo', 'loading_percent')):
+                    if key in self.net and column in self.net[key].columns:
+                        results[(key[4:], column)] = self.net[key][column].copy()
+                existing = {(table, idx) for table, idx in created if idx in self.net[table].index}
+                states[sid] = (inputs, results, existing)
+        finally:
+            self.checkout(original)
+
+        input_changes = []
+        for key in keys:
+            va, vb = states[a][0][key], states[b][0][key]
+            table, column = key
+            for idx in va.index.intersection(vb.index):
+                if not (va[idx] == vb[idx] or (pd.isna(va[idx]) and pd.isna(vb[idx]))):
+                    input_changes.append({"table": table, "element": int(idx), "column": column,
+                                          a: _plain(va[idx]), b: _plain(vb[idx])})
+        for table, idx in sorted(created, key=str):
+            in_a, in_b = (table, idx) in states[a][2], (table, idx) in states[b][2]
+            if in_a != in_b:
+                input_changes.append({"table": table, "element": int(idx), "column": None,
+                                      a: "exists" if in_a else "absent", b: "exists" if in_b else "absent"})
+
+        result_changes = {}
+        for key, values_a in states[a][1].items():
+            values_b = states[b][1].get(key)
+            if values_b is None:
+                continue
+            change = (values_b - values_a.reindex(values_b.index)).dropna()
+            change = change[change != 0]
+            largest = change.abs().sort_values(ascending=False).index[:top_n]
+            result_changes[f"{key[0]}.{key[1]}"] = [
+                {"element": int(idx), a: float(values_a.get(idx, np.nan)), b: float(values_b[idx]), "change": float(change[idx])}
+                for idx in largest
+            ]
+
+        return {
+            "a": a,
+            "b": b,
+            "inputs": input_changes,
+            "results": result_changes,
+            "metrics": {a: self.scenarios[a]["metrics"], b: self.scenarios[b]["metrics"]},
+        }
+
+    def nbytes(self):
+        """Approximate size of the stored deltas (pickled)."""
+        return len(pickle.dumps(self._deltas, protocol=5))
+
+    def save(self, path):
+        """Writes the store as one zlib-compressed pickle (protocol 5) file, atomically."""
+        payload = {
+            "version": SCENARIO_STORE_VERSION,
+            "fingerprint": self.fingerprint,
+            "scenarios": self.scenarios,
+            "deltas": self._deltas,
+            "counter": self._counter,
+            "current": self.current,
+        }
+        blob = zlib.compress(pickle.dumps(payload, protocol=5), 6)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+        return len(blob)
+
+    @classmethod
+    def load(cls, path, net):
+        """
+        Reads a store written by save() for `net`, which must be in its base state (e.g. a
+        freshly loaded case), and checks out the scenario that was current when it was saved.
+        """
+        with open(path, "rb") as f:
+            payload = pickle.loads(zlib.decompress(f.read()))
+        if payload.get("version") != SCENARIO_STORE_VERSION:
+            raise ValueError(f"Unsupported scenario store version: {payload.get('version')}")
+        store = cls(net)
+        if payload["fingerprint"] != store.fingerprint:
+            raise ValueError("The saved scenarios belong to a different network.")
+        store.scenarios = payload["scenarios"]
+        store._deltas = payload["deltas"]
+        store._counter = payload["counter"]
+        store.checkout(payload["current"])
+        return store
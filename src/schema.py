@@ -1,12 +1,32 @@
 from pydantic import BaseModel, Field
-from typing import List, Literal, Dict, Any, Union
+from typing import List, Literal, Dict, Any, Union, Optional
+
+class ElementSelector(BaseModel):
+    buses: Optional[List[int]] = Field(
+        default=None,
+        description="Select the elements connected to any of these bus IDs."
+    )
+    cluster: Optional[int] = Field(
+        default=None,
+        description="Select the elements in this region/cluster."
+    )
+    zone: Optional[str] = Field(
+        default=None,
+        description="Select the elements in this zone (bus 'zone' column)."
+    )
 
 class NetworkAction(BaseModel):
     component: Literal['bus', 'line', 'load', 'gen', 'sgen'] = Field(
         description="The type of grid component to modify."
     )
-    id: int = Field(
-        description="The integer ID/index of the component."
+    id: Optional[int] = Field(
+        default=None,
+        description="The integer ID/index of the component. Leave empty when using a selector."
+    )
+    selector: Optional[ElementSelector] = Field(
+        default=None,
+        description="Instead of an id, modify every matching element (e.g. all loads in cluster 2). "
+                    "An empty selector matches all elements of the component."
     )
     type: Literal['modify', 'create'] = Field(
         description="The type of action to perform. Use 'modify' for existing components."
@@ -19,3 +39,8 @@ class ScenarioResponse(BaseModel):
     actions: List[NetworkAction] = Field(
         description="List of actions to apply to the network to fulfill the user request."
     )
+
+class ScenarioCandidates(BaseModel):
+    candidates: List[ScenarioResponse] = Field(
+        description="Alternative action sets that could each fulfill the user request, most likely interpretation first."
+    )
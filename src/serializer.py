@@ -12,7 +12,7 @@ def region_to_text(region_data):
     # Buses
     output.append("## Buses within Region")
     buses = region_data['buses']
-    cols = ['vn_kv', 'type', 'zone', 'in_service', 'min_vm_pu', 'max_vm_pu'] # 'name' is index usually
+    cols = ['vn_kv', 'type', 'zone', 'in_service', 'min_vm_pu', 'max_vm_pu', 'vm_pu'] # 'name' is index usually
     if 'name' in buses.columns:
         cols.insert(0, 'name')
     
@@ -50,3 +50,98 @@ def region_to_text(region_data):
     output.append(f"- Net Balance: {total_gen_mw - total_load_mw:.2f} MW (Positive = Exporting, Negative = Importing)")
     
     return "\n".join(output)
+
+# Rough prompt-size estimate: ~4 characters per token for tabular English/numeric text
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def _csv(df, cols):
+    cols = [c for c in cols if c in df.columns]
+    return df[cols].to_csv(float_format='%.4g').strip()
+
+def _bus_voltage_deviation(buses):
+    """Distance (p.u.) outside [min_vm_pu, max_vm_pu]; 0 inside limits or without results."""
+    if 'vm_pu' not in buses.columns:
+        return pd.Series(0.0, index=buses.index)
+    vmin = buses['min_vm_pu'].fillna(0.95) if 'min_vm_pu' in buses.columns else 0.95
+    vmax = buses['max_vm_pu'].fillna(1.05) if 'max_vm_pu' in buses.columns else 1.05
+    vm = buses['vm_pu']
+    return ((vmin - vm).clip(lower=0) + (vm - vmax).clip(lower=0)).fillna(0.0)
+
+def region_to_compact_text(region_data, token_budget=1500, top_k=10):
+    """
+    Token-budgeted alternative to region_to_text for large regions.
+    Emits per-voltage-level aggregates plus compact CSV rows for only the top_k
+    violating / most loaded elements, summarizing the rest. top_k is reduced until
+    the output fits token_budget (estimated at ~4 characters per token).
+    """
+    k = top_k
+    while True:
+        text = _compact_text(region_data, k)
+        if estimate_tokens(text) <= token_budget or k <= 1:
+            break
+        k = max(1, k // 2)
+    if estimate_tokens(text) > token_budget:
+        text = text[:token_budget * CHARS_PER_TOKEN] + "\n[truncated to fit token budget]"
+    return text
+
+def _compact_text(region_data, top_k):
+    cluster_id = region_data['cluster_id']
+    buses = region_data['buses']
+    lines = region_data['lines']
+    output = [f"# Analysis Region {cluster_id} (compact)"]
+
+    # Buses aggregated per voltage level
+    output.append("## Buses by voltage level")
+    agg = {'buses': ('vn_kv', 'size'), 'in_service': ('in_service', 'sum')}
+    if 'vm_pu' in buses.columns:
+        agg.update({'vm_min': ('vm_pu', 'min'), 'vm_max': ('vm_pu', 'max')})
+    by_level = buses.groupby('vn_kv').agg(**agg)
+    output.append(by_level.to_csv(float_format='%.4g').strip())
+
+    deviation = _bus_voltage_deviation(buses)
+    violating = buses[deviation > 0]
+    output.append(f"Total Buses: {len(buses)}, voltage violations: {len(violating)}")
+    if not violating.empty:
+        worst = violating.loc[deviation[deviation > 0].sort_values(ascending=False).index[:top_k]]
+        output.append(f"### Worst {len(worst)} voltage violations (csv)")
+        output.append(_csv(worst, ['name', 'vn_kv', 'vm_pu', 'min_vm_pu', 'max_vm_pu']))
+
+    # Lines: summary plus the most heavily loaded ones
+    output.append("## Lines")
+    if lines.empty:
+        output.append("No lines connected.")
+    else:
+        tie_count = int(lines['is_tieline'].sum()) if 'is_tieline' in lines.columns else 0
+        n_out = int((~lines['in_service'].astype(bool)).sum())
+        summary = f"Total Lines: {len(lines)} (Tie-lines: {tie_count}, out of service: {n_out})"
+        if 'loading_percent' in lines.columns and lines['loading_percent'].notna().any():
+            loading = lines['loading_percent']
+            summary += f", loading mean {loading.mean():.1f}% / max {loading.max():.1f}%, >100%: {int((loading > 100).sum())}"
+            top = lines.loc[loading.sort_values(ascending=False).index[:top_k]]
+            label = f"### Top {len(top)} loaded lines (csv)"
+        else:
+            top = lines[~lines['in_service'].astype(bool)].head(top_k)
+            label = "### Out-of-service lines (csv)"
+        output.append(summary)
+        if not top.empty:
+            output.append(label)
+            output.append(_csv(top, ['from_bus', 'to_bus', 'loading_percent', 'max_i_ka', 'is_tieline', 'in_service']))
+        rest = len(lines) - len(top)
+        if rest > 0:
+            output.append(f"({rest} further lines omitted)")
+
+    # Aggregated Load/Gen
+    total_load_mw = region_data['loads']['p_mw'].sum() if not region_data['loads'].empty else 0
+    total_gen_mw = region_data['gens']['p_mw'].sum() if not region_data['gens'].empty else 0
+    if not region_data['sgens'].empty:
+        total_gen_mw += region_data['sgens']['p_mw'].sum()
+    output.append("## Power Balance")
+    output.append(
+        f"Load {total_load_mw:.2f} MW ({len(region_data['loads'])} loads), "
+        f"Generation {total_gen_mw:.2f} MW ({len(region_data['gens']) + len(region_data['sgens'])} units), "
+        f"Net {total_gen_mw - total_load_mw:.2f} MW (Positive = Exporting)"
+    )
+    return "\n".join(output)
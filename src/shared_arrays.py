@@ -0,0 +1,115 @@
+import io
+import mmap
+import os
+import pickle
+import uuid
+
+import numpy as np
+
+# Numeric arrays at least this large go to the shared data file; smaller ones stay in the pickle
+MIN_SHARED_BYTES = 4096
+# Offset alignment of arrays in the data file (cache line / SIMD friendly)
+_ALIGN = 64
+# Each data file starts with a random token (padded to _ALIGN) that its skeleton must match
+_TOKEN_BYTES = 16
+
+
+class _SharingPickler(pickle.Pickler):
+    """Pickler that writes large numeric arrays to a data file and pickles only their location."""
+
+    def __init__(self, file, data, data_name):
+        super().__init__(file, protocol=5)
+        self.data = data
+        self.data_name = data_name
+        self.token = uuid.uuid4().bytes
+        self.data.write(self.token.ljust(_ALIGN, b"\0"))
+        self.offset = _ALIGN
+        self._seen = {}  # id(array) -> persistent id, so shared arrays stay shared
+        self._arrays = []  # keeps written arrays alive, so their ids are not reused while dumping
+
+    def persistent_id(self, obj):
+        if type(obj) is not np.ndarray or obj.dtype.kind not in "biufc" or obj.nbytes < MIN_SHARED_BYTES:
+            return None
+        pid = self._seen.get(id(obj))
+        if pid is not None:
+            return pid
+        order = "F" if obj.flags.f_contiguous and not obj.flags.c_contiguous else "C"
+        padding = -self.offset % _ALIGN
+        self.data.write(b"\0" * padding)
+        self.offset += padding
+        raw = obj.tobytes(order=order)
+        self.data.write(raw)
+        pid = ("shared", self.data_name, self.token, self.offset, obj.dtype.str, obj.shape, order)
+        self.offset += len(raw)
+        self._seen[id(obj)] = pid
+        self._arrays.append(obj)
+        return pid
+
+
+class _AttachingUnpickler(pickle.Unpickler):
+    """Resolves the arrays of a _SharingPickler blob as copy-on-write views of the mapped data file."""
+
+    def __init__(self, file, directory):
+        super().__init__(file)
+        self.directory = directory
+        self._buffers = {}
+
+    def persistent_load(self, pid):
+        kind, data_name, token, offset, dtype, shape, order = pid
+        if kind != "shared":
+            raise pickle.UnpicklingError(f"Unknown persistent id: {kind}")
+        buffer = self._buffers.get(data_name)
+        if buffer is None:
+            # mode "c": pages are shared with every process mapping the file until written;
+            # a write copies just that page into private memory and never reaches the file
+            buffer = np.memmap(os.path.join(self.directory, data_name), dtype=np.uint8, mode="c")
+            if bytes(buffer[:_TOKEN_BYTES]) != token:
+                raise StaleSkeletonError(f"{data_name} was republished since this skeleton was written.")
+            self._buffers[data_name] = buffer
+        dtype = np.dtype(dtype)
+        n_bytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        flat = buffer[offset:offset + n_bytes].view(dtype).view(np.ndarray)
+        return flat.reshape(shape, order=order)
+
+
+class StaleSkeletonError(pickle.UnpicklingError):
+    """The data file a skeleton refers to has been replaced by a later publish()."""
+
+
+def publish(obj, directory, name):
+    """
+    Pickles obj for sharing between processes: large numeric arrays (DataFrame blocks,
+    indexes, sparse matrix parts, ...) are written once to a data file in `directory`,
+    and the returned pickle (the "skeleton") only references them. attach() maps them
+    back zero-copy. The data file is `{name}.bin`, so publishing under the same name
+    again replaces it instead of leaving the old file behind. The replace is atomic and
+    processes that already mapped the old file keep reading it; attaching an older
+    skeleton after the replace raises StaleSkeletonError instead of reading the new data.
+
+    Returns the skeleton bytes.
+    """
+    data_name = f"{name}.bin"
+    path = os.path.join(directory, data_name)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    skeleton = io.BytesIO()
+    with open(tmp, "wb") as data:
+        _SharingPickler(skeleton, data, data_name).dump(obj)
+    os.replace(tmp, path)
+    return skeleton.getvalue()
+
+
+def attach(skeleton, directory):
+    """
+    Rebuilds an object from publish() output; its arrays are copy-on-write memory maps.
+    Raises StaleSkeletonError (or FileNotFoundError) if the data file no longer matches.
+    """
+    return _AttachingUnpickler(io.BytesIO(skeleton), directory).load()
+
+
+def is_shared(array):
+    """True if the array is (a view of) a mapped data file from attach(), i.e. not private memory."""
+    while array is not None:
+        if isinstance(array, mmap.mmap):
+            return True
+        array = getattr(array, "base", None)
+    return False
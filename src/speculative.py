@@ -0,0 +1,101 @@
+import os
+import pickle
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+from src.agents.scenario_builder import ScenarioBuilder
+from src.contingency import _ac_metrics
+from src.powerflow import PowerFlowSession, classify_actions
+from src.transaction import NetworkTransaction
+from src.telemetry import span
+
+
+def evaluate_candidate(net, actions, session=None):
+    """
+    Applies one candidate action set inside a transaction, runs the power flow and
+    rolls everything back. Returns a dict: ok (applied and converged), message,
+    report (applied action descriptions) and, when converged, the limit metrics
+    (max_loading_percent, min_vm_pu, max_vm_pu, n_violations, severity).
+    """
+    session = session if session is not None else PowerFlowSession(net)
+    builder = ScenarioBuilder(net, session=session)
+    transaction = NetworkTransaction(net)
+    level = classify_actions(actions)
+    try:
+        session.invalidate(level)
+        report = builder.apply_actions(actions, transaction=transaction)
+        with warnings.catch_warnings():
+            # Islanding candidates make NR emit singular-matrix warnings before failing
+            warnings.simplefilter("ignore")
+            success, message = builder.validate_network()
+        result = {"ok": success, "message": message, "report": report}
+        if success:
+            result.update(_ac_metrics(net))
+        return result
+    except Exception as e:
+        return {"ok": False, "message": f"Application error: {e}", "report": []}
+    finally:
+        transaction.rollback()
+        session.invalidate(level)
+
+
+def baseline_metrics(net):
+    """Limit metrics of the network's current power flow results (None if it has not converged)."""
+    if not net.get('converged', False) or net.res_bus.empty:
+        return None
+    return _ac_metrics(net)
+
+
+def select_candidate(results, baseline=None):
+    """
+    Picks the candidate to use: the first (most likely) one that converges without
+    adding limit violations (compared with `baseline`, see baseline_metrics; without one
+    any violation counts), otherwise the converged one with the lowest severity.
+    Returns its position, or None if no candidate converged.
+    """
+    converged = [i for i, r in enumerate(results) if r["ok"]]
+    if not converged:
+        return None
+    allowed = baseline["n_violations"] if baseline is not None else 0
+    clean = [i for i in converged if results[i].get("n_violations", 0) <= allowed]
+    if clean:
+        return clean[0]
+    return min(converged, key=lambda i: results[i].get("severity", float("inf")))
+
+
+# --- Worker processes ---
+
+_WORKER_NET = None
+_WORKER_SESSION = None
+
+
+def _init_worker(net_blob):
+    global _WORKER_NET, _WORKER_SESSION
+    _WORKER_NET = pickle.loads(net_blob)
+    _WORKER_SESSION = PowerFlowSession(_WORKER_NET)
+
+
+def _evaluate_in_worker(actions):
+    return evaluate_candidate(_WORKER_NET, actions, session=_WORKER_SESSION)
+
+
+def evaluate_candidates(net, candidates, n_workers=None, session=None):
+    """
+    Validates several candidate action sets against the current network, each on
+    its own copy in a worker process, and returns one result dict per candidate
+    (see evaluate_candidate), in the order given.
+
+    Args:
+        n_workers (int): Process pool size (default: CPU count, at most one per candidate).
+            0 or 1 evaluates the candidates one after another on `net` itself, inside
+            transactions, which avoids copying the network at all.
+        session (PowerFlowSession): Session of `net` to warm-start from in the in-process case.
+    """
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    with span("scenario.evaluate_candidates", candidates=len(candidates), workers=min(n_workers, len(candidates))):
+        if n_workers <= 1 or len(candidates) <= 1:
+            return [evaluate_candidate(net, actions, session=session) for actions in candidates]
+        blob = pickle.dumps(net)
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(candidates)),
+                                 initializer=_init_worker, initargs=(blob,)) as pool:
+            return list(pool.map(_evaluate_in_worker, candidates))
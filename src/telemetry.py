@@ -0,0 +1,259 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+# Latency buckets in seconds (LLM calls dominate the upper range)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, [('le', repr(float(bound)))])} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process metrics registry rendering the Prometheus text format
+    (no client library needed). Gauges that mirror existing stats (cache hit
+    rates, pool sizes) are added as collectors evaluated at scrape time.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text):
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help_text))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help_text, buckets))
+
+    def register_collector(self, fn):
+        """fn() -> iterable of (name, help, {labels}, value), rendered as gauges."""
+        with self._lock:
+            self._collectors.append(fn)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for fn in list(self._collectors):
+            try:
+                samples = list(fn())
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            seen = set()
+            for name, help_text, labels, value in samples:
+                if name not in seen:
+                    lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge"])
+                    seen.add(name)
+                lines.append(f"{name}{_format_labels(_label_key(labels))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+SPAN_SECONDS = metrics.histogram("gemmapower_span_seconds", "Duration of instrumented pipeline steps.")
+LLM_REQUESTS = metrics.counter("gemmapower_llm_requests_total", "LLM requests by model and outcome (ok, error, cache_hit).")
+LLM_TOKENS = metrics.counter("gemmapower_llm_tokens_total", "LLM tokens by model and direction (prompt, completion).")
+LLM_CHARS = metrics.counter("gemmapower_llm_chars_total", "LLM characters by model and direction (prompt, completion).")
+LLM_RETRIES = metrics.counter("gemmapower_llm_retries_total", "LLM requests retried after a retryable error, by model and error code.")
+LLM_QUEUE_SECONDS = metrics.histogram("gemmapower_llm_queue_seconds", "Time LLM requests wait for a rate-limit token and a free slot, by priority.")
+SCENARIO_ATTEMPTS = metrics.histogram("gemmapower_scenario_attempts", "Parse/apply/validate attempts per scenario modification.",
+                                      buckets=(1, 2, 3, 4, 5))
+SCENARIO_RETRIES = metrics.counter("gemmapower_scenario_retries_total", "Failed scenario attempts that triggered a retry.")
+ROUTED_QUERIES = metrics.counter("gemmapower_routed_queries_total", "User queries by dispatch mode (targeted, broadcast).")
+AGENTS_PER_QUERY = metrics.histogram("gemmapower_agents_per_query", "Region agents consulted per user query.",
+                                     buckets=(1, 2, 3, 4, 6, 8, 12, 16))
+VALIDATION_FAILURES = metrics.counter("gemmapower_validation_failures_total",
+                                      "Scenario validations rejected, by stage (topology, dc, ac) and reason code.")
+HTTP_SECONDS = metrics.histogram("gemmapower_http_request_seconds", "API request latency by path, method and status.")
+
+
+# --- Tracing ---
+
+_current_trace = contextvars.ContextVar("gemmapower_trace", default=None)
+_current_span = contextvars.ContextVar("gemmapower_span", default=None)
+
+
+class Trace:
+    """
+    Collects the spans of one request. Spans recorded in worker threads land in
+    the same trace as long as the thread runs in a copy of the request's context
+    (see src.concurrency.iter_concurrently).
+    """
+
+    def __init__(self, name="request"):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def _add(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def _new_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def to_dict(self):
+        """Spans in start order plus total time per span name (nested spans overlap their parents)."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        totals = {}
+        for s in spans:
+            entry = totals.setdefault(s["name"], {"count": 0, "total_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] = round(entry["total_ms"] + s["duration_ms"], 3)
+        return {
+            "name": self.name,
+            "duration_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            "totals": totals,
+            "spans": spans,
+        }
+
+
+@contextmanager
+def start_trace(name="request"):
+    """Makes every span inside the block (and in threads started from it) record into a new Trace."""
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+class _Span:
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """Adds attributes once they are known (e.g. response size)."""
+        self.attrs.update(attrs)
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Times a block: always observed in the gemmapower_span_seconds histogram, and
+    recorded with its attributes and parent in the active Trace, if any.
+    """
+    handle = _Span(name, attrs)
+    trace = _current_trace.get()
+    span_id = trace._new_id() if trace is not None else None
+    parent = _current_span.get()
+    token = _current_span.set(span_id)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield handle
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        _current_span.reset(token)
+        SPAN_SECONDS.observe(duration, span=name)
+        if trace is not None:
+            record = {
+                "id": span_id,
+                "parent": parent,
+                "name": name,
+                "start_ms": round((start - trace.start) * 1000, 3),
+                "duration_ms": round(duration * 1000, 3),
+                "thread": threading.current_thread().name,
+            }
+            if handle.attrs:
+                record["attrs"] = dict(handle.attrs)
+            if error:
+                record["error"] = error
+            trace._add(record)
+
+
+def traced(name):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
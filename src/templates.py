@@ -0,0 +1,196 @@
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import pandapower as pp
+
+from src.network_manager import load_network, cluster_spatially, cluster_by_topology, get_regions_data, build_bus_cluster_index, network_version
+from src.agents.region_agent import RegionAgent
+from src.telemetry import span
+from src.shared_arrays import publish, attach, StaleSkeletonError
+
+# Bump when the layout of a template changes so stale files on disk are ignored
+TEMPLATE_VERSION = 2
+
+
+def template_key(network_name, n_clusters, partitioner, context_mode="auto", token_budget=1500):
+    """
+    Identifies a template. The context settings are part of it because serialized contexts
+    are stored, and the network version so an edited grid file is not served from the cache.
+    """
+    return (network_name, int(n_clusters), partitioner, context_mode, int(token_budget), network_version(network_name))
+
+
+def build_template(network_name, n_clusters, partitioner, context_mode="auto", token_budget=1500):
+    """
+    Builds everything an Orchestrator needs at startup, once: the clustered network
+    with its base-case power flow solved, every region's data slice and serialized context.
+
+    Returns a dict with keys: net, converged, regions ({cid: region_data}), contexts ({cid: text}).
+    """
+    net = load_network(network_name)
+    if partitioner == "topology":
+        net = cluster_by_topology(net, n_clusters=n_clusters)
+    elif partitioner == "spatial":
+        net = cluster_spatially(net, n_clusters=n_clusters)
+    else:
+        raise ValueError(f"Unknown partitioner: {partitioner}")
+
+    try:
+        pp.runpp(net)
+        converged = True
+    except pp.LoadflowNotConverged:
+        print(f"Template {network_name}: base case power flow did not converge.")
+        converged = False
+
+    bus_cluster = build_bus_cluster_index(net)
+    regions = get_regions_data(net, list(range(n_clusters)), bus_cluster=bus_cluster)
+    contexts = {}
+    for cid in range(n_clusters):
+        contexts[cid] = RegionAgent(regions[cid], context_mode=context_mode, token_budget=token_budget).context_text
+
+    return {"net": net, "converged": converged, "regions": regions, "contexts": contexts}
+
+
+class TemplateCache:
+    """
+    Two-tier cache of prebuilt Orchestrator templates (see build_template).
+
+    Templates are kept as pickle blobs (protocol 5) in an in-memory LRU and, if
+    `cache_dir` is set, as files on disk so they survive restarts and are shared
+    between worker processes. checkout() unpickles a private copy every time, so
+    sessions cloned from the same template never share mutable state.
+
+    In shared mode the numeric arrays of a template (element parameters, cluster
+    labels, base-case results, the solver's admittance matrices, ...) are published
+    once into a data file in `cache_dir` and the blob only references them (see
+    shared_arrays). checkout() then maps them copy-on-write: every session in every
+    worker process reads the same physical pages, and only pages a session writes to
+    become private. Put `cache_dir` on a tmpfs such as /dev/shm to keep it in memory.
+
+    Args:
+        cache_dir (str): Directory for template files (None = memory only).
+        max_entries (int): Templates kept in memory.
+        shared (bool): Share template arrays between sessions and processes (needs cache_dir).
+    """
+
+    def __init__(self, cache_dir=None, max_entries=8, shared=False):
+        if shared and not cache_dir:
+            raise ValueError("Shared templates need a cache_dir.")
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.shared = shared
+        self._blobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.builds = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        name = re.sub(r"[^A-Za-z0-9_.-]+", "_", "-".join(str(part) for part in key))
+        kind = "shared" if self.shared else "pkl"
+        return os.path.join(self.cache_dir, f"{name}.v{TEMPLATE_VERSION}.{kind}")
+
+    def _remember(self, key, blob):
+        with self._lock:
+            self._blobs[key] = blob
+            self._blobs.move_to_end(key)
+            while len(self._blobs) > self.max_entries:
+                self._blobs.popitem(last=False)
+
+    def _forget(self, key):
+        with self._lock:
+            self._blobs.pop(key, None)
+
+    def _lookup(self, key):
+        with self._lock:
+            blob = self._blobs.get(key)
+            if blob is not None:
+                self._blobs.move_to_end(key)
+                self.hits += 1
+                return blob
+        if self.cache_dir and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), "rb") as f:
+                    blob = f.read()
+                self.disk_hits += 1
+                self._remember(key, blob)
+                return blob
+            except OSError as e:
+                print(f"Could not read template {key}: {e}")
+        return None
+
+    def _store(self, key, blob):
+        self._remember(key, blob)
+        if self.cache_dir:
+            path = self._path(key)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp, "wb") as f:
+                    f.write(blob)
+                os.replace(tmp, path)  # atomic, so concurrent readers never see half a file
+            except OSError as e:
+                print(f"Could not write template {key}: {e}")
+
+    def _blob(self, network_name, n_clusters, partitioner, context_mode, token_budget):
+        key = template_key(network_name, n_clusters, partitioner, context_mode, token_budget)
+        blob = self._lookup(key)
+        if blob is None:
+            with self._lock:
+                build_lock = self._build_locks.setdefault(key, threading.Lock())
+            # Concurrent first loads of the same case build it only once
+            with build_lock:
+                blob = self._lookup(key)
+                if blob is None:
+                    start = time.perf_counter()
+                    state = build_template(network_name, n_clusters, partitioner, context_mode, token_budget)
+                    if self.shared:
+                        blob = publish(state, self.cache_dir, os.path.basename(self._path(key)))
+                    else:
+                        blob = pickle.dumps(state, protocol=5)
+                    self.builds += 1
+                    self._store(key, blob)
+                    print(f"Built template {key} in {time.perf_counter() - start:.2f}s ({len(blob) / 1e6:.1f} MB).")
+        return blob
+
+    def checkout(self, network_name, n_clusters, partitioner, context_mode="auto", token_budget=1500):
+        """
+        Returns a private copy of the template, building and storing it first if needed.
+        """
+        blob = self._blob(network_name, n_clusters, partitioner, context_mode, token_budget)
+        # Cloning the template replaces building (or deep-copying) a network per session
+        with span("template.clone", bytes=len(blob), shared=self.shared):
+            if not self.shared:
+                return pickle.loads(blob)
+            try:
+                return attach(blob, self.cache_dir)
+            except (StaleSkeletonError, FileNotFoundError):
+                # Another worker republished the template: take its skeleton from disk (or rebuild)
+                key = template_key(network_name, n_clusters, partitioner, context_mode, token_budget)
+                self._forget(key)
+                blob = self._blob(network_name, n_clusters, partitioner, context_mode, token_budget)
+                return attach(blob, self.cache_dir)
+
+    def warm(self, network_name, n_clusters, partitioner, context_mode="auto", token_budget=1500):
+        """Builds and stores a template ahead of the first checkout (e.g. before worker processes start)."""
+        self._blob(network_name, n_clusters, partitioner, context_mode, token_budget)
+
+    def clear(self):
+        with self._lock:
+            self._blobs.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "builds": self.builds,
+                "memory_entries": len(self._blobs),
+                "memory_mb": round(sum(len(b) for b in self._blobs.values()) / 1e6, 2),
+            }
@@ -0,0 +1,414 @@
+import os
+import json
+import math
+import pickle
+import shutil
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pandapower as pp
+
+from src.powerflow import PowerFlowSession, classify_actions, LEVEL_NAMES
+from src.contingency import DEFAULT_MIN_VM_PU, DEFAULT_MAX_VM_PU, DEFAULT_MAX_LOADING
+
+# Result columns written per step: (file name, result table, column, element table)
+RESULT_COLUMNS = (
+    ("bus.vm_pu", "res_bus", "vm_pu", "bus"),
+    ("bus.va_degree", "res_bus", "va_degree", "bus"),
+    ("line.loading_percent", "res_line", "loading_percent", "line"),
+    ("line.p_from_mw", "res_line", "p_from_mw", "line"),
+    ("trafo.loading_percent", "res_trafo", "loading_percent", "trafo"),
+)
+
+# Steps read per block when aggregating, so a year of results is never loaded at once
+_BLOCK_STEPS = 512
+
+
+# --- Profiles ---
+
+def _profile_key(key):
+    if isinstance(key, str):
+        table, column = key.split('.', 1)
+        return table, column
+    return tuple(key)
+
+
+def load_profiles(source, net=None):
+    """
+    Normalizes time-series input into {(table, column): (elements, values)}.
+
+    `source` is either
+      - a dict keyed by (table, column) or "table.column", with values given as a
+        2-D array (steps x elements, in the order of net[table].index), a DataFrame
+        whose columns are element ids, a 1-D array (the same value for every element,
+        e.g. for 'scaling'), or a CSV/Parquet path holding one such frame; or
+      - a CSV/Parquet path of one wide table with "table.column.element" columns
+        ("table.column" columns apply to every element).
+
+    `elements` is None for broadcast (1-D) profiles; values are float arrays with
+    one row per time step. All profiles must have the same number of steps.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        source = _wide_to_profiles(_read_table(source))
+
+    profiles = {}
+    for key, value in source.items():
+        table, column = _profile_key(key)
+        if isinstance(value, (str, os.PathLike)):
+            value = _read_table(value)
+        if isinstance(value, pd.DataFrame):
+            elements = np.array([int(c) for c in value.columns])
+            values = value.to_numpy(dtype=float)
+        else:
+            values = np.asarray(value, dtype=float)
+            if values.ndim == 1:
+                elements = None
+            elif net is not None:
+                elements = net[table].index.to_numpy()
+                if values.shape[1] != len(elements):
+                    raise ValueError(f"Profile {table}.{column} has {values.shape[1]} columns, "
+                                     f"the network has {len(elements)} {table} elements.")
+            else:
+                raise ValueError(f"Profile {table}.{column}: a 2-D array needs the network to map its columns.")
+        if net is not None:
+            if table not in net or column not in net[table].columns:
+                raise ValueError(f"Unknown profile target {table}.{column}.")
+            if elements is not None:
+                missing = np.setdiff1d(elements, net[table].index.to_numpy())
+                if len(missing):
+                    raise ValueError(f"Profile {table}.{column} refers to unknown elements {missing[:10].tolist()}.")
+        profiles[(table, column)] = (elements, values)
+
+    lengths = {len(values) for _, values in profiles.values()}
+    if len(lengths) > 1:
+        raise ValueError(f"Profiles have different numbers of steps: {sorted(lengths)}")
+    if not profiles:
+        raise ValueError("No profiles given.")
+    return profiles
+
+
+def _read_table(path):
+    path = str(path)
+    if path.endswith(('.parquet', '.pq')):
+        try:
+            return pd.read_parquet(path)
+        except ImportError as e:
+            raise ImportError("Reading Parquet profiles requires pyarrow or fastparquet.") from e
+    try:
+        return pd.read_csv(path, index_col=None)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+        # Only the file name: parser messages quote file contents
+        raise ValueError(f"Could not parse profile file {os.path.basename(path)}.") from e
+
+
+def _wide_to_profiles(frame):
+    """Splits a wide "table.column.element" frame into per-(table, column) frames / series."""
+    groups = {}
+    for name in frame.columns:
+        parts = str(name).split('.')
+        if len(parts) == 2:
+            groups[(parts[0], parts[1])] = frame[name].to_numpy(dtype=float)
+        elif len(parts) == 3:
+            groups.setdefault((parts[0], parts[1]), {})[int(parts[2])] = frame[name]
+        # Anything else (e.g. a timestamp column) is ignored
+    return {key: (pd.DataFrame(value) if isinstance(value, dict) else value) for key, value in groups.items()}
+
+
+def profile_change_level(profiles):
+    """Invalidation level between steps (see src.powerflow), from the profiled columns."""
+    return classify_actions([
+        {"component": table, "type": "modify", "parameters": {column: None}} for table, column in profiles
+    ])
+
+
+# --- Result store ---
+
+class TimeSeriesStore:
+    """
+    Columnar, memory-mapped results of a time-series run.
+
+    One .npy file per result column (steps x elements, float32) plus a 'converged'
+    vector and meta.json with the element indices. Files are opened with mmap, and
+    the aggregate queries read them in blocks of steps, so memory use stays bounded
+    regardless of the number of steps.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.n_steps = self.meta["n_steps"]
+        self.index = {table: pd.Index(ids) for table, ids in self.meta["index"].items()}
+        self._arrays = {}
+
+    @classmethod
+    def create(cls, path, net, n_steps):
+        """Allocates the result files for `n_steps` steps of `net` and returns the store."""
+        os.makedirs(path, exist_ok=True)
+        index = {}
+        for name, _, _, table in RESULT_COLUMNS:
+            if table in net and len(net[table]):
+                index[table] = [int(i) for i in net[table].index]
+                np.lib.format.open_memmap(os.path.join(path, f"{name}.npy"), mode="w+", dtype=np.float32,
+                                          shape=(n_steps, len(net[table]))).fill(np.nan)
+        np.lib.format.open_memmap(os.path.join(path, "converged.npy"), mode="w+", dtype=np.bool_, shape=(n_steps,))
+        meta = {"n_steps": n_steps, "index": index,
+                "columns": [name for name, _, _, table in RESULT_COLUMNS if table in index]}
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        return cls(path)
+
+    def array(self, name, mode="r"):
+        """Memory-mapped steps x elements array of one result column (e.g. 'bus.vm_pu')."""
+        if mode != "r":
+            return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode=mode)
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return self._arrays[name]
+
+    def has(self, name):
+        return name in self.meta["columns"]
+
+    def delete(self):
+        """Removes the store's directory. Arrays mapped before stay readable until released."""
+        self._arrays.clear()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _blocks(self, name, columns=None):
+        """Yields (start_step, block) over a result column, optionally restricted to element positions."""
+        data = self.array(name)
+        for start in range(0, self.n_steps, _BLOCK_STEPS):
+            block = np.asarray(data[start:start + _BLOCK_STEPS])
+            yield start, (block if columns is None else block[:, columns])
+
+    def converged(self):
+        return np.asarray(self.array("converged"))
+
+    def column_profile(self, name, reducer="max", columns=None):
+        """Per-step max/min/mean over elements (optionally a subset of positions) of a result column."""
+        fn = {"max": np.nanmax, "min": np.nanmin, "mean": np.nanmean}[reducer]
+        out = np.full(self.n_steps, np.nan)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)  # all-NaN rows of non-converged steps
+            for start, block in self._blocks(name, columns):
+                if block.shape[1]:
+                    out[start:start + len(block)] = fn(block, axis=1)
+        return out
+
+    def peak_loading(self, element="line", columns=None):
+        """(step, loading_percent, element id) of the highest branch loading over the whole run."""
+        name = f"{element}.loading_percent"
+        best = (None, -np.inf, None)
+        positions = np.arange(len(self.index[element])) if columns is None else np.asarray(columns)
+        for start, block in self._blocks(name, positions):
+            if not block.size or np.isnan(block).all():
+                continue
+            flat = np.nanargmax(block)
+            row, col = divmod(flat, block.shape[1])
+            if block[row, col] > best[1]:
+                best = (int(start + row), float(block[row, col]), int(self.index[element][positions[col]]))
+        return best
+
+    def violation_hours(self, name, lower=None, upper=None, columns=None):
+        """Number of steps in which any selected element of a result column is outside [lower, upper]."""
+        count = 0
+        for _, block in self._blocks(name, columns):
+            if not block.shape[1]:
+                continue
+            bad = np.zeros(len(block), dtype=bool)
+            if lower is not None:
+                bad |= (block < lower).any(axis=1)
+            if upper is not None:
+                bad |= (block > upper).any(axis=1)
+            count += int(bad.sum())
+        return count
+
+    def region_positions(self, bus_cluster, cluster_id):
+        """Element positions (bus, line, trafo) belonging to a cluster, as in get_region_data."""
+        in_region = set(bus_cluster.index[bus_cluster.values == cluster_id])
+        positions = {"bus": np.flatnonzero(self.index["bus"].isin(in_region))}
+        for table in ("line", "trafo"):
+            if table in self.index:
+                positions[table] = np.flatnonzero(self._terminal_cluster_mask(table, in_region))
+        return positions
+
+    def _terminal_cluster_mask(self, table, buses):
+        ends = self.meta.get("terminals", {}).get(table)
+        if ends is None:
+            return np.zeros(len(self.index[table]), dtype=bool)
+        return np.isin(np.asarray(ends[0]), list(buses)) | np.isin(np.asarray(ends[1]), list(buses))
+
+    def region_summary(self, bus_cluster, cluster_id, min_vm_pu=DEFAULT_MIN_VM_PU, max_vm_pu=DEFAULT_MAX_VM_PU,
+                       max_loading=DEFAULT_MAX_LOADING):
+        """Aggregates for one region: peak loading step, violation hours and voltage extremes."""
+        pos = self.region_positions(bus_cluster, cluster_id)
+        summary = {"cluster_id": int(cluster_id), "n_steps": self.n_steps}
+        if "line" in pos and len(pos["line"]):
+            step, loading, line = self.peak_loading("line", pos["line"])
+            summary.update(peak_loading_step=step, peak_loading_percent=loading, peak_loading_line=line,
+                           overload_hours=self.violation_hours("line.loading_percent", upper=max_loading,
+                                                               columns=pos["line"]))
+        if len(pos["bus"]):
+            vmin = self.column_profile("bus.vm_pu", "min", pos["bus"])
+            vmax = self.column_profile("bus.vm_pu", "max", pos["bus"])
+            summary.update(
+                voltage_violation_hours=self.violation_hours("bus.vm_pu", lower=min_vm_pu, upper=max_vm_pu,
+                                                             columns=pos["bus"]),
+                min_vm_pu=float(np.nanmin(vmin)) if not np.isnan(vmin).all() else None,
+                min_vm_step=int(np.nanargmin(vmin)) if not np.isnan(vmin).all() else None,
+                max_vm_pu=float(np.nanmax(vmax)) if not np.isnan(vmax).all() else None,
+            )
+        return summary
+
+    def summary(self, bus_cluster=None):
+        """Network-wide aggregates, plus per-region ones if a bus -> cluster index is given."""
+        conv = self.converged()
+        step, loading, line = self.peak_loading("line") if "line" in self.index else (None, None, None)
+        out = {
+            "n_steps": self.n_steps,
+            "n_converged": int(conv.sum()),
+            "peak_loading_step": step,
+            "peak_loading_percent": loading,
+            "peak_loading_line": line,
+            "voltage_violation_hours": self.violation_hours("bus.vm_pu", DEFAULT_MIN_VM_PU, DEFAULT_MAX_VM_PU),
+        }
+        if bus_cluster is not None:
+            out["regions"] = [self.region_summary(bus_cluster, cid) for cid in sorted(np.unique(bus_cluster.values))]
+        return out
+
+
+def summary_to_text(summary):
+    """Plain-text rendering of TimeSeriesStore.summary / region_summary for LLM prompts."""
+    def _fmt(value):
+        return f"{value:.3f}" if isinstance(value, float) else str(value)
+
+    regions = summary.get("regions")
+    lines = [f"{key}: {_fmt(value)}" for key, value in summary.items() if key != "regions"]
+    if regions:
+        lines.append("")
+        lines.append(pd.DataFrame(regions).round(3).to_markdown(index=False))
+    return "\n".join(lines)
+
+
+# --- Engine ---
+
+_WORKER_NET = None
+
+
+def _init_worker(net_blob):
+    global _WORKER_NET
+    _WORKER_NET = pickle.loads(net_blob)
+
+
+def _run_chunk(net, store_path, start, stop, chunk_profiles, level, pf_options):
+    """
+    Runs steps [start, stop) on `net`: writes each step's injections with one
+    positional assignment per profiled column and solves warm-started from the
+    previous step (recycled Ybus for injection-only profiles).
+    """
+    # Results are copied out after every step, nothing holds on to the old tables
+    session = PowerFlowSession(net, detach_results=False, **pf_options)
+    store = TimeSeriesStore(store_path)
+    outputs = {name: store.array(name, mode="r+") for name in store.meta["columns"]}
+    converged = store.array("converged", mode="r+")
+    targets = []
+    for (table, column), (elements, values) in chunk_profiles.items():
+        df = net[table]
+        rows = slice(None) if elements is None else df.index.get_indexer(elements)
+        if df[column].dtype == bool:
+            values = values.astype(bool)  # e.g. in_service profiles; keep the column boolean
+        targets.append((df, rows, df.columns.get_loc(column), values))
+
+    n_ok, iterations = 0, 0
+    for step in range(stop - start):
+        for df, rows, col, values in targets:
+            df.iloc[rows, col] = values[step]
+        session.invalidate(level)
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                report = session.solve()
+        except pp.LoadflowNotConverged:
+            converged[start + step] = False
+            continue
+        n_ok += 1
+        iterations += report["iterations"]
+        converged[start + step] = True
+        for name, res, column, table in RESULT_COLUMNS:
+            if name in outputs:
+                outputs[name][start + step] = net[res][column].to_numpy(dtype=np.float32)
+
+    for array in list(outputs.values()) + [converged]:
+        array.flush()
+    return start, stop, n_ok, iterations
+
+
+def _run_chunk_in_worker(args):
+    # Profiled columns are fully overwritten every step, so the worker's network can be
+    # reused across chunks; it only carries the warm start over
+    return _run_chunk(_WORKER_NET, *args)
+
+
+def run_timeseries(net, profiles, output_dir=None, n_workers=None, chunk_steps=None, **pf_options):
+    """
+    Runs one power flow per time step of the given profiles.
+
+    Steps are split into contiguous chunks spread over a process pool; within a chunk
+    each step is warm-started from the previous one and, for load/sgen profiles, reuses
+    the admittance matrix. Per-step bus and branch results are written straight into a
+    memory-mapped TimeSeriesStore. The input network is not modified.
+
+    Args:
+        profiles: Anything load_profiles accepts.
+        output_dir (str): Result directory (default: a new temporary directory).
+        n_workers (int): Process pool size (default: CPU count). 0 or 1 runs in-process.
+        chunk_steps (int): Steps per task (default: about four tasks per worker, at least 24).
+
+    Returns:
+        TimeSeriesStore
+    """
+    profiles = load_profiles(profiles, net)
+    n_steps = len(next(iter(profiles.values()))[1])
+    level = profile_change_level(profiles)
+    output_dir = output_dir or tempfile.mkdtemp(prefix="gemmapower_ts_")
+    store = TimeSeriesStore.create(output_dir, net, n_steps)
+    _store_terminals(store, net)
+
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    if chunk_steps is None:
+        chunk_steps = max(24, math.ceil(n_steps / max(1, 4 * max(1, n_workers))))
+    chunks = []
+    for start in range(0, n_steps, chunk_steps):
+        stop = min(n_steps, start + chunk_steps)
+        chunk_profiles = {key: (elements, values[start:stop]) for key, (elements, values) in profiles.items()}
+        chunks.append((output_dir, start, stop, chunk_profiles, level, pf_options))
+
+    t0 = time.perf_counter()
+    if n_workers <= 1 or len(chunks) <= 1:
+        work_net = pickle.loads(pickle.dumps(net))
+        results = [_run_chunk(work_net, *chunk) for chunk in chunks]
+    else:
+        blob = pickle.dumps(net)
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(chunks)),
+                                 initializer=_init_worker, initargs=(blob,)) as pool:
+            results = list(pool.map(_run_chunk_in_worker, chunks))
+
+    n_ok = sum(r[2] for r in results)
+    print(f"Time series: {n_steps} steps ({LEVEL_NAMES[level]} changes), {n_ok} converged, "
+          f"{len(chunks)} chunks, {time.perf_counter() - t0:.1f}s.")
+    return TimeSeriesStore(output_dir)
+
+
+def _store_terminals(store, net):
+    """Saves branch terminal buses in meta.json so regions can be resolved without the network."""
+    terminals = {}
+    for table, (f, t) in (("line", ("from_bus", "to_bus")), ("trafo", ("hv_bus", "lv_bus"))):
+        if table in store.index:
+            terminals[table] = [net[table][f].astype(int).tolist(), net[table][t].astype(int).tolist()]
+    store.meta["terminals"] = terminals
+    with open(os.path.join(store.path, "meta.json"), "w") as f:
+        json.dump(store.meta, f)
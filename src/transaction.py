@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+# Top-level net entries written by a power flow run (besides the res_* tables)
+_PF_STATE_KEYS = (
+    "converged", "OPF_converged", "_ppc", "_ppc0", "_ppc1", "_ppc2", "_options",
+    "_is_elements", "_is_elements_final", "_pd2ppc_lookups", "_isolated_buses", "_gen_order",
+)
+
+
+class NetworkTransaction:
+    """
+    Apply/rollback journal for in-place edits of a pandapower network.
+
+    Only the cells and rows that are actually touched are recorded, so the cost of
+    a transaction scales with the size of the change rather than the size of the grid.
+    Power flow results are snapshotted by reference: a cold pp.runpp replaces the
+    res_* tables, and PowerFlowSession detaches them before warm/recycled solves,
+    so keeping the old objects is enough.
+    """
+
+    def __init__(self, net):
+        self.net = net
+        self.active = True
+        self._cells = {}      # (table, idx, column) -> value before the first write
+        self._dtypes = {}     # (table, column) -> dtype before the first write
+        self._created = {}    # (table, idx) rows added during the transaction, in creation order
+        self._pf_state = {
+            key: (dict(value) if isinstance(value, dict) else value)
+            for key, value in net.items()
+            if (key.startswith("res_") or key in _PF_STATE_KEYS)
+        }
+
+    def _check_active(self):
+        if not self.active:
+            raise RuntimeError("Transaction already committed or rolled back.")
+
+    def set_value(self, table, idx, column, value):
+        """Writes net[table].at[idx, column] = value, remembering the prior value."""
+        self._check_active()
+        df = self.net[table]
+        key = (table, idx, column)
+        if key not in self._cells and (table, idx) not in self._created:
+            self._cells[key] = df.at[idx, column]
+            self._dtypes.setdefault((table, column), df[column].dtype)
+        df.at[idx, column] = value
+
+    def set_values(self, table, index, column, values):
+        """
+        Bulk version of set_value: net[table].loc[index, column] = values in one
+        indexed assignment, remembering the prior value of every cell.
+        """
+        self._check_active()
+        df = self.net[table]
+        index = list(index)
+        old = df.loc[index, column].to_numpy()
+        self._dtypes.setdefault((table, column), df[column].dtype)
+        for idx, value in zip(index, old):
+            if (table, idx) not in self._created:
+                self._cells.setdefault((table, idx, column), value)
+        df.loc[index, column] = values
+
+    def record_created(self, table, idx):
+        """Registers a row added to net[table] so rollback can drop it."""
+        self._check_active()
+        self._created[(table, idx)] = None
+
+    def changes(self):
+        """
+        Returns the touched cells as a list of (table, idx, column, old_value, new_value).
+        Created rows are reported with column=None.
+        """
+        out = []
+        for (table, idx, column), old in self._cells.items():
+            out.append((table, idx, column, old, self.net[table].at[idx, column]))
+        for table, idx in self._created:
+            out.append((table, idx, None, None, None))
+        return out
+
+    def touched_elements(self):
+        """Returns {table: set(idx)} of every element modified or created."""
+        touched = {}
+        for table, idx, _ in self._cells:
+            touched.setdefault(table, set()).add(idx)
+        for table, idx in self._created:
+            touched.setdefault(table, set()).add(idx)
+        return touched
+
+    def column_changes(self):
+        """
+        Returns the touched cells grouped by column: {(table, column): (index, old_values, old_dtype)},
+        with index as a pandas Index and old_values as an object array, in write order.
+        """
+        grouped = {}
+        for (table, idx, column), old in self._cells.items():
+            grouped.setdefault((table, column), ([], []))
+            grouped[(table, column)][0].append(idx)
+            grouped[(table, column)][1].append(old)
+        return {key: (pd.Index(ids), np.array(olds, dtype=object), self._dtypes.get(key))
+                for key, (ids, olds) in grouped.items()}
+
+    def created_rows(self):
+        """Returns {table: [idx]} of the rows added during the transaction, in creation order."""
+        created = {}
+        for table, idx in self._created:
+            created.setdefault(table, []).append(idx)
+        return created
+
+    def previous_results(self):
+        """The power flow results (res_* tables and solver state) as they were when the transaction began."""
+        return dict(self._pf_state)
+
+    def commit(self):
+        """Keeps the changes and discards the journal."""
+        self._check_active()
+        self.active = False
+
+    def rollback(self):
+        """Restores every recorded cell, drops created rows and restores power flow results."""
+        if not self.active:
+            return
+        for table, idx in reversed(list(self._created)):
+            df = self.net[table]
+            if idx in df.index:
+                df.drop(idx, inplace=True)
+
+        for (table, idx, column), old in self._cells.items():
+            self.net[table].at[idx, column] = old
+
+        # Writing e.g. a float into an int column upcasts the whole column; undo that too
+        for (table, column), dtype in self._dtypes.items():
+            col = self.net[table][column]
+            if col.dtype != dtype:
+                try:
+                    self.net[table][column] = col.astype(dtype)
+                except (TypeError, ValueError):
+                    pass
+
+        for key, value in self._pf_state.items():
+            self.net[key] = value
+
+        self.active = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Context-manager use rolls back unless commit() was called explicitly
+        self.rollback()
+        return False
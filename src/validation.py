@@ -0,0 +1,244 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from src.contingency import DCModel
+
+# Branch tables and their terminal columns in the bus-branch graph (trafo3w: hv to mv and lv)
+_BRANCH_TABLES = (
+    ('line', 'from_bus', 'to_bus'),
+    ('trafo', 'hv_bus', 'lv_bus'),
+    ('trafo3w', 'hv_bus', 'mv_bus'),
+    ('trafo3w', 'hv_bus', 'lv_bus'),
+)
+
+# Columns whose modification changes the graph
+GRAPH_COLUMNS = {'in_service', 'from_bus', 'to_bus', 'hv_bus', 'mv_bus', 'lv_bus', 'bus'}
+
+# Element tables that feed or draw power at a bus
+_INJECTION_TABLES = ('load', 'sgen', 'gen', 'storage')
+
+# Estimated DC loading above which a scenario is rejected before the AC solve
+DEFAULT_DC_FAIL_LOADING = 250.0
+# Estimated voltage angle difference across a branch (degrees) above which the AC power
+# flow is not expected to converge (the transfer limit of a lossless branch is at 90°)
+DEFAULT_DC_MAX_ANGLE = 60.0
+# Relative worsening that counts for a branch already past a threshold in the baseline (large
+# case files carry such branches, and small changes elsewhere move them by a percent or two)
+DC_BASELINE_MARGIN = 0.1
+
+
+def _passed(stage, message, **details):
+    return {"ok": True, "stage": stage, "code": "ok", "message": message, "details": details}
+
+
+def _failed(stage, code, message, **details):
+    return {"ok": False, "stage": stage, "code": code, "message": message, "details": details}
+
+
+def _active_power(df):
+    if df.empty:
+        return np.zeros(0)
+    scaling = df['scaling'].values if 'scaling' in df.columns else 1.0
+    return np.nan_to_num(df['p_mw'].values * scaling) * df['in_service'].values.astype(bool)
+
+
+class GridTopology:
+    """
+    Cached sparse bus-branch graph of a network for fast connectivity checks.
+
+    Bus positions and branch terminals are resolved once. Afterwards only the rows of
+    elements reported through watch() are re-read before each check, so checking a
+    scenario costs one vectorized graph build and a connected-components pass instead
+    of a power flow. Watched rows stay watched, so a check after a rollback still sees
+    the restored values. Adding or removing buses or branches triggers a full rebuild.
+    """
+
+    def __init__(self, net):
+        self.net = net
+        self.rebuild()
+
+    def rebuild(self):
+        net = self.net
+        self.bus_index = net.bus.index
+        self.bus_in_service = net.bus['in_service'].values.astype(bool).copy()
+        self._sizes = self._table_sizes()
+        self._edges = []  # (table, from positions, to positions, in_service mask)
+        for table, a, b in _BRANCH_TABLES:
+            if table not in net or net[table].empty:
+                continue
+            df = net[table]
+            self._edges.append((table, a, b,
+                                self.bus_index.get_indexer(df[a].values),
+                                self.bus_index.get_indexer(df[b].values),
+                                df['in_service'].values.astype(bool).copy()))
+        self._watched = {}  # table -> row positions to re-read before every check
+
+    def _table_sizes(self):
+        return {table: len(self.net[table]) for table in ('bus', 'line', 'trafo', 'trafo3w') if table in self.net}
+
+    def watch(self, table, ids):
+        """Marks elements whose in-service state or terminals may have changed."""
+        if table not in self._sizes:
+            return
+        positions = self.net[table].index.get_indexer(np.asarray(list(ids)))
+        positions = positions[positions >= 0]
+        if len(positions):
+            current = self._watched.get(table, np.array([], dtype=int))
+            self._watched[table] = np.union1d(current, positions)
+
+    def _refresh(self):
+        if self._table_sizes() != self._sizes or not self.net.bus.index.equals(self.bus_index):
+            self.rebuild()
+            return
+        for table, positions in self._watched.items():
+            df = self.net[table]
+            if table == 'bus':
+                self.bus_in_service[positions] = df['in_service'].values[positions].astype(bool)
+                continue
+            for edge_table, a, b, f, t, active in self._edges:
+                if edge_table == table:
+                    f[positions] = self.bus_index.get_indexer(df[a].values[positions])
+                    t[positions] = self.bus_index.get_indexer(df[b].values[positions])
+                    active[positions] = df['in_service'].values[positions].astype(bool)
+
+    def _slack_buses(self):
+        net = self.net
+        buses = []
+        eg = net.ext_grid[net.ext_grid['in_service'].values.astype(bool)]
+        buses.extend(eg['bus'].tolist())
+        if 'slack' in net.gen.columns:
+            gens = net.gen[net.gen['in_service'].values.astype(bool) & net.gen['slack'].fillna(False).values.astype(bool)]
+            buses.extend(gens['bus'].tolist())
+        positions = self.bus_index.get_indexer(buses)
+        return positions[(positions >= 0)][self.bus_in_service[positions[positions >= 0]]]
+
+    def check(self):
+        """
+        Checks that an in-service slack exists and that every in-service bus with load or
+        generation is connected to one. Returns a stage result dict (ok, stage, code, message, details).
+        """
+        self._refresh()
+        slack = self._slack_buses()
+        if len(slack) == 0:
+            return _failed("topology", "no_slack",
+                           "No in-service external grid or slack generator remains on an in-service bus, so the "
+                           "power flow has no reference. Keep the external grid (or a slack generator) and its bus in service.")
+
+        n = len(self.bus_index)
+        rows, cols = [], []
+        for _, _, _, f, t, active in self._edges:
+            keep = active & (f >= 0) & (t >= 0)
+            keep[keep] &= self.bus_in_service[f[keep]] & self.bus_in_service[t[keep]]
+            rows.append(f[keep])
+            cols.append(t[keep])
+        rows = np.concatenate(rows) if rows else np.array([], dtype=int)
+        cols = np.concatenate(cols) if cols else np.array([], dtype=int)
+        graph = coo_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n))
+        _, labels = connected_components(graph, directed=False)
+
+        energized = np.isin(labels, labels[slack])
+        isolated = self.bus_in_service & ~energized
+        if not isolated.any():
+            return _passed("topology", "All in-service buses are connected to a slack.")
+
+        isolated_buses = self.bus_index[isolated]
+        lost_load, stranded_gen = 0.0, 0.0
+        for table in _INJECTION_TABLES:
+            if table not in self.net or self.net[table].empty:
+                continue
+            df = self.net[table]
+            at_isolated = df['bus'].isin(isolated_buses).values
+            power = float(_active_power(df)[at_isolated].sum())
+            if table == 'load':
+                lost_load += power
+            else:
+                stranded_gen += power
+
+        shown = ", ".join(str(b) for b in isolated_buses[:20]) + (" ..." if len(isolated_buses) > 20 else "")
+        details = {"isolated_buses": [int(b) for b in isolated_buses[:100]], "n_isolated": int(isolated.sum()),
+                   "lost_load_mw": round(lost_load, 3), "stranded_gen_mw": round(stranded_gen, 3)}
+        if lost_load > 0 or stranded_gen > 0:
+            return _failed("topology", "islanding",
+                           f"The actions split the grid: {details['n_isolated']} in-service bus(es) [{shown}] have no "
+                           f"path to a slack, leaving {lost_load:.1f} MW of load unserved and {stranded_gen:.1f} MW of "
+                           f"generation stranded. Keep at least one branch to these buses in service.", **details)
+        # Empty islands are de-energized by pandapower without affecting the rest of the grid
+        return _passed("topology", f"{details['n_isolated']} bus(es) without load or generation are de-energized [{shown}].",
+                       **details)
+
+
+def _dc_estimates(net):
+    """DC power flow per in-service branch: labels, estimated loading (%), angle difference (degrees), limits."""
+    model = DCModel(net)
+    br = model.branches
+    labels = pd.Index(br['element_type'].astype(str) + " " + br['element'].astype(str))
+    loading = np.nan_to_num(model.loading_percent(model.flows))
+    angles = np.nan_to_num(np.degrees(np.abs(model.flows / model.base_mva / br['b'].values)))
+    return labels, loading, angles, br['max_loading_percent'].values
+
+
+def dc_baseline(net):
+    """
+    DC estimates of the network before a scenario is applied. Passed to dc_screen so
+    branches that already exceed the thresholds in the base case (common in large
+    case files) do not reject every scenario.
+    """
+    labels, loading, angles, _ = _dc_estimates(net)
+    return {"loading": pd.Series(loading, index=labels), "angle": pd.Series(angles, index=labels)}
+
+
+def _worsened(values, prior, threshold):
+    """Branches above threshold that were below it in the baseline, or were above it and got clearly worse."""
+    return (values > threshold) & ((prior <= threshold) | (values > prior * (1.0 + DC_BASELINE_MARGIN)))
+
+
+def dc_screen(net, baseline=None, fail_loading=DEFAULT_DC_FAIL_LOADING, max_angle=DEFAULT_DC_MAX_ANGLE, top_n=5):
+    """
+    Vectorized DC power flow (see contingency.DCModel) as a quick screen before the AC solve.
+    Fails when a branch is estimated above fail_loading percent or its angle difference
+    exceeds max_angle degrees, signs that the AC power flow would not converge or the
+    scenario is not physically sensible (case files often carry very loose ratings, so
+    the angle check is what catches most infeasible transfers).
+    Branches over their own limit (but under fail_loading) are reported as warnings.
+
+    Args:
+        baseline (dict): dc_baseline() of the unmodified network. Then only branches the
+            scenario pushes past a threshold count, or that were already past it and get
+            more than DC_BASELINE_MARGIN worse.
+    """
+    labels, loading, angles, limits = _dc_estimates(net)
+    if len(loading) == 0:
+        return _passed("dc", "No branches to screen.")
+    prior_loading, prior_angles = np.zeros(len(labels)), np.zeros(len(labels))
+    if baseline is not None:
+        prior_loading = baseline["loading"].reindex(labels).fillna(0.0).values
+        prior_angles = baseline["angle"].reindex(labels).fillna(0.0).values
+
+    steep = _worsened(angles, prior_angles, max_angle)
+    if steep.any():
+        i = int(np.argmax(np.where(steep, angles, -1.0)))
+        return _failed("dc", "dc_angle",
+                       f"DC screening estimates a {angles[i]:.0f}° voltage angle difference across {labels[i]} "
+                       f"(limit {max_angle:.0f}°): the grid cannot carry the requested transfer. Reduce the change "
+                       f"in load/generation or keep more branches in service.",
+                       branch=labels[i], angle_deg=round(float(angles[i]), 1))
+
+    order = np.argsort(-loading)[:top_n]
+    worst = [{"branch": labels[i], "est_loading_percent": round(float(loading[i]), 1)} for i in order]
+    over = int(((loading > limits) & (prior_loading <= limits)).sum())  # newly above their limit
+    extreme = _worsened(loading, prior_loading, fail_loading)
+    if extreme.any():
+        rows = np.flatnonzero(extreme)
+        rows = rows[np.argsort(-loading[rows])][:top_n]
+        listing = ", ".join(f"{labels[i]} ~{loading[i]:.0f}%" for i in rows)
+        return _failed("dc", "dc_overload",
+                       f"DC screening estimates extreme branch overloads ({listing}; rejection threshold "
+                       f"{fail_loading:.0f}%). Reduce the change in load/generation or keep parallel branches in service.",
+                       n_overloaded=over, worst=worst)
+    message = f"DC screening passed (max estimated loading {loading[order[0]]:.0f}%)."
+    if over:
+        listing = ", ".join(f"{w['branch']} ~{w['est_loading_percent']:.0f}%" for w in worst if w['est_loading_percent'] > 100.0)
+        message += f" The actions push {over} branch(es) above their limit (most loaded: {listing})."
+    return _passed("dc", message, n_overloaded=over, worst=worst)
@@ -0,0 +1,246 @@
+import numpy as np
+import pandas as pd
+
+from src.contingency import DEFAULT_MIN_VM_PU, DEFAULT_MAX_VM_PU, DEFAULT_MAX_LOADING, _limit
+
+SEVERITY_LEVELS = ("low", "medium", "high")
+# Excess over the limit at which a violation becomes medium / high (pu for voltages, percentage points for loading)
+SEVERITY_STEPS = {"voltage": (0.02, 0.05), "loading": (10.0, 30.0)}
+
+# Element type -> (result table, value column, limit kind, terminal bus columns)
+_SOURCES = {
+    'bus': ('res_bus', 'vm_pu', 'voltage', None),
+    'line': ('res_line', 'loading_percent', 'loading', ('from_bus', 'to_bus')),
+    'trafo': ('res_trafo', 'loading_percent', 'loading', ('hv_bus', 'lv_bus')),
+}
+
+_NO_VIOLATION = -1
+
+
+class _Table:
+    """Limits, owning clusters and the last evaluated values of one element table."""
+
+    def __init__(self, net, element_type, bus_cluster, cluster_slot):
+        res, column, kind, terminals = _SOURCES[element_type]
+        df = net[element_type]
+        self.element_type = element_type
+        self.res, self.column, self.kind = res, column, kind
+        self.index = df.index
+        self.lower, self.upper = self.limits(net)
+        buses = [df.index.values] if kind == "voltage" else [df[c].values for c in terminals]
+        # Cluster slot of each terminal; a branch between two regions belongs to both
+        self.slots = [cluster_slot(bus_cluster.reindex(b).values) for b in buses]
+        n = len(df)
+        self.values = np.full(n, np.nan)
+        self.excess = np.zeros(n)
+        self.level = np.full(n, _NO_VIOLATION)
+
+    def limits(self, net):
+        """(lower, upper) limit arrays from the element table, defaults filled in."""
+        df = net[self.element_type]
+        if self.kind == "voltage":
+            return _limit(df, 'min_vm_pu', DEFAULT_MIN_VM_PU), _limit(df, 'max_vm_pu', DEFAULT_MAX_VM_PU)
+        return np.full(len(df), -np.inf), _limit(df, 'max_loading_percent', DEFAULT_MAX_LOADING)
+
+    def limits_changed(self, net):
+        lower, upper = self.limits(net)
+        return not (np.array_equal(lower, self.lower) and np.array_equal(upper, self.upper))
+
+    def current_values(self, net):
+        res = net.get(self.res)
+        if res is None or res.empty or self.column not in res.columns:
+            return np.full(len(self.index), np.nan)
+        values = res[self.column]
+        if not values.index.equals(self.index):
+            values = values.reindex(self.index)
+        return values.values.astype(float)
+
+    def evaluate(self, rows, values):
+        """(excess over the nearest limit, severity level or -1) for the given rows and values."""
+        with np.errstate(invalid='ignore'):
+            excess = np.fmax(self.lower[rows] - values, values - self.upper[rows])
+        excess = np.where(np.isnan(excess), 0.0, np.maximum(excess, 0.0))
+        level = np.searchsorted(SEVERITY_STEPS[self.kind], excess, side='right')
+        return excess, np.where(excess > 0, level, _NO_VIOLATION)
+
+
+class ViolationIndex:
+    """
+    Index of the limit violations in the latest power flow results: bus voltages outside
+    min_vm_pu/max_vm_pu and line/trafo loadings above max_loading_percent (defaults as in
+    contingency analysis), with per-region and per-severity counts.
+
+    Limits and the bus -> cluster mapping are resolved once. refresh() compares the
+    result columns with the values seen last time and re-evaluates only the rows that
+    changed, adjusting the counts in place, so it is cheap to call after every solve.
+    Changed elements or limit columns (min/max_vm_pu, max_loading_percent) rebuild the index.
+    Queries read the cached arrays instead of scanning the result tables.
+    """
+
+    def __init__(self, net):
+        self.net = net
+        self.rebuild()
+
+    def rebuild(self):
+        net = self.net
+        if 'cluster' in net.bus.columns:
+            bus_cluster = net.bus['cluster'].fillna(-1).astype(int)
+        else:
+            bus_cluster = pd.Series(-1, index=net.bus.index)
+        # Regions get slots 0..n-1, buses without a region the extra slot n
+        self.cluster_ids = np.unique(bus_cluster.values[bus_cluster.values >= 0])
+        unassigned = len(self.cluster_ids)
+
+        def cluster_slot(clusters):
+            clusters = np.nan_to_num(clusters, nan=-1).astype(int)
+            slots = np.searchsorted(self.cluster_ids, clusters)
+            found = (slots < unassigned) & (self.cluster_ids[np.minimum(slots, unassigned - 1)] == clusters) \
+                if unassigned else np.zeros(len(clusters), dtype=bool)
+            return np.where(found, slots, unassigned)
+
+        self._tables = {t: _Table(net, t, bus_cluster, cluster_slot) for t in _SOURCES if t in net}
+        # counts[element_type][slot, level]
+        self._counts = {t: np.zeros((unassigned + 1, len(SEVERITY_LEVELS)), dtype=int) for t in self._tables}
+        self._shape = self._structure()
+        self.refresh()
+
+    def _structure(self):
+        return {t: len(self.net[t]) for t in _SOURCES if t in self.net}
+
+    def _count(self, table, rows, levels, sign):
+        violating = levels >= 0
+        rows, levels = rows[violating], levels[violating]
+        counts = self._counts[table.element_type]
+        for k, slots in enumerate(table.slots):
+            keep = np.ones(len(rows), dtype=bool)
+            for previous in table.slots[:k]:
+                keep &= previous[rows] != slots[rows]  # count a branch once per region
+            np.add.at(counts, (slots[rows[keep]], levels[keep]), sign)
+
+    def refresh(self):
+        """
+        Re-evaluates the rows whose results changed since the last call (everything after
+        elements were added or removed or limits were edited). Returns the set of cluster ids
+        whose violations changed.
+        """
+        if self._structure() != self._shape or any(
+                not self.net[t].index.equals(tab.index) or tab.limits_changed(self.net)
+                for t, tab in self._tables.items()):
+            self.rebuild()
+            return set(self.cluster_ids.tolist())
+
+        changed_slots = set()
+        for table in self._tables.values():
+            values = table.current_values(self.net)
+            changed = ~((values == table.values) | (np.isnan(values) & np.isnan(table.values)))
+            if not changed.any():
+                continue
+            rows = np.flatnonzero(changed)
+            excess, level = table.evaluate(rows, values[rows])
+            old_level = table.level[rows]
+            # Only rows that are or were violating change what a region reports
+            relevant = rows[((level != old_level) | (excess != table.excess[rows])) & ((level >= 0) | (old_level >= 0))]
+            self._count(table, rows, old_level, -1)
+            self._count(table, rows, level, 1)
+            table.values[rows] = values[rows]
+            table.excess[rows] = excess
+            table.level[rows] = level
+            for slots in table.slots:
+                changed_slots.update(slots[relevant].tolist())
+        return {int(self.cluster_ids[s]) for s in changed_slots if s < len(self.cluster_ids)}
+
+    def _slot(self, cluster_id):
+        slot = np.flatnonzero(self.cluster_ids == cluster_id)
+        return int(slot[0]) if len(slot) else None
+
+    def query(self, cluster_id=None, min_severity=None, element_type=None):
+        """
+        Returns the current violations as a DataFrame (element_type, element, kind, value,
+        limit, excess, severity), most severe first.
+
+        Args:
+            cluster_id (int): Only violations in this region (branches count for both ends).
+            min_severity (str): "low", "medium" or "high".
+            element_type (str or list): "bus", "line", "trafo".
+        """
+        min_level = SEVERITY_LEVELS.index(min_severity) if min_severity else 0
+        types = [element_type] if isinstance(element_type, str) else (element_type or list(self._tables))
+        slot = self._slot(cluster_id) if cluster_id is not None else None
+        frames = []
+        for t in types:
+            table = self._tables.get(t)
+            if table is None or (cluster_id is not None and slot is None):
+                continue
+            mask = table.level >= min_level
+            if slot is not None:
+                mask &= np.logical_or.reduce([slots == slot for slots in table.slots])
+            rows = np.flatnonzero(mask)
+            if not len(rows):
+                continue
+            values = table.values[rows]
+            under = values < table.lower[rows]
+            if table.kind == "voltage":
+                kind = np.where(under, "undervoltage", "overvoltage")
+            else:
+                kind = np.full(len(rows), "overload")
+            frames.append(pd.DataFrame({
+                'element_type': t,
+                'element': table.index.values[rows],
+                'kind': kind,
+                'value': values,
+                'limit': np.where(under, table.lower[rows], table.upper[rows]),
+                'excess': table.excess[rows],
+                'severity': np.array(SEVERITY_LEVELS)[table.level[rows]],
+                '_level': table.level[rows],
+                '_score': table.excess[rows] / SEVERITY_STEPS[table.kind][0],
+            }))
+        if not frames:
+            return pd.DataFrame(columns=['element_type', 'element', 'kind', 'value', 'limit', 'excess', 'severity'])
+        result = pd.concat(frames, ignore_index=True)
+        result = result.sort_values(['_level', '_score'], ascending=False, kind='stable')
+        return result.drop(columns=['_level', '_score']).reset_index(drop=True)
+
+    def counts(self, cluster_id=None):
+        """{element_type: {severity: count}} for the whole network or one region, from the maintained counts."""
+        slot = self._slot(cluster_id) if cluster_id is not None else None
+        result = {}
+        for t, counts in self._counts.items():
+            if cluster_id is None:
+                if t == 'bus':
+                    per_level = counts.sum(axis=0)
+                else:
+                    # Tie branches sit in two slots; the tables give the exact network-wide numbers
+                    per_level = np.bincount(self._tables[t].level[self._tables[t].level >= 0],
+                                            minlength=len(SEVERITY_LEVELS))
+            elif slot is None:
+                per_level = np.zeros(len(SEVERITY_LEVELS), dtype=int)
+            else:
+                per_level = counts[slot]
+            result[t] = dict(zip(SEVERITY_LEVELS, (int(n) for n in per_level)))
+        return result
+
+    def summary(self):
+        """Network-wide totals by severity, element type and region (JSON-serializable)."""
+        totals = self.counts()
+        by_region = {}
+        for slot, cid in enumerate(self.cluster_ids):
+            n = int(sum(self._counts[t][slot].sum() for t in self._counts))
+            if n:
+                by_region[int(cid)] = n
+        return {
+            "n_violations": int(sum(sum(levels.values()) for levels in totals.values())),
+            "by_severity": {s: int(sum(levels[s] for levels in totals.values())) for s in SEVERITY_LEVELS},
+            "by_type": {t: int(sum(levels.values())) for t, levels in totals.items()},
+            "by_region": by_region,
+        }
+
+
+def violations_to_text(violations, max_rows=25):
+    """Plain-text rendering of ViolationIndex.query() for LLM prompts (most severe rows first)."""
+    if violations.empty:
+        return "No limit violations."
+    shown = violations.head(max_rows).round({'value': 3, 'limit': 3, 'excess': 3})
+    text = shown.to_markdown(index=False)
+    if len(violations) > max_rows:
+        text += f"\n... and {len(violations) - max_rows} more (less severe)."
+    return text
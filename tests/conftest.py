@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Offline model client: no API key or network needed
+os.environ.setdefault("LLM_BACKEND", "fake")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,25 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api.main import app
+
+client = TestClient(app)
+
+
+@pytest.mark.parametrize("session_id", ["../../srv/x", "/tmp/x", "a" * 65, "bad id"])
+def test_invalid_session_ids_are_rejected(session_id):
+    response = client.post("/chat", json={"message": "hello"}, headers={"X-Session-ID": session_id})
+    assert response.status_code == 400
+    assert "Invalid session id" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("name", ["../../etc/passwd", "/etc/passwd", "missing.csv"])
+def test_profile_files_are_restricted_to_profile_dir(name, tmp_path, monkeypatch):
+    import src.api.main as main
+    (tmp_path / "profile.csv").write_text("load.scaling\n1.0\n")
+    monkeypatch.setattr(main, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(main.session_pool, "get", lambda session_id: object())
+
+    response = client.post("/timeseries", json={"profile_file": name})
+    assert response.status_code == 404
+    assert client.get("/profiles").json() == {"profiles": ["profile.csv"]}
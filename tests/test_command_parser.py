@@ -0,0 +1,18 @@
+import pytest
+
+from src.command_parser import parse_command
+
+
+def test_reduce_by_percentage():
+    assert parse_command("reduce load 3 by 20%") == [
+        {"component": "load", "id": 3, "selector": None, "type": "modify", "parameters": {"p_mw": "-20%"}}]
+
+
+@pytest.mark.parametrize("text", [
+    "reduce load 3 by 120%",
+    "decrease load 3 by 100%",
+    "reduce all loads in region 1 by 150%",
+    "scale all loads by -120%",
+])
+def test_reductions_that_flip_the_sign_are_not_parsed(text):
+    assert parse_command(text) is None
@@ -0,0 +1,19 @@
+import threading
+import time
+
+from src.concurrency import run_concurrently
+
+
+def test_queued_task_times_out_behind_a_hung_task():
+    release = threading.Event()
+    tasks = {"hung": lambda: release.wait(10), "queued": lambda: "ran"}
+    start = time.monotonic()
+    try:
+        results, errors = run_concurrently(tasks, max_workers=1, timeout=0.2)
+    finally:
+        release.set()
+
+    assert time.monotonic() - start < 2
+    assert results == {}
+    assert set(errors) == {"hung", "queued"}
+    assert all(isinstance(e, TimeoutError) for e in errors.values())
@@ -0,0 +1,39 @@
+import copy
+
+import numpy as np
+import pandapower as pp
+import pandapower.networks as pn
+import pytest
+
+from src.powerflow import PowerFlowSession, classify_actions
+
+
+def _cold(net):
+    cold = copy.deepcopy(net)
+    pp.runpp(cold)
+    return cold
+
+
+@pytest.mark.parametrize("component, element, parameters", [
+    ("load", 5, {"in_service": False}),
+    ("load", 5, {"p_mw": 10.0}),
+    ("sgen", 0, {"in_service": False}),
+    ("gen", 1, {"p_mw": 50.0}),
+])
+def test_warm_solve_matches_cold_solve(component, element, parameters):
+    net = pn.case118()
+    if component == "sgen":
+        pp.create_sgen(net, bus=10, p_mw=40.0)
+    session = PowerFlowSession(net)
+    session.solve()
+
+    actions = [{"component": component, "id": element, "type": "modify", "parameters": parameters}]
+    for column, value in parameters.items():
+        net[component].at[element, column] = value
+    session.invalidate(classify_actions(actions))
+    session.solve()
+
+    cold = _cold(net)
+    assert np.allclose(net.res_bus.vm_pu, cold.res_bus.vm_pu, atol=1e-6)
+    assert np.allclose(net.res_load.p_mw, cold.res_load.p_mw, atol=1e-6)
+    assert np.allclose(net.res_line.loading_percent, cold.res_line.loading_percent, atol=1e-4)
@@ -0,0 +1,27 @@
+import pytest
+
+import src.llm_client as llm_client
+from src.agents.orchestrator import Orchestrator
+from src.llm_fake import FakeGenAIClient
+
+# What the model proposes on retries: an element that does not exist, so every retry fails without touching line 37
+UNKNOWN_LOAD = {"actions": [{"component": "load", "id": 9999, "type": "modify", "parameters": {"p_mw": 1.0}}]}
+
+
+@pytest.fixture
+def fake_llm():
+    previous = llm_client.set_client(FakeGenAIClient(structured_outputs={"ScenarioResponse": UNKNOWN_LOAD}))
+    yield
+    llm_client.set_client(previous)
+
+
+def test_rejected_outage_does_not_stick_to_later_scenarios(fake_llm, capsys):
+    orch = Orchestrator("case57", n_clusters=3, parallel=False)
+
+    rejected = orch.process_scenario_modification("outage line 37")
+    assert rejected.startswith("Failed to modify scenario")
+    assert "TOPOLOGY check failed (islanding)" in capsys.readouterr().out
+    assert orch.net.line.at[37, 'in_service']
+
+    accepted = orch.process_scenario_modification("increase load 3 by 10%")
+    assert "created from base" in accepted, accepted
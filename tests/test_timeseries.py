@@ -0,0 +1,19 @@
+import os
+
+from src.agents.orchestrator import Orchestrator
+from src.api.sessions import SessionPool
+
+
+def test_result_stores_are_deleted_on_rerun_and_session_close():
+    orch = Orchestrator("case14", n_clusters=2, parallel=False)
+    profiles = {("load", "scaling"): [1.0, 1.1, 0.9]}
+    first = orch.run_timeseries(profiles, n_workers=0).path
+    second = orch.run_timeseries(profiles, n_workers=0).path
+    assert not os.path.exists(first)
+    assert os.path.exists(second)
+
+    pool = SessionPool()
+    pool.put("s1", orch, "case14")
+    pool.remove("s1")
+    assert not os.path.exists(second)
+    assert orch.timeseries is None
@@ -0,0 +1,24 @@
+import pandapower as pp
+import pandapower.networks as pn
+import pytest
+
+from src.violations import ViolationIndex
+
+
+@pytest.mark.parametrize("element_type, column, value", [
+    ("line", "max_loading_percent", 0.1),
+    ("trafo", "max_loading_percent", 0.1),
+    ("bus", "max_vm_pu", 0.9),
+    ("bus", "min_vm_pu", 1.2),
+])
+def test_refresh_follows_limit_changes(element_type, column, value):
+    net = pn.case57()
+    pp.runpp(net)
+    index = ViolationIndex(net)
+    before = len(index.query(element_type=element_type))
+
+    net[element_type][column] = value
+    index.refresh()
+
+    assert len(index.query(element_type=element_type)) > before
+    assert len(index.query(element_type=element_type)) == len(ViolationIndex(net).query(element_type=element_type))
@@ -5,6 +5,12 @@ import ChatInterface from './components/ChatInterface'
 
 const API_BASE = import.meta.env.VITE_API_URL || "http://localhost:8000";
 
+// One server-side session per browser tab
+const SESSION_ID = (window.crypto && window.crypto.randomUUID)
+    ? window.crypto.randomUUID()
+    : Math.random().toString(36).slice(2) + Date.now().toString(36);
+const HEADERS = { "Content-Type": "application/json", "X-Session-ID": SESSION_ID };
+
 function App() {
     const [stats, setStats] = useState(null);
     const [processing, setProcessing] = useState(false);
@@ -15,7 +21,7 @@ function App() {
             console.log(`Loading case: ${caseName} from ${API_BASE}/load`);
             const res = await fetch(`${API_BASE}/load`, {
                 method: "POST",
-                headers: { "Content-Type": "application/json" },
+                headers: HEADERS,
                 body: JSON.stringify({ case_name: caseName })
             });
             if (!res.ok) {
@@ -37,7 +43,7 @@ function App() {
         try {
             const res = await fetch(`${API_BASE}/chat`, {
                 method: "POST",
-                headers: { "Content-Type": "application/json" },
+                headers: HEADERS,
                 body: JSON.stringify({ message: text })
             });
             const data = await res.json();